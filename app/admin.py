@@ -18,6 +18,7 @@ from django.utils.translation import gettext_lazy as _
 
 from . import get_plugin_list
 from .models import Plugin, Setting, Docker
+from .plugins.plugin.docker import WarmPool
 from .util import docker, log as logging, exception, format
 
 admin.site.site_title = "Server Code Test"
@@ -218,7 +219,7 @@ class SettingAdmin(admin.ModelAdmin):
     form = SettingForm
     readonly_fields = ("token", "date")
     fieldsets = (
-        (_("general"), {"fields": ("name", "plugin", "token", "date")}),
+        (_("general"), {"fields": ("name", "plugin", "token", "date", "warm_pool")}),
         (_("readonly"), {"fields": ("settings",)}),
     )
     list_display = ("name", "token", "plugin", "date")
@@ -287,6 +288,8 @@ class SettingAdmin(admin.ModelAdmin):
         obj.settings = json.dumps(f.serialize())
         obj.date = timezone.now()
         super().save_model(request, obj, form, change)
+        if obj.warm_pool > 0:
+            WarmPool.fill_async(_plugin.get())
 
 
 @admin.register(Docker)
@@ -311,27 +314,30 @@ class DockerAdmin(admin.ModelAdmin):
             CustomAdminList.Column(_("title.docker.image"), "image"),
             CustomAdminList.Column(_("title.state"), "state"),
             CustomAdminList.Column(_("title.docker.container"), "container", is_bool=True),
+            CustomAdminList.Column(_("title.docker.pool"), "pool"),
             CustomAdminList.Column(_("title.actions"), "add_buttons", is_fn=True),
         )
 
         @classmethod
-        def from_image(cls, image, tags):
+        def from_image(cls, image, tags, pools):
             return map(
-                lambda tag: cls(tag, tag, "", "used" if tag in tags else "", False),
+                lambda tag: cls(tag, tag, "", "used" if tag in tags else "", False, pools.get(tag, "")),
                 image.tags,
             )
 
         @classmethod
         def from_container(cls, data):
             image = data.attrs["Config"]["Image"]
-            return cls(data.name, data.name, image, data.status, True)
+            pool = "idle" if docker.Pool.is_pool(data.name) else ""
+            return cls(data.name, data.name, image, data.status, True, pool)
 
-        def __init__(self, id, name, image, state, container):
+        def __init__(self, id, name, image, state, container, pool=""):
             self.id = id
             self.name = name
             self.image = image
             self.state = state
             self.container = container
+            self.pool = pool
 
         @classmethod
         def create_button(cls, *args, **kwargs):
@@ -385,8 +391,17 @@ class DockerAdmin(admin.ModelAdmin):
             used_containe = filter(lambda c: c.state==docker.Container.State.RUNNING, container)
             used_images = set(map(lambda entry: entry.image, used_containe))
 
+            # warm pool: idle/configured containers per image
+            pools = {}
+            for handle in get_plugin_list().get().values():
+                size = WarmPool.get_size(handle.info.uid)
+                ident = docker.Image(handle.info.uid, handle.info.version).get_ident()
+                idle = sum(1 for c in container if c.pool and c.image == ident and c.state == docker.Container.State.RUNNING)
+                if size or idle:
+                    pools[ident] = f"{idle}/{size}"
+
             # get imagelist
-            fn = lambda img: self.Entry.from_image(img, used_images)
+            fn = lambda img: self.Entry.from_image(img, used_images, pools)
             images = tuple(map(fn, docker.Image.ls()))  # tuple of maps
 
             # create entry list
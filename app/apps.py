@@ -9,3 +9,4 @@ class AppConfig(_AppConfig):
     def ready(self):
         super().ready()
         self.plugin_list = plugins.List(settings.PLUGIN_DIR)
+        from . import cache  # connect signals
@@ -0,0 +1,191 @@
+import json
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import get_plugin_list
+from .models import Plugin, Setting
+from .util import log as logging
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def serialize(self) -> dict:
+        ret = dict(self.__dict__)
+        total = self.hits + self.shared_hits + self.misses
+        ret["hit_rate"] = (self.hits + self.shared_hits) / total if total else 0
+        return ret
+
+
+class SettingEntry:
+    """Cached data of a Setting which is needed to execute a request"""
+
+    def __init__(self, token: str, plugin: str, version: str, settings: dict):
+        self.token = token
+        self.plugin = plugin
+        self.version = version
+        self.settings = settings
+        self.checked = time.monotonic()
+        self._handle = None
+
+    @classmethod
+    def from_model(cls, setting: Setting) -> "SettingEntry":
+        return cls(str(setting.token), setting.plugin_id, str(setting.date), json.loads(setting.settings))
+
+    def get_plugin(self):
+        """get the plugin of this Setting, raises an Exception if it doesn't exist"""
+        if self._handle is None:
+            self._handle = get_plugin_list()[self.plugin]
+        return self._handle.get()
+
+    def serialize(self) -> dict:
+        return {
+            "token": str(self.token),
+            "plugin": self.plugin,
+            "version": self.version,
+            "settings": self.settings,
+        }
+
+
+class SettingCache:
+    """In-process LRU cache: token -> SettingEntry.
+
+    Entries are revalidated after SETTINGS_CACHE_TTL seconds. If a shared cache
+    (SCT_CACHE_BACKEND) is configured, the entry of the shared cache is used to
+    revalidate, otherwise the database is queried.
+    Unknown tokens are cached as the time of the lookup for SETTINGS_CACHE_MISS_TTL
+    seconds, at most SETTINGS_CACHE_SIZE entries are kept.
+    Entries are invalidated if a Setting or Plugin is saved or deleted.
+
+    Notes:
+        - settings of the entries must not be modified
+    """
+
+    size = settings.SETTINGS_CACHE_SIZE
+    ttl = settings.SETTINGS_CACHE_TTL
+    miss_ttl = settings.SETTINGS_CACHE_MISS_TTL
+    lock = threading.Lock()
+    # token -> SettingEntry or the time an unknown token was looked up
+    entries: "OrderedDict[str, typing.Union[SettingEntry, float]]" = OrderedDict()
+    stats = CacheStats()
+    GENERATION = "sct.setting.generation"
+
+    @classmethod
+    def _shared(cls):
+        if "shared" in settings.CACHES:
+            return caches["shared"]
+        return None
+
+    @classmethod
+    def _key(cls, shared, token: str) -> str:
+        generation = shared.get(cls.GENERATION, 0)
+        return f"sct.setting.{generation}.{token}"
+
+    @classmethod
+    def _load(cls, token: str) -> typing.Union[SettingEntry, None]:
+        try:
+            setting = Setting.objects.get(  # pylint: disable=no-member
+                token=token, plugin__active=True
+            )
+        except (Setting.DoesNotExist, ValidationError, ValueError):  # pylint: disable=no-member
+            return None
+        return SettingEntry.from_model(setting)
+
+    @classmethod
+    def _set(cls, token: str, entry: typing.Union[SettingEntry, float]):
+        """must be called with the lock"""
+        cls.entries[token] = entry
+        cls.entries.move_to_end(token)
+        while len(cls.entries) > cls.size:
+            cls.entries.popitem(last=False)
+            cls.stats.evictions += 1
+
+    @classmethod
+    def get(cls, token) -> typing.Union[SettingEntry, None]:
+        """get SettingEntry of an active plugin or None"""
+        with logging.LogCall(__file__, "get", cls):
+            token = str(token)
+            now = time.monotonic()
+            with cls.lock:
+                entry = cls.entries.get(token, None)
+                if isinstance(entry, float):
+                    if now - entry < cls.miss_ttl:
+                        cls.stats.hits += 1
+                        return None
+                    entry = None
+                elif entry is not None and now - entry.checked < cls.ttl:
+                    cls.entries.move_to_end(token)
+                    cls.stats.hits += 1
+                    return entry
+
+            shared = cls._shared()
+            if shared is not None:
+                key = cls._key(shared, token)
+                if (data := shared.get(key)) is not None:
+                    if entry and entry.version == data["version"]:
+                        entry.checked = now
+                    else:
+                        entry = SettingEntry(**data)
+                    with cls.lock:
+                        cls.stats.shared_hits += 1
+                        cls._set(token, entry)
+                    return entry
+
+            entry = cls._load(token)
+            with cls.lock:
+                cls.stats.misses += 1
+                cls._set(token, now if entry is None else entry)
+            if shared is not None and entry is not None:
+                shared.set(key, entry.serialize())
+            return entry
+
+    @classmethod
+    def invalidate(cls, token=None):
+        """remove the entry of token (or all entries) from the local and shared cache"""
+        with logging.LogCall(__file__, "invalidate", cls):
+            with cls.lock:
+                cls.stats.invalidations += 1
+                if token is None:
+                    cls.entries.clear()
+                else:
+                    cls.entries.pop(str(token), None)
+            shared = cls._shared()
+            if shared is None:
+                return
+            if token is None:
+                try:
+                    shared.incr(cls.GENERATION)
+                except ValueError:
+                    shared.set(cls.GENERATION, 1, None)
+            else:
+                shared.delete(cls._key(shared, str(token)))
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        with cls.lock:
+            ret = cls.stats.serialize()
+            ret["entries"] = len(cls.entries)
+            return ret
+
+
+@receiver((post_save, post_delete), sender=Setting)
+def _invalidate_setting(sender, instance: Setting, **kwargs):
+    SettingCache.invalidate(instance.token)
+
+
+@receiver((post_save, post_delete), sender=Plugin)
+def _invalidate_plugin(sender, instance: Plugin, **kwargs):
+    SettingCache.invalidate()
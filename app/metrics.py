@@ -0,0 +1,88 @@
+"""Metrics of the API (settings.METRICS), see app.util.metrics.
+
+Requests are counted per view and error and their stages (app.util.timing)
+are observed as histograms. The statistics of the scheduler, the caches and
+the docker client are read when a snapshot is taken. The running containers
+of the current images are asked for their statistics by the worker which is
+scraped, they are shared by all workers. Containers of older images are never
+contacted, they would take the request for a new settings version.
+"""
+import concurrent.futures
+import typing
+
+from django.conf import settings
+
+from .cache import SettingCache
+from .plugins.plugin.docker import WarmPool
+from .plugins.plugin.sct.cache import ResultCache
+from .plugins.plugin.sct_docker import Executor as Executor_SCT_Docker
+from .util import log as logging, timeout
+from .util.docker import ApiCalls, Container, Image
+from .util.metrics import Metrics
+
+
+def observe(view: str, error: typing.Union[str, None], stages: dict = None):
+    """counts a request, stages: durations in ms (Timings.serialize)"""
+    Metrics.inc("sct_requests_total", {"view": view, "error": error or "none"})
+    for (stage, ms) in (stages or {}).items():
+        Metrics.observe("sct_request_stage_seconds", ms / 1000, {"stage": stage})
+
+
+@Metrics.collector
+def _collect():
+    yield from Metrics.stats(
+        "sct_scheduler", timeout.Scheduler.get_stats(), ("calls", "timeouts", "cancelled", "abandoned"), ("running", "threads")
+    )
+    yield from Metrics.stats(
+        "sct_setting_cache", SettingCache.get_stats(), ("hits", "shared_hits", "misses", "invalidations", "evictions"), ("entries",)
+    )
+    yield from Metrics.stats("sct_result_cache", ResultCache.get_stats(), ("hits", "misses", "expired", "evictions"), ("entries",))
+    yield from Metrics.stats("sct_docker_api", ApiCalls.get_stats(), ("calls",))
+
+
+def _container_stats(name: str) -> typing.Union[dict, None]:
+    try:
+        return Executor_SCT_Docker.sct_get_stats(name, Executor_SCT_Docker.PORT, settings.METRICS_TIMEOUT)
+    except Exception as e:
+        logging.debug("metrics of %s: %s", name, str(e))
+        return None
+
+
+def _running() -> typing.List[str]:
+    """names of the running containers (warm pool included) of the current images of SCT plugins"""
+    names = []
+    for plugin in WarmPool.plugins():
+        if issubclass(plugin.Executor, Executor_SCT_Docker):
+            image = Image(plugin.info.uid, plugin.info.version)
+            names.extend(cnt.name for cnt in image.get_container() if cnt.status == Container.State.RUNNING)
+    return names
+
+
+def _containers() -> typing.Iterator[tuple]:
+    names = _running()
+    if not names:
+        return
+    with concurrent.futures.ThreadPoolExecutor(min(len(names), 16), thread_name_prefix="sct_metrics") as pool:
+        for (name, stats) in zip(names, pool.map(_container_stats, names)):
+            if not stats:
+                continue
+            values = {"container": name}
+            yield ("gauge", "sct_container_connections", values, stats.get("connections", 0))
+            _exec = stats.get("exec", {})
+            yield from Metrics.stats(
+                "sct_container_exec", _exec, ("submitted", "timeouts", "cancelled", "rejected", "killed"), ("queued", "running"), values
+            )
+            kill = stats.get("kill", {})
+            yield ("counter", "sct_container_killed_total", values, kill.get("killed", 0))
+            yield ("counter", "sct_container_killed_cpu_used_seconds_total", values, kill.get("cpu_time_used", 0))
+            for (code, count) in stats.get("results", {}).items():
+                yield ("counter", "sct_container_results_total", {**values, "code": code}, count)
+
+
+def render() -> str:
+    """metrics of all workers and the running containers"""
+    with logging.LogCall(__file__, "render"):
+        data = Metrics.read()
+        if settings.DOCKER_ENABLED and settings.METRICS_CONTAINERS:
+            Metrics.add(data, _containers())
+        return Metrics.render(data)
@@ -72,6 +72,11 @@ class Setting(models.Model):
     )
     date = models.DateTimeField(verbose_name=_("date"), auto_now_add=True)
     settings = models.TextField(blank=True)
+    warm_pool = models.PositiveSmallIntegerField(
+        verbose_name=_("setting.warm_pool"),
+        default=0,
+        help_text=_("setting.warm_pool.help"),
+    )
     token = models.UUIDField(
         verbose_name=_("setting.token"),
         primary_key=True,
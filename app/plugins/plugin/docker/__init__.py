@@ -1,2 +1,3 @@
 from .executor import Executor
+from .pool import WarmPool
 from .. import Plugin, Settings, Request, Response
\ No newline at end of file
@@ -4,12 +4,17 @@ from ..executor import Executor as BaseExecutor
 from ...exception import PluginException
 
 from app.util import log as logging
-from app.util.docker import Container, Image
+from app.util.docker import Container, Image, ApiCalls
+from app.util.metrics import Metrics
+from app.util.timing import Timings
+
+from .pool import WarmPool
 
 
 class Executor(BaseExecutor):
     """ This Executor manages docker-containers.
-        Containers are automatically created when they are needed.
+        Containers are automatically created when they are needed,
+        or taken from the WarmPool if idle containers are available.
         you need to call 'execute' at the top of your execute Method.
     """
     def __init__(self, *args, **kwargs):
@@ -21,14 +26,25 @@ class Executor(BaseExecutor):
     def _start_container(self):
         with logging.LogCall(__file__, "_start_container", self.__class__):
             c = self._docker_container
-            if c.exists():
-                if c.is_running():
+            # answered by the docker state cache, without API calls
+            status = c.status()
+            source = "restarted"
+            if status is not None:
+                if status == c.State.RUNNING:
                     self.logger.debug(
                         "Container(%s) is running",
                         self._docker_container.container_name,
                     )
                     return True
+            elif WarmPool.claim(self.plugin, c):
+                self.logger.debug(
+                    "Container(%s) claimed from pool", self._docker_container.container_name
+                )
+                WarmPool.fill_async(self.plugin)
+                Metrics.inc("sct_container_starts_total", {"source": "pool"})
+                return True
             else:
+                source = "created"
                 if self._docker_image.create(self.plugin.path):
                     self.logger.debug(
                         "Image(%s) created", self._docker_image.image_name
@@ -41,6 +57,7 @@ class Executor(BaseExecutor):
                 self.logger.debug(
                     "Container(%s) started", self._docker_container.container_name
                 )
+                Metrics.inc("sct_container_starts_total", {"source": source})
             return True
 
     def get_container_name(self):
@@ -50,4 +67,7 @@ class Executor(BaseExecutor):
         with logging.LogCall(__file__, "execute", self.__class__):
             if django_settings.DOCKER_ENABLED != True:
                 raise PluginException("Container disabled")
-            self._start_container()
+            WarmPool.start()
+            with Timings.stage("start_container"), ApiCalls() as calls:
+                self._start_container()
+            self.logger.debug("%d docker API calls", calls.count)
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+
+from django.conf import settings as django_settings
+from django.db import close_old_connections
+
+from app.util import log as logging, exception
+from app.util.docker import Container, Image, Pool
+
+
+class WarmPool:
+    """Keeps idle containers of docker plugins ready.
+    The number of containers of a plugin is the highest `warm_pool` value of its settings.
+    Pools are refilled in the background after a container was claimed
+    and every `interval` seconds.
+    """
+
+    interval = 60
+    lock = threading.Lock()
+    pid = None
+    pending = set()
+
+    @classmethod
+    def get_size(cls, uid: str) -> int:
+        with logging.LogCall(__file__, "get_size", cls):
+            if django_settings.DOCKER_WARM_POOL <= 0:
+                return 0
+            from app.models import Setting
+            from django.db.models import Max
+
+            size = Setting.objects.filter(  # pylint: disable=no-member
+                plugin__uid=uid, plugin__active=True
+            ).aggregate(size=Max("warm_pool"))["size"]
+            return min(size or 0, django_settings.DOCKER_WARM_POOL)
+
+    @classmethod
+    def get_pool(cls, plugin) -> Pool:
+        return Pool(Image(plugin.info.uid, plugin.info.version))
+
+    @classmethod
+    def claim(cls, plugin, container: Container) -> bool:
+        """rename an idle container of the pool of plugin to the name of container.
+        The pool isn't listed (docker API call) if it is disabled."""
+        with logging.LogCall(__file__, "claim", cls):
+            if cls.get_size(plugin.info.uid) <= 0:
+                return False
+            return cls.get_pool(plugin).claim(container)
+
+    @classmethod
+    def fill(cls, plugin) -> int:
+        """start missing containers of plugin
+
+            Returns:
+                - number of started containers
+        """
+        with logging.LogCall(__file__, "fill", cls):
+            size = cls.get_size(plugin.info.uid)
+            pool = cls.get_pool(plugin)
+            if size > 0 and pool.image.create(plugin.path):
+                logging.debug("Image(%s) created", pool.image.image_name)
+            created = pool.fill(size)
+            if created:
+                logging.info("%d warm containers started for %s", created, plugin.info.uid)
+            return created
+
+    @classmethod
+    def fill_async(cls, plugin):
+        """fill the pool of plugin in a background thread"""
+        with logging.LogCall(__file__, "fill_async", cls):
+            if not django_settings.DOCKER_ENABLED:
+                return
+            cls.start()
+            uid = plugin.info.uid
+            with cls.lock:
+                if uid in cls.pending:
+                    return
+                cls.pending.add(uid)
+            thread = threading.Thread(target=cls._fill_thread, args=(plugin,))
+            thread.daemon = True
+            thread.start()
+
+    @classmethod
+    def _fill_thread(cls, plugin):
+        try:
+            cls.fill(plugin)
+        except Exception as e:
+            exception.Traceback(e).log()
+        finally:
+            close_old_connections()
+            with cls.lock:
+                cls.pending.discard(plugin.info.uid)
+
+    @classmethod
+    def plugins(cls) -> list:
+        """active docker plugins"""
+        with logging.LogCall(__file__, "plugins", cls):
+            from app import get_plugin_list
+            from app.models import Plugin
+            from .executor import Executor
+
+            plugins = []
+            for db_plugin in Plugin.objects.filter(active=True):  # pylint: disable=no-member
+                handle = get_plugin_list()[db_plugin.uid]
+                if not handle:
+                    continue
+                try:
+                    plugin = handle.get()
+                except Exception as e:
+                    exception.Traceback(e).log()
+                    continue
+                if issubclass(plugin.Executor, Executor):
+                    plugins.append(plugin)
+            return plugins
+
+    @classmethod
+    def fill_all(cls):
+        """fill the pools of all active docker plugins"""
+        with logging.LogCall(__file__, "fill_all", cls):
+            for plugin in cls.plugins():
+                try:
+                    cls.fill(plugin)
+                except Exception as e:
+                    exception.Traceback(e).log()
+
+    @classmethod
+    def start(cls):
+        """start the refill thread of this process"""
+        with cls.lock:
+            if cls.pid == os.getpid() or not django_settings.DOCKER_ENABLED:
+                return
+            cls.pid = os.getpid()
+            cls.pending = set()
+        thread = threading.Thread(target=cls._run)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def _run(cls):
+        while True:
+            try:
+                cls.fill_all()
+            except Exception as e:
+                exception.Traceback(e).log()
+            finally:
+                close_old_connections()
+            time.sleep(cls.interval)
@@ -0,0 +1,117 @@
+from ..pool import WarmPool
+from app.util import docker
+from app.util.docker import Container
+from docker.errors import APIError, NotFound
+import types
+import pytest
+
+PLUGIN = types.SimpleNamespace(info=types.SimpleNamespace(uid="test", version="1"), path="/plugins/test")
+IMAGE = docker.Image("test", "1").get_ident()
+OLD_IMAGE = docker.Image("test", "0").get_ident()
+
+
+class FakeContainer:
+    def __init__(self, client: "Client", name: str, image: str, status: str = "running"):
+        self.client = client
+        self.name = name
+        self.status = status
+        self.attrs = {"Config": {"Image": image}}
+
+    def rename(self, name: str):
+        if name in self.client.names:
+            raise APIError("Conflict")
+        del self.client.names[self.name]
+        self.name = name
+        self.client.names[name] = self
+
+    def remove(self, force=False):
+        self.client.removed.append(self.name)
+        del self.client.names[self.name]
+
+    def start(self):
+        self.status = "running"
+
+
+class Client:
+    """docker client with containers in memory"""
+
+    def __init__(self, *containers):
+        self.names = {}
+        self.removed = []
+        for (name, image, status) in containers:
+            self.add(name, image, status)
+        self.containers = types.SimpleNamespace(get=self.get, list=self.list, create=self.create)
+
+    def add(self, name: str, image: str = IMAGE, status: str = "running") -> FakeContainer:
+        self.names[name] = FakeContainer(self, name, image, status)
+        return self.names[name]
+
+    def get(self, name: str) -> FakeContainer:
+        if name not in self.names:
+            raise NotFound(name)
+        return self.names[name]
+
+    def list(self, all=False, filters=None):
+        prefix = filters["name"].rstrip("*")
+        return [c for c in list(self.names.values()) if c.name.startswith(prefix)]
+
+    def create(self, image: str, name: str, network=None, environment=None) -> FakeContainer:
+        return self.add(name, image, "created")
+
+
+def pool_name(name: str) -> str:
+    return docker.add_prefix(f"{WarmPool.get_pool(PLUGIN).prefix}{name}")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    for (key, value) in (("containers", {}), ("images", {IMAGE}), ("changed", {}), ("seq", 0), ("synced", True)):
+        monkeypatch.setattr(docker.State, key, value)
+    monkeypatch.setattr(WarmPool, "get_size", classmethod(lambda cls, uid: 2))
+    client = Client()
+    monkeypatch.setattr(docker._Docker, "client", client)
+    return client
+
+
+def test_claim_disabled(settings, monkeypatch):
+    settings.DOCKER_WARM_POOL = 0
+    monkeypatch.setattr(WarmPool, "get_pool", classmethod(lambda cls, plugin: pytest.fail("pool listed")))
+    assert WarmPool.get_size("test") == 0
+    assert not WarmPool.claim(PLUGIN, Container("token"))
+
+
+def test_claim(client):
+    client.add(pool_name("a"))
+    client.add(pool_name("old"), image=OLD_IMAGE)
+    container = Container("token")
+    assert WarmPool.claim(PLUGIN, container)
+    assert client.get(container.get_ident()).attrs["Config"]["Image"] == IMAGE
+    assert docker.State.container(container.get_ident()) == (True, "running")
+    assert pool_name("a") not in client.names and pool_name("old") in client.names
+    # the pool is empty
+    assert not WarmPool.claim(PLUGIN, Container("other"))
+
+
+def test_claim_lost_race(client):
+    # the container was started by another request meanwhile
+    client.add(pool_name("a"))
+    client.add(docker.add_prefix("token"))
+    assert not WarmPool.claim(PLUGIN, Container("token"))
+    assert pool_name("a") in client.names
+    # the first pool container was claimed by another process after it was listed
+    stale = FakeContainer(client, pool_name("0"), IMAGE)
+    client.containers.list = lambda **kwargs: [stale, *Client.list(client, **kwargs)]
+    assert WarmPool.claim(PLUGIN, Container("other"))
+    assert docker.add_prefix("other") in client.names and pool_name("a") not in client.names
+    assert not WarmPool.claim(PLUGIN, Container("third"))
+
+
+def test_fill(client):
+    client.add(pool_name("old"), image=OLD_IMAGE)
+    client.add(pool_name("exited"), status="exited")
+    client.add(pool_name("idle"))
+    assert WarmPool.fill(PLUGIN) == 1
+    assert client.removed == [pool_name("old"), pool_name("exited")]
+    pool = WarmPool.get_pool(PLUGIN)
+    assert len(pool.idle()) == 2 and all(c.attrs["Config"]["Image"] == IMAGE for c in pool.ls())
+    assert WarmPool.fill(PLUGIN) == 0
@@ -1,5 +1,7 @@
 import typing
 
+from asgiref.sync import sync_to_async
+
 from app.util import log as logging
 
 from ..info import Info
@@ -9,6 +11,10 @@ class Executor:
     """ Basic Executor Class
         All methods should be implemented in derived classes.
     """
+    # on_output(chunk: dict): output of the user code while it's running,
+    # set by Plugin.execute_stream. Executors which can't stream ignore it.
+    on_output = None
+
     def get_points(self) -> float:
         return 0
 
@@ -40,3 +46,22 @@ class Executor:
             )
             raise NotImplementedError
 
+
+    @classmethod
+    def execute_batch(cls, executors: list) -> typing.Iterator[typing.Tuple[int, typing.Union[Exception, None]]]:
+        """executes executors of the same plugin and setting.
+        yields (index, exception or None) of each executor as soon as it is finished,
+        executes them one by one if it isn't implemented by the derived class"""
+        with logging.LogCall(__file__, "execute_batch", cls):
+            for (index, executor) in enumerate(executors):
+                try:
+                    executor.execute()
+                    yield (index, None)
+                except Exception as e:
+                    yield (index, e)
+
+    async def execute_async(self):
+        """asyncio version of execute, executes `execute` in a worker thread
+        if it isn't implemented by the derived class"""
+        with logging.LogCall(__file__, "execute_async", self.__class__):
+            await sync_to_async(self.execute, thread_sensitive=False)()
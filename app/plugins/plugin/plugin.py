@@ -1,6 +1,9 @@
 import typing
 
-from app.util import log as logging
+from django.conf import settings as django_settings
+
+from app.util import log as logging, timeout as timeout_util
+from app.util.stream import OutputStream
 
 from .executor import Executor
 from .settings import Settings
@@ -26,17 +29,107 @@ class Plugin:
             self.logger = logging.PluginLogger(self.info.uid)
             self.logger.debug("%s initialized!", self.__class__.__name__)
 
+    def _get_response(self, exec: Executor, error: Exception = None) -> Response:
+        res = self.Response()
+        try:
+            if error:
+                raise error
+            res.error = exec.get_error()  # pylint: disable=assignment-from-none
+            if res.error:
+                res.error_text = exec.get_error_text()
+            res.text = exec.get_text()
+            res.points = exec.get_points()
+        except Exception as e:
+            res.set_exception(e)
+        return res
+
+    def _get_timeout_response(self) -> Response:
+        res = self.Response()
+        res.error = "timeout"
+        res.error_text = "a timeout occured"
+        return res
+
     def execute(self, request: Request) -> Response:
         with logging.LogCall(__file__, "execute", self.__class__):
-            res = self.Response()
             try:
                 exec = self.Executor(self, request)
                 exec.execute()
-                res.error = exec.get_error()  # pylint: disable=assignment-from-none
-                if res.error:
-                    res.error_text = exec.get_error_text()
-                res.text = exec.get_text()
-                res.points = exec.get_points()
             except Exception as e:
-                res.set_exception(e)
-            return res
+                return self._get_response(None, e)
+            return self._get_response(exec)
+
+    async def execute_async(self, request: Request) -> Response:
+        with logging.LogCall(__file__, "execute_async", self.__class__):
+            try:
+                exec = self.Executor(self, request)
+                await exec.execute_async()
+            except Exception as e:
+                return self._get_response(None, e)
+            return self._get_response(exec)
+
+    def execute_stream(self, request: Request) -> typing.Iterator[typing.Tuple[str, typing.Any]]:
+        """executes request like execute, the output of the user code is streamed while it's running.
+        yields ("output", chunk) for each chunk of output and ("result", Response) at the end"""
+        with logging.LogCall(__file__, "execute_stream", self.__class__):
+            stream = OutputStream(django_settings.STREAM_BUFFER)
+
+            def run() -> Response:
+                try:
+                    exec = self.Executor(self, request)
+                    exec.on_output = stream.put
+                    exec.execute()
+                except Exception as e:
+                    return self._get_response(None, e)
+                finally:
+                    stream.close()
+                return self._get_response(exec)
+
+            deadline = timeout_util.Scheduler.submit(run, timeout=request.max_timeout)
+            for chunk in stream.read(request.max_timeout):
+                yield ("output", chunk)
+            try:
+                response = deadline.result()
+            except timeout_util.DeadlineExceeded:
+                response = self._get_timeout_response()
+            if stream.dropped:
+                self.logger.debug("%d chunks of output dropped", stream.dropped)
+            yield ("result", response)
+
+    def execute_batch(self, requests: typing.List[Request]) -> typing.Iterator[typing.Tuple[int, Response]]:
+        """executes requests of the same setting.
+        yields (index, Response) in the order the requests are finished.
+        After the deadline of the current thread (timeout.current) the remaining
+        requests aren't executed anymore and get timeout errors."""
+        with logging.LogCall(__file__, "execute_batch", self.__class__):
+            try:
+                executors = [self.Executor(self, request) for request in requests]
+            except Exception as e:
+                for index in range(len(requests)):
+                    yield (index, self._get_response(None, e))
+                return
+            deadline = timeout_util.current()
+
+            def expired() -> bool:
+                return deadline is not None and deadline.remaining() <= 0
+
+            done = set()
+            results = self.Executor.execute_batch(executors)
+            try:
+                for (index, error) in results:
+                    if error is not None and expired():
+                        break  # failed because of the deadline
+                    done.add(index)
+                    yield (index, self._get_response(executors[index], error))
+                    if expired():
+                        break
+            except Exception as e:
+                if not expired():
+                    for index in range(len(executors)):
+                        if index not in done:
+                            done.add(index)
+                            yield (index, self._get_response(None, e))
+            finally:
+                results.close()
+            for index in range(len(executors)):
+                if index not in done:
+                    yield (index, self._get_timeout_response())
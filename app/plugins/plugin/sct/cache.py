@@ -0,0 +1,96 @@
+import hashlib
+import json
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+from django.conf import settings
+
+from app.util import log as logging
+
+
+class ResultCacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def serialize(self) -> dict:
+        ret = dict(self.__dict__)
+        total = self.hits + self.misses
+        ret["hit_rate"] = self.hits / total if total else 0
+        return ret
+
+
+class ResultCache:
+    """In-process LRU cache of container results.
+
+    Key: (token, settings version, hash of the request data), so results of
+    old settings are never returned.
+    Entries expire after RESULT_CACHE_TTL seconds, at most RESULT_CACHE_SIZE
+    entries are kept (0 disables the cache).
+
+    Notes:
+        - cached results must not be modified
+    """
+
+    size = settings.RESULT_CACHE_SIZE
+    ttl = settings.RESULT_CACHE_TTL
+    lock = threading.Lock()
+    entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+    stats = ResultCacheStats()
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return cls.size > 0
+
+    @classmethod
+    def key(cls, token, version, request: dict) -> tuple:
+        data = json.dumps(request, sort_keys=True).encode("utf8")
+        return (str(token), str(version), hashlib.sha256(data).hexdigest())
+
+    @classmethod
+    def get(cls, key: tuple) -> typing.Any:
+        """cached value or None"""
+        with logging.LogCall(__file__, "get", cls):
+            now = time.monotonic()
+            with cls.lock:
+                entry = cls.entries.get(key, None)
+                if entry is None:
+                    cls.stats.misses += 1
+                    return None
+                (created, value) = entry
+                if now - created >= cls.ttl:
+                    del cls.entries[key]
+                    cls.stats.expired += 1
+                    cls.stats.misses += 1
+                    return None
+                cls.entries.move_to_end(key)
+                cls.stats.hits += 1
+                return value
+
+    @classmethod
+    def set(cls, key: tuple, value: typing.Any):
+        with logging.LogCall(__file__, "set", cls):
+            if not cls.enabled():
+                return
+            with cls.lock:
+                cls.entries[key] = (time.monotonic(), value)
+                cls.entries.move_to_end(key)
+                while len(cls.entries) > cls.size:
+                    cls.entries.popitem(last=False)
+                    cls.stats.evictions += 1
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.entries.clear()
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        with cls.lock:
+            ret = cls.stats.serialize()
+            ret["entries"] = len(cls.entries)
+            return ret
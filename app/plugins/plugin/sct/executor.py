@@ -1,10 +1,17 @@
+import hashlib
+import json
+import socket
+import typing
+
 from django.conf import settings as django_settings
 
 from ...exception import PluginException
 from ..executor import Executor as BaseExecutor
+from .cache import ResultCache
 
-from app.util import log as logging
-from app.util.sctsock import SCTSock, create_socket, PacketType
+from app.util import log as logging, timeout as timeout_util
+from app.util.sctsock import SCTSock, SCTMuxSock, SCTPool, AsyncSCTSock, create_socket, PacketType
+from app.util.timing import Timings
 
 
 class Executor(BaseExecutor):
@@ -18,6 +25,7 @@ class Executor(BaseExecutor):
             super().__init__(*args, **kwargs)
             self._sct_debug = []
             self._sct_data = None
+            self._sct_cached = None
 
     def get_url(self) -> str:
         # implement this
@@ -34,38 +42,242 @@ class Executor(BaseExecutor):
     def get_settings(self) -> dict:
         return self.request.settings
 
+    def _sct_request(self) -> dict:
+        """get_request, the container streams the output if on_output is set"""
+        if self.on_output is None:
+            return self.get_request()
+        return {**self.get_request(), "stream": True}
+
+    def get_settings_digest(self) -> str:
+        """identifies the content of get_settings, a container with other settings requests them"""
+        data = json.dumps(self.get_settings(), sort_keys=True).encode("utf8")
+        return hashlib.sha256(data).hexdigest()
+
     def sct_get_data(self):
         return self._sct_data
 
     def sct_get_debug(self) -> list:
         return self._sct_debug
 
+    def sct_cacheable(self) -> bool:
+        """overwrite this if only some results of the container may be reused"""
+        return self._sct_data is not None
+
+    def _sct_cache_key(self) -> typing.Union[tuple, None]:
+        if not ResultCache.enabled() or self.get_settings().get("debug", False):
+            return None
+        return ResultCache.key(self.request.token, self.request.setting_version, self.get_request())
+
+    def sct_load_cached(self) -> bool:
+        """use the result of an identical request if it is cached
+
+            Returns:
+                - True if the container doesn't need to be contacted
+        """
+        with logging.LogCall(__file__, "sct_load_cached", self.__class__):
+            if self._sct_cached is None:
+                self._sct_cached = False
+                if (key := self._sct_cache_key()) and (entry := ResultCache.get(key)) :
+                    (self._sct_data, debug) = entry
+                    self._sct_debug = list(debug)
+                    self._sct_cached = True
+                    self.logger.debug("cached result used")
+            return self._sct_cached
+
+    def _sct_store(self):
+        if self.sct_cacheable() and (key := self._sct_cache_key()) :
+            ResultCache.set(key, (self._sct_data, tuple(self._sct_debug)))
+
     def execute(self):
         with logging.LogCall(__file__, "execute", self.__class__):
-            self._sct_send()
+            if not self.sct_load_cached():
+                self._sct_send()
+                self._sct_store()
 
 
-    def _sct_loop(self, sock):
-        packet = sock.recv()  # blocking....
+    async def execute_async(self):
+        with logging.LogCall(__file__, "execute_async", self.__class__):
+            if not self.sct_load_cached():
+                await self._sct_send_async()
+                self._sct_store()
+
+    def _sct_process(self, packet) -> typing.Tuple[bool, typing.Any]:
+        """handles a received packet
+
+            Returns:
+                - (bool, Any): (wait for the next packet, payload of the init packet to send or None)
+        """
         payload = packet.payload
         if packet.packet_type == PacketType.init:
             if payload == "init":
-                sock.send_init(self.get_settings())
+                return (True, self.get_settings())
             elif payload == "data":
-                sock.send_init(self.get_request())
-            return True
+                return (True, self._sct_request())
+            return (True, None)
         elif packet.packet_type == PacketType.debug:
+            if isinstance(payload, dict) and "stream" in payload:
+                # output of the user code, not part of the result
+                if self.on_output is not None:
+                    self.on_output(payload)
+                return (True, None)
             self._sct_debug.append(payload)
-            return True
+            return (True, None)
         elif packet.packet_type == PacketType.data:
             self._sct_data = payload
-        return False
+        return (False, None)
+
+    def _sct_loop(self, sock):
+        (again, reply) = self._sct_process(sock.recv())  # blocking....
+        if reply is not None:
+            sock.send_init(reply)
+        return again
+
+    async def _sct_loop_async(self, sock: AsyncSCTSock):
+        (again, reply) = self._sct_process(await sock.recv())
+        if reply is not None:
+            await sock.send_init(reply)
+        return again
+
+    def _sct_timeout(self) -> float:
+        timeout = self.request.max_timeout
+        if (deadline := timeout_util.current()) :
+            # no need to wait for the container after the API request timed out
+            timeout = max(min(timeout, deadline.remaining()), 1)
+        return timeout
+
+    def _sct_connect(self) -> SCTSock:
+        with logging.LogCall(__file__, "_sct_connect", self.__class__), Timings.stage("connect"):
+            timeout = self._sct_timeout()
+            if django_settings.SCT_POOL_SIZE > 0:
+                pool = SCTPool.get(self.get_url(), self.get_port(), django_settings.SCT_POOL_SIZE)
+                if (channel := pool.channel(timeout=timeout)) :
+                    return channel
+                self.logger.debug("%s:%d: no multiplexed connection", self.get_url(), self.get_port())
+            return SCTSock(create_socket(self.get_url(), self.get_port()), timeout=timeout)
+
+    def _sct_first_frame(self, features: typing.AbstractSet[str], request: dict) -> typing.Any:
+        """the settings version, containers with the pipeline feature
+        get the request in the same packet and skip the "data" round trip"""
+        if "pipeline" in features:
+            return {"version": self.request.setting_version, "digest": self.get_settings_digest(), "request": request}
+        return self.request.setting_version
+
+    def _sct_send_first(self, sock: SCTSock, request: dict):
+        sock.send_init(self._sct_first_frame(sock.features, request))
+
+    def _sct_timings(self):
+        """adds the stages of the container, sent with the result ({"data": {"timings": ...}}), to the current Timings"""
+        data = self._sct_data
+        if (timings := Timings.current()) and isinstance(data, dict) and isinstance(data.get("data", None), dict):
+            if isinstance(stages := data["data"].get("timings", None), dict):
+                timings.merge("container", stages)
 
     def _sct_send(self):
         with logging.LogCall(__file__, "_sct_send", self.__class__):
-            with SCTSock(create_socket(self.get_url(), self.get_port()), timeout=self.request.max_timeout) as sock:
-                sock.send_init(self.request.setting_version)
+            with self._sct_connect() as sock, Timings.stage("exchange"):
+                self._sct_send_first(sock, self._sct_request())
                 while self._sct_loop(sock):
                     pass
+            self._sct_timings()
+
+    @classmethod
+    def sct_get_stats(cls, url: str, port: int, timeout: float = 2) -> typing.Union[dict, None]:
+        """statistics of the container (get_stats of main.py), None if it doesn't support the feature "metrics".
+        Asks once without retries, the request doesn't keep the container alive.
+        The frame is only sent if the feature is announced by the mux handshake,
+        older containers would take it for a settings version."""
+        with logging.LogCall(__file__, "sct_get_stats", cls):
+            sock = SCTSock(socket.create_connection((url, port), timeout), timeout=timeout)
+            if (mux := SCTMuxSock.connect(sock, timeout=timeout)) is None:
+                return None
+            try:
+                if "metrics" not in mux.features or (channel := mux.channel()) is None:
+                    return None
+                with channel:
+                    channel.send_init({"metrics": True})
+                    packet = channel.recv()
+            finally:
+                mux.close()
+            payload = packet.payload
+            if packet.packet_type != PacketType.data or not isinstance(payload, dict) or payload.get("res", None) != 0:
+                return None
+            return payload.get("data", None)
+
+    def sct_prepare(self):
+        """called before the connection of a batch request is opened"""
+        pass
+
+    @classmethod
+    def execute_batch(cls, executors: list):
+        """cached results are returned first, all other requests
+        share one connection and the settings handshake"""
+        with logging.LogCall(__file__, "execute_batch", cls):
+            pending = {}
+            for (index, executor) in enumerate(executors):
+                if executor.sct_load_cached():
+                    yield (index, None)
+                else:
+                    pending[index] = executor
+            if not pending:
+                return
+            first = next(iter(pending.values()))
+            try:
+                first.sct_prepare()
+                yield from first._sct_send_batch(pending)
+            except Exception as e:
+                for index in tuple(pending):
+                    del pending[index]
+                    yield (index, e)
+                return
+            # container doesn't support batch requests
+            for index in tuple(pending):
+                executor = pending.pop(index)
+                try:
+                    executor._sct_send()
+                    executor._sct_store()
+                    yield (index, None)
+                except Exception as e:
+                    yield (index, e)
 
+    def _sct_send_batch(self, pending: dict):
+        """yields (index, None) for each received result, finished executors are removed from pending"""
+        with logging.LogCall(__file__, "_sct_send_batch", self.__class__):
+            indices = list(pending)
+            batch = {"batch": [pending[index].get_request() for index in indices]}
+            deadline = timeout_util.current()
+            with self._sct_connect() as sock:
+                self._sct_send_first(sock, batch)
+                while pending:
+                    if deadline and deadline.remaining() <= 0:
+                        raise timeout_util.DeadlineExceeded(f"deadline of {deadline.timeout}s exceeded")
+                    packet = sock.recv()
+                    payload = packet.payload
+                    if packet.packet_type == PacketType.init:
+                        if payload == "init":
+                            sock.send_init(self.get_settings())
+                        elif payload == "data":
+                            sock.send_init(batch)
+                        continue
+                    if packet.packet_type == PacketType.debug:
+                        continue
+                    if packet.packet_type != PacketType.data:
+                        raise ConnectionError("connection closed before all results were received")
+                    if not isinstance(payload, dict) or "index" not in payload:
+                        self.logger.debug("batch requests not supported by the container")
+                        return
+                    index = indices[payload.pop("index")]
+                    executor = pending.pop(index)
+                    executor._sct_data = payload
+                    executor._sct_store()
+                    yield (index, None)
 
+    async def _sct_send_async(self):
+        with logging.LogCall(__file__, "_sct_send_async", self.__class__):
+            with Timings.stage("connect"):
+                sock = await AsyncSCTSock.connect(self.get_url(), self.get_port(), timeout=self._sct_timeout())
+            async with sock:
+                with Timings.stage("exchange"):
+                    await sock.send_init(self._sct_first_frame(sock.features, self._sct_request()))
+                    while await self._sct_loop_async(sock):
+                        pass
+            self._sct_timings()
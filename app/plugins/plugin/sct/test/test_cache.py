@@ -0,0 +1,63 @@
+from ...request import Request
+from ..cache import ResultCache
+from ..executor import Executor
+import types
+import pytest
+
+PLUGIN = types.SimpleNamespace(info=types.SimpleNamespace(uid="test"))
+
+
+class CountingExecutor(Executor):
+    sent = 0
+
+    def _sct_send(self):
+        CountingExecutor.sent += 1
+        self._sct_data = {"res": 0, "data": CountingExecutor.sent}
+        self._sct_debug = ["debug"]
+
+
+def execute(settings: dict, version="1", code="print(1)") -> CountingExecutor:
+    request = Request(token="token", version=version, settings=settings, timeout=30, body={"code": code, "test": ""})
+    executor = CountingExecutor(PLUGIN, request)
+    executor.execute()
+    return executor
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    ResultCache.clear()
+    CountingExecutor.sent = 0
+    yield ResultCache
+
+
+def test_cache():
+    first = execute({})
+    second = execute({})
+    assert CountingExecutor.sent == 1
+    assert second.sct_get_data() == first.sct_get_data()
+    assert second.sct_get_debug() == ["debug"]
+    execute({}, version="2")
+    execute({}, code="print(2)")
+    assert CountingExecutor.sent == 3
+
+
+def test_bypass_debug():
+    execute({"debug": True})
+    execute({"debug": True})
+    assert CountingExecutor.sent == 2
+
+
+def test_lru(cache, monkeypatch):
+    monkeypatch.setattr(cache, "size", 2)
+    for code in ("1", "2", "3"):
+        execute({}, code=code)
+    assert cache.get_stats()["entries"] == 2
+    execute({}, code="1")
+    assert CountingExecutor.sent == 4
+
+
+def test_ttl(cache, monkeypatch):
+    execute({})
+    monkeypatch.setattr(cache, "ttl", 0)
+    execute({})
+    assert CountingExecutor.sent == 2
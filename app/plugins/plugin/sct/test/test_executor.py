@@ -0,0 +1,151 @@
+from ...request import Request
+from ..cache import ResultCache
+from ..executor import Executor
+from app.util import timeout as timeout_util
+from app.util.sctsock import SCTSock, SCTMuxSock, AsyncSCTSock, PacketType
+from app.util.timing import Timings
+import asyncio
+import socket
+import threading
+import types
+import pytest
+
+PLUGIN = types.SimpleNamespace(info=types.SimpleNamespace(uid="test"))
+
+
+class Container:
+    """minimal container: settings handshake like main.py, echoes the request"""
+
+    def __init__(self, features=(), plain=False):
+        self.received = []
+        self.settings = None
+        self.digest = None
+        (a, b) = socket.socketpair()
+        if plain:
+            # one request without the mux handshake, the client connects to the socket a
+            self.client = a
+            threading.Thread(target=self._request, args=(SCTSock(b),), daemon=True).start()
+            return
+        thread = threading.Thread(target=self._accept, args=(b, features))
+        thread.start()
+        self.client = SCTMuxSock.connect(SCTSock(a), timeout=5)
+        thread.join()
+
+    def _accept(self, sock, features):
+        sock = SCTSock(sock)
+        packet = sock.recv()
+        self.server = SCTMuxSock.accept(sock, self._handle, offer=packet.payload, features=features)
+
+    def _handle(self, channel):
+        threading.Thread(target=self._request, args=(channel,), daemon=True).start()
+
+    def _request(self, channel):
+        with channel:
+            frame = channel.recv().payload
+            self.received.append(frame)
+            pipelined = isinstance(frame, dict)
+            if not pipelined or frame["digest"] != self.digest:
+                channel.send_init("init")
+                self.settings = channel.recv().payload
+                self.received.append(self.settings)
+                self.digest = frame["digest"] if pipelined else None
+            if pipelined:
+                request = frame["request"]
+            else:
+                channel.send_init("data")
+                request = channel.recv().payload
+                self.received.append(request)
+            if request.pop("stream", False):
+                channel.send_debug({"stream": "run", "name": "stdout", "text": "1\n"})
+            channel.send_data({"res": 0, "data": request})
+
+
+class ContainerExecutor(Executor):
+    container: Container = None
+
+    def _sct_connect(self):
+        return self.container.client.channel()
+
+
+def execute(settings: dict, on_output=None) -> ContainerExecutor:
+    request = Request(token="token", version="1", settings=settings, timeout=5, body={"code": "print(1)", "test": ""})
+    executor = ContainerExecutor(PLUGIN, request)
+    executor.on_output = on_output
+    executor._sct_send()
+    return executor
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setattr(ResultCache, "size", 0)
+
+
+@pytest.mark.parametrize("features", [("pipeline",), ()])
+def test_settings_handshake(features):
+    container = Container(features)
+    ContainerExecutor.container = container
+    for settings in ({"a": 1}, {"a": 1}, {"a": 2}):
+        executor = execute(settings)
+        assert executor.sct_get_data() == {"res": 0, "data": {"code": "print(1)", "test": ""}}
+        assert container.settings == settings
+    if features:
+        # one packet per request, settings only on digest mismatch
+        assert len(container.received) == 5
+        assert container.received[0]["digest"] == container.received[2]["digest"] != container.received[3]["digest"]
+    else:
+        assert len(container.received) == 9
+    container.client.close()
+
+
+@pytest.mark.parametrize("features", [("pipeline",), ()])
+def test_stream(features):
+    ContainerExecutor.container = Container(features)
+    chunks = []
+    executor = execute({}, chunks.append)
+    assert chunks == [{"stream": "run", "name": "stdout", "text": "1\n"}]
+    assert executor.sct_get_data() == {"res": 0, "data": {"code": "print(1)", "test": ""}}
+    assert executor.sct_get_debug() == []
+    ContainerExecutor.container.client.close()
+
+
+class TimedExecutor(ContainerExecutor):
+    def get_request(self) -> dict:
+        # echoed by the container like the timings of Plugin.exec
+        return {**super().get_request(), "timings": {"run": 1.5}}
+
+
+def test_timings():
+    ContainerExecutor.container = Container(("pipeline",))
+    request = Request(token="token", version="1", settings={}, timeout=5, body={"code": "print(1)", "test": ""})
+    with Timings() as timings:
+        TimedExecutor(PLUGIN, request)._sct_send()
+    stages = timings.serialize()
+    assert list(stages) == ["exchange", "container.run", "total"]
+    assert stages["container.run"] == 1.5 and 0 < stages["exchange"] <= stages["total"]
+    ContainerExecutor.container.client.close()
+
+
+def test_batch_deadline(monkeypatch):
+    (a, b) = socket.socketpair()
+    request = Request(token="token", version="1", settings={}, timeout=5, body={"code": "print(1)", "test": ""})
+    executor = ContainerExecutor(PLUGIN, request)
+    monkeypatch.setattr(executor, "_sct_connect", lambda: SCTSock(a))
+    with timeout_util.deadline(0), pytest.raises(timeout_util.DeadlineExceeded):
+        list(executor._sct_send_batch({0: executor}))
+    b.close()
+
+
+def test_send_async(monkeypatch):
+    # plain connection: no pipelined request, the settings are sent on "init"
+    container = Container(plain=True)
+
+    async def connect(url, port, *, timeout=30):
+        (reader, writer) = await asyncio.open_connection(sock=container.client)
+        return AsyncSCTSock(reader, writer, timeout=timeout)
+
+    monkeypatch.setattr(AsyncSCTSock, "connect", connect)
+    request = Request(token="token", version="1", settings={"a": 1}, timeout=5, body={"code": "print(1)", "test": ""})
+    executor = Executor(PLUGIN, request)
+    asyncio.run(executor._sct_send_async())
+    assert executor.sct_get_data() == {"res": 0, "data": {"code": "print(1)", "test": ""}}
+    assert container.received == ["1", {"a": 1}, {"code": "print(1)", "test": ""}]
@@ -1,3 +1,5 @@
+from asgiref.sync import sync_to_async
+
 from ..docker import Executor as Executor_Docker
 from ..sct import Executor as Executor_SCT
 
@@ -15,10 +17,23 @@ class Executor(Executor_Docker, Executor_SCT):
     def get_url(self):
         return self.get_container_name()
 
+    # port of main.py in the container
+    PORT = 1700
+
     def get_port(self) -> int:
-        return 1700
+        return self.PORT
+
+    def sct_prepare(self):
+        Executor_Docker.execute(self)
 
     def execute(self):
+        if self.sct_load_cached():
+            return  # container isn't needed
         Executor_Docker.execute(self)
         Executor_SCT.execute(self)
 
+    async def execute_async(self):
+        if self.sct_load_cached():
+            return
+        await sync_to_async(Executor_Docker.execute, thread_sensitive=False)(self)
+        await Executor_SCT.execute_async(self)
@@ -0,0 +1,61 @@
+from ..cache import SettingEntry
+from ..models import Plugin, Setting
+from ..plugins.plugin import Plugin as BasePlugin, Executor
+from django.urls import reverse
+import json
+import time
+import types
+import pytest
+
+
+class EchoExecutor(Executor):
+    def execute(self):
+        if self.request.code == "raise":
+            raise ValueError("failed")
+        if self.request.code == "sleep":
+            time.sleep(0.3)
+
+    def get_text(self):
+        return self.request.code
+
+
+@pytest.fixture
+def setting(db, monkeypatch):
+    class EchoPlugin(BasePlugin):
+        Executor = EchoExecutor
+
+    plugin = EchoPlugin(types.SimpleNamespace(uid="test"), "")
+    monkeypatch.setattr(SettingEntry, "get_plugin", lambda self: plugin)
+    Plugin.enable("test")
+    return Setting.objects.create(plugin_id="test", settings="{}")
+
+
+def post(client, token, data):
+    return client.post(reverse("batch", args=[token]), data=data, content_type="application/json")
+
+
+def test_batch(client, setting):
+    res = post(client, setting.token, json.dumps([{"code": "a"}, {"code": "raise"}, {"code": "b"}]))
+    assert res.status_code == 200
+    assert res["Content-Type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in b"".join(res.streaming_content).splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    results = {line["index"]: line for line in lines}
+    assert results[0]["text"] == "a" and results[2]["text"] == "b"
+    assert results[1]["error"]["key"] == "exception"
+
+
+def test_malformed(client, setting):
+    assert post(client, setting.token, json.dumps({"code": "a"})).status_code == 400
+    assert post(client, setting.token, "[").status_code == 400
+    Plugin.disable("test")
+    assert post(client, setting.token, "[]").status_code == 404
+
+
+def test_deadline(client, setting, settings):
+    settings.TIMEOUT = 0.2
+    res = post(client, setting.token, json.dumps([{"code": "a"}, {"code": "sleep"}, {"code": "b"}, {"code": "c"}]))
+    lines = [json.loads(line) for line in b"".join(res.streaming_content).splitlines()]
+    assert [line["index"] for line in lines] == [0, 1, 2, 3]
+    assert lines[0]["text"] == "a" and lines[1]["text"] == "sleep"
+    assert [line["error"]["key"] for line in lines[2:]] == ["timeout", "timeout"]
@@ -0,0 +1,53 @@
+from ..cache import SettingCache
+from ..models import Plugin, Setting
+import pytest
+import uuid
+
+
+@pytest.fixture
+def setting(db):
+    Plugin.enable("test")
+    SettingCache.invalidate()
+    return Setting.objects.create(plugin_id="test", settings='{"debug": true}')
+
+
+def test_get(setting, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        entry = SettingCache.get(setting.token)
+        assert entry.token == str(setting.token)
+        assert entry.version == str(setting.date)
+        assert entry.settings == {"debug": True}
+        assert SettingCache.get(setting.token) is entry
+    stats = SettingCache.get_stats()
+    assert stats["hits"] >= 1 and stats["misses"] >= 1
+
+
+def test_invalidate(setting, django_assert_num_queries):
+    entry = SettingCache.get(setting.token)
+    setting.settings = "{}"
+    setting.save()
+    with django_assert_num_queries(1):
+        assert SettingCache.get(setting.token).settings == {}
+
+
+def test_disabled(setting):
+    assert SettingCache.get(setting.token) is not None
+    Plugin.disable("test")
+    assert SettingCache.get(setting.token) is None
+    assert SettingCache.get("invalid") is None
+
+
+def test_unknown(db, monkeypatch, django_assert_num_queries):
+    monkeypatch.setattr(SettingCache, "size", 2)
+    monkeypatch.setattr(SettingCache, "miss_ttl", 60)
+    SettingCache.invalidate()
+    evictions = SettingCache.get_stats()["evictions"]
+    tokens = [str(uuid.uuid4()) for _ in range(3)]
+    with django_assert_num_queries(3):
+        for token in tokens + tokens[-1:]:
+            assert SettingCache.get(token) is None
+    assert list(SettingCache.entries) == tokens[1:]
+    assert SettingCache.get_stats()["evictions"] == evictions + 1
+    monkeypatch.setattr(SettingCache, "miss_ttl", 0)
+    with django_assert_num_queries(1):
+        assert SettingCache.get(tokens[-1]) is None
@@ -0,0 +1,100 @@
+from .. import metrics
+from ..plugins.plugin.sct_docker import Executor as Executor_SCT_Docker
+from ..plugins.plugin.docker import WarmPool
+from ..util.docker import Image
+from ..util.metrics import Metrics
+from ..util.sctsock import SCTSock, SCTMuxSock
+from django.urls import reverse
+import socket
+import threading
+import types
+import pytest
+
+STATS = {
+    "connections": 2,
+    "exec": {"submitted": 5, "queued": 1, "running": 2, "timeouts": 1},
+    "kill": {"killed": 1, "cpu_time_used": 0.5},
+    "results": {"none": 4, "execution_timeout": 1},
+}
+
+
+def container(listener: socket.socket, frames: list, features: tuple):
+    """answers the metrics frames like main.py"""
+
+    def handle(channel):
+        frames.append(channel.recv().payload)
+        channel.send_data({"res": 0, "data": STATS})
+        channel.close()
+
+    while True:
+        try:
+            (client, _) = listener.accept()
+        except OSError:
+            return
+        sock = SCTSock(client)
+        SCTMuxSock.accept(sock, handle, offer=sock.recv().payload, features=features)
+
+
+def scrape(client, monkeypatch, features=("metrics",)) -> tuple:
+    """(response, frames received by the container)"""
+    frames = []
+    with socket.create_server(("localhost", 0)) as listener:
+        threading.Thread(target=container, args=(listener, frames, features), daemon=True).start()
+        monkeypatch.setattr(metrics, "_running", lambda: ["localhost"])
+        monkeypatch.setattr(Executor_SCT_Docker, "PORT", listener.getsockname()[1])
+        res = client.get(reverse("metrics"))
+    return (res, frames)
+
+
+@pytest.fixture
+def metrics_settings(monkeypatch, settings, tmp_path):
+    settings.METRICS = True
+    settings.METRICS_DIR = str(tmp_path)
+    for (key, value) in (("counters", {}), ("histograms", {}), ("pid", None)):
+        monkeypatch.setattr(Metrics, key, value)
+    return settings
+
+
+def test_disabled(client, settings):
+    settings.METRICS = False
+    assert client.get(reverse("metrics")).status_code == 404
+
+
+def test_metrics(client, metrics_settings, monkeypatch):
+    metrics.observe("api", None, {"execute": 20.0, "total": 25.0})
+    metrics.observe("api", "timeout")
+    metrics_settings.DOCKER_ENABLED = True
+    (res, frames) = scrape(client, monkeypatch)
+    assert res.status_code == 200 and res["Content-Type"].startswith("text/plain")
+    lines = res.content.decode().splitlines()
+    assert frames == [{"metrics": True}]
+    assert 'sct_requests_total{error="none",view="api"} 1' in lines
+    assert 'sct_requests_total{error="timeout",view="api"} 1' in lines
+    assert 'sct_request_stage_seconds_count{stage="execute"} 1' in lines
+    assert any(line.startswith("sct_scheduler_calls_total ") for line in lines)
+    assert 'sct_container_connections{container="localhost"} 2' in lines
+    assert 'sct_container_exec_timeouts_total{container="localhost"} 1' in lines
+    assert 'sct_container_killed_cpu_used_seconds_total{container="localhost"} 0.5' in lines
+    assert 'sct_container_results_total{code="execution_timeout",container="localhost"} 1' in lines
+
+
+def test_container_without_metrics(client, metrics_settings, monkeypatch):
+    metrics_settings.DOCKER_ENABLED = True
+    (res, frames) = scrape(client, monkeypatch, ("pipeline", "stream"))
+    assert res.status_code == 200
+    assert frames == []
+    assert "sct_container_connections" not in res.content.decode()
+
+
+def test_running(monkeypatch):
+    plugin = types.SimpleNamespace(Executor=Executor_SCT_Docker, info=types.SimpleNamespace(uid="python", version="2"))
+    images = []
+
+    def get_container(image):
+        images.append(image.get_ident())
+        return [types.SimpleNamespace(name=name, status=status) for (name, status) in (("a", "running"), ("b", "exited"))]
+
+    monkeypatch.setattr(WarmPool, "plugins", classmethod(lambda cls: [plugin]))
+    monkeypatch.setattr(Image, "get_container", get_container)
+    assert metrics._running() == ["a"]
+    assert images == [Image("python", "2").get_ident()]
@@ -0,0 +1,68 @@
+from ..cache import SettingEntry
+from ..models import Plugin, Setting
+from ..plugins.plugin import Plugin as BasePlugin, Executor
+from ..util.stream import OutputStream
+from django.urls import reverse
+import json
+import types
+import pytest
+
+
+class EchoExecutor(Executor):
+    def execute(self):
+        if self.request.code == "raise":
+            raise ValueError("failed")
+        for line in self.request.code.splitlines(True):
+            if self.on_output is not None:
+                self.on_output({"stream": "run", "name": "stdout", "text": line})
+
+    def get_text(self):
+        return self.request.code
+
+
+@pytest.fixture
+def setting(db, monkeypatch):
+    class EchoPlugin(BasePlugin):
+        Executor = EchoExecutor
+
+    plugin = EchoPlugin(types.SimpleNamespace(uid="test"), "")
+    monkeypatch.setattr(SettingEntry, "get_plugin", lambda self: plugin)
+    Plugin.enable("test")
+    return Setting.objects.create(plugin_id="test", settings="{}")
+
+
+def post(client, token, data) -> list:
+    res = client.post(reverse("stream", args=[token]), data=data, content_type="application/json")
+    if res.status_code != 200:
+        return res.status_code
+    assert res["Content-Type"] == "text/event-stream"
+    events = []
+    for event in b"".join(res.streaming_content).decode("utf8").split("\n\n")[:-1]:
+        (name, data) = event.split("\n")
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_stream(client, setting):
+    events = post(client, setting.token, json.dumps({"code": "a\nb"}))
+    assert events[:2] == [("output", {"stream": "run", "name": "stdout", "text": text}) for text in ("a\n", "b")]
+    assert events[2] == ("result", {"points": 0, "text": "a\nb"})
+    events = post(client, setting.token, json.dumps({"code": "raise"}))
+    assert len(events) == 1 and events[0][1]["error"]["key"] == "exception"
+
+
+def test_malformed(client, setting):
+    assert post(client, setting.token, "[]") == 400
+    Plugin.disable("test")
+    assert post(client, setting.token, "{}") == 404
+
+
+def test_output_stream_is_bounded():
+    stream = OutputStream(2)
+    assert all(stream.put({"text": str(i)}) for i in range(2))
+    assert not stream.put({"text": "2"}) and not stream.put({"text": "3"})
+    assert [chunk["text"] for chunk in stream.read(1)] == ["0", "1"]  # closed after timeout
+    assert stream.put({"text": "4"})
+    stream.close()
+    assert list(stream.read()) == [{"text": "4", "dropped": 2}]
+    assert stream.dropped == 2 and not stream.put({"text": "5"})
@@ -0,0 +1,47 @@
+from ..cache import SettingCache, SettingEntry
+from ..models import Plugin, Setting
+from ..plugins.plugin import Plugin as BasePlugin, Executor
+from ..util.timing import Timings
+from django.urls import reverse
+import json
+from collections import OrderedDict
+import types
+import pytest
+
+
+class TimedExecutor(Executor):
+    def execute(self):
+        with Timings.stage("connect"):
+            pass
+        Timings.current().merge("container", {"run": 1.5})
+
+    def get_text(self):
+        return self.request.code
+
+
+@pytest.fixture
+def setting(db, monkeypatch):
+    class TimedPlugin(BasePlugin):
+        Executor = TimedExecutor
+
+    plugin = TimedPlugin(types.SimpleNamespace(uid="test"), "")
+    monkeypatch.setattr(SettingEntry, "get_plugin", lambda self: plugin)
+    Plugin.enable("test")
+    setting = Setting.objects.create(plugin_id="test", settings="{}")
+    # API.post runs in another thread, which doesn't see the test database
+    monkeypatch.setattr(SettingCache, "entries", OrderedDict())
+    SettingCache.get(setting.token)
+    return setting
+
+
+def post(client, token):
+    return client.post(reverse("api", args=[token]), data=json.dumps({"code": "a"}), content_type="application/json")
+
+
+def test_timings(client, setting, settings):
+    assert "timings" not in json.loads(post(client, setting.token).content)
+    settings.TIMINGS = True
+    data = json.loads(post(client, setting.token).content)
+    assert data["text"] == "a"
+    assert list(data["timings"]) == ["setting", "connect", "container.run", "execute", "total"]
+    assert data["timings"]["container.run"] == 1.5 and data["timings"]["execute"] <= data["timings"]["total"]
@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.urls import path, re_path
 from . import views
 
 urlpatterns = [
     path("", views.error_404, name="index"),
-    path("<uuid:token>", views.API.as_view(), name="api"),
+    path("metrics", views.Metrics.as_view(), name="metrics"),
+    path("<uuid:token>", views.api_async if settings.ASYNC else views.API.as_view(), name="api"),
+    path("<uuid:token>/batch", views.Batch.as_view(), name="batch"),
+    path("<uuid:token>/stream", views.Stream.as_view(), name="stream"),
     re_path(r".*", views.error_404),
 ]
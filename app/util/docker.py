@@ -1,6 +1,8 @@
 import docker
 import typing
 import os
+import threading
+import uuid
 
 from django.conf import settings
 
@@ -13,14 +15,61 @@ DOCKER_ENABLED = settings.DOCKER_ENABLED
 
 
 LockHandler.register("docker")
+# one process at a time fills the warm pools
+LockHandler.register("docker_pool")
 
 
 ContainerType = docker.models.containers.Container
 ImageType = docker.models.images.Image
 
 
+class ApiCalls:
+    """Counts the requests to the docker daemon.
+
+        with ApiCalls() as calls:
+            ...
+        calls.count: requests of the current thread within the block
+    """
+
+    lock = threading.Lock()
+    total = 0
+    local = threading.local()
+
+    def __init__(self):
+        self.count = 0
+        self._outer = None
+
+    def __enter__(self):
+        self._outer = getattr(self.local, "calls", None)
+        self.local.calls = self
+        return self
+
+    def __exit__(self, *args):
+        self.local.calls = self._outer
+        if self._outer is not None:
+            self._outer.count += self.count
+
+    @classmethod
+    def add(cls, *args, **kwargs):
+        """response hook of the docker client (requests.Session)"""
+        with cls.lock:
+            cls.total += 1
+        if (calls := getattr(cls.local, "calls", None)) is not None:
+            calls.count += 1
+
+    @classmethod
+    def install(cls, client: docker.DockerClient) -> docker.DockerClient:
+        client.api.hooks["response"].append(cls.add)
+        return client
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        with cls.lock:
+            return {"calls": cls.total}
+
+
 class _Docker:
-    client = docker.from_env() if DOCKER_ENABLED else None
+    client = ApiCalls.install(docker.from_env()) if DOCKER_ENABLED else None
 
     @classmethod
     def get(cls):
@@ -35,8 +84,16 @@ class _Container:
         return _Docker.get().containers.get(name)
 
     @classmethod
-    def create(cls, image: str, name: str, network: str) -> ContainerType:
-        return _Docker.get().containers.create(image, name=name, network=network)
+    def create(cls, image: str, name: str, network: str, environment: dict = None) -> ContainerType:
+        return _Docker.get().containers.create(
+            image, name=name, network=network, environment=environment
+        )
+
+    @classmethod
+    def rename(cls, name: str, new_name: str) -> ContainerType:
+        cnt = cls.get(name)
+        cnt.rename(new_name)
+        return cnt
 
     @classmethod
     def ls(cls, filter=None) -> typing.List[ContainerType]:
@@ -51,8 +108,8 @@ class _Container:
         return res
 
     @classmethod
-    def start(cls, name: str) -> ContainerType:
-        cnt = cls.get(name)
+    def start(cls, name: str, cnt: ContainerType = None) -> ContainerType:
+        cnt = cnt or cls.get(name)
         networks = cnt.attrs.get("NetworkSettings", {}).get("Networks", {})
         for network in networks:
             n = _Docker.get().networks.get(network)
@@ -93,6 +150,197 @@ class _Image:
         return _Docker.get().images.build(path=path, tag=tag, rm=True)
 
 
+class State:
+    """Process-wide cache of the status of the containers (by name) and the image tags of SCT.
+
+    The cache is updated by the events of the docker daemon and reconciled with
+    a full listing after the events stream was (re)connected and every
+    DOCKER_STATE_RECONCILE seconds. Until it is synchronized, the state is
+    unknown and callers ask the docker daemon.
+    """
+
+    # container events which change the status
+    STATUS = {
+        "create": "created",
+        "start": "running",
+        "restart": "running",
+        "unpause": "running",
+        "pause": "paused",
+        "die": "exited",
+        "destroy": None,
+    }
+
+    lock = threading.Lock()
+    pid = None
+    synced = False
+    containers: typing.Dict[str, str] = {}
+    images: typing.Set[str] = set()
+    # sequence number of the last change of a container, changes after
+    # the start of a reconciliation are newer than its listing
+    seq = 0
+    changed: typing.Dict[str, int] = {}
+    events = 0
+    reconciliations = 0
+    _exit: threading.Event = None
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return DOCKER_ENABLED and settings.DOCKER_STATE_CACHE
+
+    @classmethod
+    def start(cls):
+        """start the threads of this process (once, threads don't survive a fork)"""
+        with cls.lock:
+            if cls.pid == os.getpid() or not cls.enabled():
+                return
+            cls.pid = os.getpid()
+            cls.synced = False
+            cls._exit = threading.Event()
+        for target in (cls._watch, cls._reconcile_loop):
+            thread = threading.Thread(target=target, args=(cls._exit,), name="sct_docker_state")
+            thread.daemon = True
+            thread.start()
+
+    @classmethod
+    def stop(cls):
+        with cls.lock:
+            if cls._exit is not None:
+                cls._exit.set()
+            cls.pid = None
+            cls.synced = False
+
+    @classmethod
+    def container(cls, name: str) -> typing.Tuple[bool, typing.Union[str, None]]:
+        """(synchronized, status of the container or None if it doesn't exist)"""
+        cls.start()
+        with cls.lock:
+            if not cls.synced:
+                return (False, None)
+            return (True, cls.containers.get(name, None))
+
+    @classmethod
+    def image(cls, tag: str) -> typing.Tuple[bool, bool]:
+        """(synchronized, image exists)"""
+        cls.start()
+        with cls.lock:
+            return (cls.synced, cls.synced and tag in cls.images)
+
+    @classmethod
+    def set(cls, name: str, status: typing.Union[str, None]):
+        """status of a container changed by this process, before its event arrives"""
+        with cls.lock:
+            cls._set(name, status)
+
+    @classmethod
+    def _set(cls, name: str, status: typing.Union[str, None]):
+        cls.seq += 1
+        cls.changed[name] = cls.seq
+        if status is None:
+            cls.containers.pop(name, None)
+        else:
+            cls.containers[name] = status
+
+    @classmethod
+    def apply(cls, event: dict):
+        """update the cache with an event of the docker daemon"""
+        action = event.get("Action", event.get("status", ""))
+        attributes = event.get("Actor", {}).get("Attributes", {})
+        with cls.lock:
+            cls.events += 1
+        if event.get("Type") == "image":
+            if action in ("tag", "untag", "delete", "import", "load", "pull"):
+                cls._reconcile_images()
+            return
+        if event.get("Type") != "container":
+            return
+        name = attributes.get("name", "")
+        with cls.lock:
+            if action == "rename":
+                old = attributes.get("oldName", "").lstrip("/")
+                status = cls.containers.get(old, None)
+                cls._set(old, None)
+                if name.startswith(f"{PREFIX}_"):
+                    cls._set(name, status)
+            elif action in cls.STATUS and name.startswith(f"{PREFIX}_"):
+                cls._set(name, cls.STATUS[action])
+
+    @classmethod
+    def reconcile(cls):
+        """replace the cache with a listing of the docker daemon"""
+        with cls.lock:
+            seq = cls.seq
+        client = _Docker.get()
+        containers = {
+            c.name: c.status
+            for c in client.containers.list(all=True, filters={"name": f"{PREFIX}_"})
+            if c.name.startswith(f"{PREFIX}_")
+        }
+        images = cls._list_images()
+        with cls.lock:
+            for (name, changed) in cls.changed.items():
+                if changed <= seq:
+                    continue
+                if name in cls.containers:
+                    containers[name] = cls.containers[name]
+                else:
+                    containers.pop(name, None)
+            cls.changed = {name: changed for (name, changed) in cls.changed.items() if changed > seq}
+            cls.containers = containers
+            cls.images = images
+            cls.synced = True
+            cls.reconciliations += 1
+
+    @classmethod
+    def _list_images(cls) -> typing.Set[str]:
+        return {tag for image in _Docker.get().images.list() for tag in image.tags if tag.startswith(f"{PREFIX}_")}
+
+    @classmethod
+    def _reconcile_images(cls):
+        images = cls._list_images()
+        with cls.lock:
+            cls.images = images
+
+    @classmethod
+    def _watch(cls, exit: threading.Event):
+        """applies the events of the docker daemon, reconnects after errors"""
+        while not exit.is_set():
+            try:
+                stream = _Docker.get().events(decode=True, filters={"type": ["container", "image"]})
+                # after subscribing: changes during the listing are received as events
+                cls.reconcile()
+                for event in stream:
+                    if exit.is_set():
+                        break
+                    cls.apply(event)
+                stream.close()
+            except Exception as e:
+                logging.warning("docker events: %s", str(e))
+            with cls.lock:
+                cls.synced = False
+            exit.wait(1)
+
+    @classmethod
+    def _reconcile_loop(cls, exit: threading.Event):
+        while not exit.wait(settings.DOCKER_STATE_RECONCILE):
+            with cls.lock:
+                if not cls.synced:
+                    continue
+            try:
+                cls.reconcile()
+            except Exception as e:
+                logging.warning("docker reconciliation: %s", str(e))
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        with cls.lock:
+            return {
+                "synced": cls.synced,
+                "containers": len(cls.containers),
+                "events": cls.events,
+                "reconciliations": cls.reconciliations,
+            }
+
+
 def add_prefix(name: str) -> str:
     if name.startswith(PREFIX):
         return name
@@ -160,7 +408,8 @@ class Image:
     def create(self, directory: str) -> bool:
         with logging.LogCall(__file__, "create", self.__class__):
             with LockHandler.get("docker"):
-                if self.exists():
+                (synced, exists) = State.image(self.get_ident())
+                if exists or (not synced and self.exists()):
                     return False
                 _plugindir = os.path.join(directory, "container")
                 _Image.create(self.get_ident(), _plugindir)
@@ -212,6 +461,7 @@ class Container:
         with logging.LogCall(__file__, "delete", self.__class__):
             with LockHandler.get("docker"):
                 _Container.delete(self.get_ident())
+                State.set(self.get_ident(), None)
 
     def create(self, image: Image) -> bool:
         with logging.LogCall(__file__, "create", self.__class__):
@@ -221,6 +471,7 @@ class Container:
                 _Container.create(
                     image.get_ident(), self.get_ident(), DOCKER_NETWORK,
                 )
+                State.set(self.get_ident(), "created")
                 return True
 
     def start(self) -> bool:
@@ -231,7 +482,8 @@ class Container:
                     return False
                 if cnt.status in (self.State.RUNNING, self.State.RESTARTING):
                     return False
-                _Container.start(self.get_ident())
+                _Container.start(self.get_ident(), cnt)
+                State.set(self.get_ident(), self.State.RUNNING)
                 return True
 
     def stop(self) -> bool:
@@ -241,14 +493,22 @@ class Container:
                 if cnt.status == self.State.EXITED:
                     return False
             _Container.stop(self.get_ident())
+            State.set(self.get_ident(), self.State.EXITED)
             return True
 
+    def status(self) -> typing.Union[str, None]:
+        """status of the container or None if it doesn't exist.
+        Answered by the State cache if it is synchronized."""
+        with logging.LogCall(__file__, "status", self.__class__):
+            (synced, status) = State.container(self.get_ident())
+            if synced:
+                return status
+            cnt = self.exists()
+            return cnt.status if cnt else None
+
     def is_running(self) -> bool:
         with logging.LogCall(__file__, "is_running", self.__class__):
-            data = self.exists()
-            if data:
-                return data.status == self.State.RUNNING
-            return False
+            return self.status() == self.State.RUNNING
 
     def logs(self) -> str:
         with logging.LogCall(__file__, "logs", self.__class__):
@@ -256,3 +516,87 @@ class Container:
             if not container:
                 return None
             return container.logs(tail=1000)
+
+
+class Pool:
+    """Idle containers of an image which are started in advance.
+    A pool container is renamed when it is claimed by a Container.
+    """
+
+    PREFIX = "pool"
+
+    def __init__(self, image: Image):
+        with logging.LogCall(__file__, "__init__", self.__class__):
+            self.image = image
+            self.prefix = f"{self.PREFIX}_{image.name}_"
+
+    @classmethod
+    def is_pool(cls, name: str) -> bool:
+        return remove_prefix(name).startswith(f"{cls.PREFIX}_")
+
+    def _ls(self) -> typing.List[ContainerType]:
+        return tuple(
+            c for c in _Container.ls(self.prefix) if remove_prefix(c.name).startswith(self.prefix)
+        )
+
+    def ls(self) -> typing.List[ContainerType]:
+        """pool containers of this image"""
+        with logging.LogCall(__file__, "ls", self.__class__):
+            ident = self.image.get_ident()
+            return tuple(c for c in self._ls() if c.attrs["Config"]["Image"] == ident)
+
+    def idle(self) -> typing.List[ContainerType]:
+        """running pool containers of this image"""
+        with logging.LogCall(__file__, "idle", self.__class__):
+            return tuple(c for c in self.ls() if c.status == Container.State.RUNNING)
+
+    def claim(self, container: Container) -> bool:
+        """rename an idle pool container to the name of container"""
+        with logging.LogCall(__file__, "claim", self.__class__):
+            with LockHandler.get("docker"):
+                if container.exists():
+                    return False
+                for cnt in self.idle():
+                    try:
+                        _Container.rename(cnt.name, container.get_ident())
+                        State.set(cnt.name, None)
+                        State.set(container.get_ident(), cnt.status)
+                        return True
+                    except docker.errors.APIError as e:
+                        logging.warning("could not claim %s: %s", cnt.name, str(e))
+                return False
+
+    def fill(self, size: int) -> int:
+        """start containers until size containers are idle.
+        removes stopped or surplus pool containers and pool containers of other image versions.
+        The docker lock is only held to remove surplus containers (they could be claimed
+        meanwhile), containers are created and started without it.
+
+            Returns:
+                - number of started containers
+        """
+        with logging.LogCall(__file__, "fill", self.__class__):
+            ident = self.image.get_ident()
+            with LockHandler.get("docker_pool"):
+                (idle, surplus) = (0, [])
+                for cnt in self._ls():
+                    if cnt.attrs["Config"]["Image"] != ident or cnt.status != Container.State.RUNNING:
+                        cnt.remove(force=True)  # never claimed
+                    elif idle < size:
+                        idle += 1
+                    else:
+                        surplus.append(cnt.name)
+                if surplus:
+                    with LockHandler.get("docker"):
+                        for name in surplus:
+                            try:
+                                _Container.get(name).remove(force=True)
+                            except docker.errors.NotFound:
+                                pass  # claimed meanwhile
+                created = 0
+                for _ in range(size - idle):
+                    name = add_prefix(f"{self.prefix}{uuid.uuid4().hex[:12]}")
+                    _Container.create(ident, name, DOCKER_NETWORK, {"SCT_WARM": "1"})
+                    _Container.start(name)
+                    created += 1
+                return created
@@ -129,12 +129,16 @@ class ANSI:
     def _escape(self):
         while (pos := self.text.find("\x1b[")) >= 0:
             data = self.REGEX.match(self.text, pos)
+            if data == None:
+                self.text = self.text[:pos] + self.text[pos + 2:]
+                continue
             key = data.groups()[0]
             if key == "0":
                 self.repl(self.close())
                 continue
             val = self.ESCAPE.get(key)
             if val == None:
+                self.repl("")  # unsupported code
                 continue
             self.keys.append(key)
             self.repl(self.get_repl(key))
@@ -1,10 +1,16 @@
+import collections
+import contextvars
+import functools
 import logging
 import os
+import threading
+import time
 
 from django.conf import settings
 
 
-logging.addLevelName(5, "TRACE")
+TRACE = 5
+logging.addLevelName(TRACE, "TRACE")
 logging.basicConfig(
     format="%(name)s:%(levelname)s:%(process)x:%(thread)x:%(created).4f:%(message)s"
 )
@@ -26,22 +32,127 @@ LOG_LEVEL = get_level_by_level(settings.LOG_LEVEL)
 ROOT_DIR = settings.ROOT_DIR
 
 
+@functools.lru_cache(maxsize=None)
+def _relpath(file: str) -> str:
+    return os.path.relpath(file, ROOT_DIR)
+
+
+class Span:
+    """a call traced by LogCall"""
+
+    __slots__ = ("name", "file", "parent", "depth", "start", "duration", "error", "token")
+
+    def __init__(self, name: str, file: str, parent: "Span" = None):
+        self.name = name
+        self.file = file
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent else 0
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.token = None
+
+    def serialize(self) -> dict:
+        return {
+            "name": self.name,
+            "file": self.file,
+            "parent": self.parent.name if self.parent else None,
+            "depth": self.depth,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "error": self.error,
+        }
+
+
+class Spans:
+    """Recorder of the finished spans of this process (only if TRACE is enabled).
+    Keeps the latest spans and count, total and max. duration per name.
+    The running span is kept in a context variable, so coroutines which hold
+    a LogCall across awaits have their own parent."""
+
+    lock = threading.Lock()
+    _current: contextvars.ContextVar = contextvars.ContextVar("sct_span", default=None)
+    recent = collections.deque(maxlen=1000)
+    totals = {}
+
+    @classmethod
+    def current(cls) -> Span:
+        """innermost running span of the current thread or task"""
+        return cls._current.get()
+
+    @classmethod
+    def enter(cls, name: str, file: str) -> Span:
+        span = Span(name, file, cls.current())
+        span.token = cls._current.set(span)
+        return span
+
+    @classmethod
+    def exit(cls, span: Span, error: type = None):
+        span.duration = time.perf_counter() - span.start
+        span.error = error.__name__ if error else None
+        cls._current.reset(span.token)
+        with cls.lock:
+            cls.recent.append(span)
+            total = cls.totals.setdefault(span.name, [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += span.duration
+            total[2] = max(total[2], span.duration)
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        """{name: {count, total_ms, max_ms}}"""
+        with cls.lock:
+            return {
+                name: {"count": count, "total_ms": round(total * 1000, 3), "max_ms": round(_max * 1000, 3)}
+                for (name, (count, total, _max)) in cls.totals.items()
+            }
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.recent.clear()
+            cls.totals.clear()
+
+
+class _Disabled:
+    """LogCall if TRACE is disabled: does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error, error_message, traceback):
+        return False
+
+
+_DISABLED = _Disabled()
+
+
 class LogCall:
+    """traces a call (TRACE): logs its start and end with the duration and records it as Span.
+    Returns a shared object which does nothing if TRACE is disabled for the logger."""
+
+    def __new__(cls, file: str, name: str, _class=None, logger=None):
+        if not (logger or main_logger).is_trace():
+            return _DISABLED
+        return super().__new__(cls)
+
     def __init__(self, file: str, name: str, _class=None, logger=None):
-        self.file = os.path.relpath(file, ROOT_DIR)
+        self.file = _relpath(file)
         if isinstance(_class, type):
             self.name = f"{_class.__name__}.{name}"
         else:
             self.name = name
         self.logger = logger if logger else main_logger
+        self.span: Span = None
 
     def __enter__(self):
+        self.span = Spans.enter(self.name, self.file)
         self.logger.trace(">:%s:%s", self.name, self.file)
         return self
 
     def __exit__(self, error, error_message, traceback):
+        Spans.exit(self.span, error)
         self.logger.trace(
-            "<:%s:%s:%s", self.name, self.file, type(error).__name__ if error else False
+            "<:%s:%s:%s:%.3fms", self.name, self.file, self.span.error or False, self.span.duration * 1000
         )
         if error:
             raise
@@ -58,8 +169,11 @@ class Logger:
     def get_trace(self, file: str, name: str, _class=None) -> LogCall:
         return LogCall(file, name, _class, self)
 
+    def is_trace(self) -> bool:
+        return self.logger.isEnabledFor(TRACE)
+
     def trace(self, *args, **kwargs):
-        return self.logger.log(5, *args, **kwargs)
+        return self.logger.log(TRACE, *args, **kwargs)
 
     def debug(self, *args, **kwargs):
         return self.logger.debug(*args, **kwargs)
@@ -0,0 +1,206 @@
+"""Prometheus metrics of the web tier.
+
+Every worker process counts in memory and writes a snapshot to
+METRICS_DIR/<pid>.json every METRICS_INTERVAL seconds and when it's scraped.
+The metrics view sums the snapshots of all workers. Snapshots which weren't
+updated for three intervals belong to stopped workers and are removed, so
+their counters are reset like after a restart.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import typing
+
+from django.conf import settings
+
+from . import log as logging
+
+# upper bounds of the buckets of histograms in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+KINDS = ("counter", "gauge", "histogram")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def labels(values: dict = None) -> str:
+    """label set of a sample without braces, sorted by name: a="1",b="2" """
+    return ",".join(f'{key}="{_escape(str(value))}"' for (key, value) in sorted((values or {}).items()))
+
+
+def _braces(*items: str) -> str:
+    items = [item for item in items if item]
+    return "{" + ",".join(items) + "}" if items else ""
+
+
+class Metrics:
+    """Counters and histograms of this process, gauges and counters of other
+    components are read by collectors when a snapshot is taken.
+
+    Metrics.inc("sct_requests_total", {"error": "none"})
+    Metrics.observe("sct_request_stage_seconds", 0.1, {"stage": "total"})
+    Metrics.collector(fn): fn() yields (kind, name, labels, value), see Metrics.stats
+    """
+
+    lock = threading.Lock()
+    pid = None
+    # name -> {labels: value}
+    counters: typing.Dict[str, typing.Dict[str, float]] = {}
+    # name -> {labels: [count per bucket..., count above the last bucket, sum]}
+    histograms: typing.Dict[str, typing.Dict[str, list]] = {}
+    collectors: typing.List[typing.Callable] = []
+
+    @classmethod
+    def inc(cls, name: str, values: dict = None, value: float = 1):
+        cls.start()
+        key = labels(values)
+        with cls.lock:
+            counter = cls.counters.setdefault(name, {})
+            counter[key] = counter.get(key, 0) + value
+
+    @classmethod
+    def observe(cls, name: str, seconds: float, values: dict = None):
+        cls.start()
+        key = labels(values)
+        index = next((i for (i, bound) in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))
+        with cls.lock:
+            histogram = cls.histograms.setdefault(name, {})
+            if (entry := histogram.get(key)) is None:
+                entry = histogram[key] = [0] * (len(BUCKETS) + 2)
+            entry[index] += 1
+            entry[-1] += seconds
+
+    @classmethod
+    def collector(cls, fn: typing.Callable[[], typing.Iterable[tuple]]):
+        with cls.lock:
+            cls.collectors.append(fn)
+        return fn
+
+    @staticmethod
+    def stats(prefix: str, stats: dict, counters=(), gauges=(), values: dict = None) -> typing.Iterator[tuple]:
+        """samples of a get_stats dict: counters are named <prefix>_<key>_total, gauges <prefix>_<key>"""
+        for key in counters:
+            yield ("counter", f"{prefix}_{key}_total", values, stats.get(key, 0))
+        for key in gauges:
+            yield ("gauge", f"{prefix}_{key}", values, stats.get(key, 0))
+
+    @staticmethod
+    def add(data: dict, samples: typing.Iterable[tuple]):
+        """adds samples (kind, name, labels, value) of counters and gauges to a snapshot"""
+        for (kind, name, values, value) in samples:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            entry = data[kind].setdefault(name, {})
+            key = labels(values)
+            entry[key] = entry.get(key, 0) + value
+
+    @staticmethod
+    def merge(data: dict, other: dict):
+        """adds the snapshot other to data"""
+        for kind in KINDS:
+            for (name, samples) in other.get(kind, {}).items():
+                entry = data[kind].setdefault(name, {})
+                for (key, value) in samples.items():
+                    if kind == "histogram":
+                        if (current := entry.get(key)) is not None and len(current) == len(value):
+                            value = [a + b for (a, b) in zip(current, value)]
+                        entry[key] = value
+                    else:
+                        entry[key] = entry.get(key, 0) + value
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        data = {kind: {} for kind in KINDS}
+        with cls.lock:
+            data["counter"] = {name: dict(samples) for (name, samples) in cls.counters.items()}
+            data["histogram"] = {
+                name: {key: list(entry) for (key, entry) in samples.items()}
+                for (name, samples) in cls.histograms.items()
+            }
+            collectors = list(cls.collectors)
+        for collector in collectors:
+            try:
+                cls.add(data, collector())
+            except Exception as e:
+                logging.warning("metrics collector %s: %s", getattr(collector, "__name__", ""), str(e))
+        return data
+
+    @classmethod
+    def get_dir(cls) -> str:
+        return settings.METRICS_DIR or os.path.join(tempfile.gettempdir(), "sct_metrics")
+
+    @classmethod
+    def write(cls):
+        """writes the snapshot of this process"""
+        directory = cls.get_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(cls.snapshot(), file)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def read(cls) -> dict:
+        """sum of the snapshots of all workers, the snapshot of this process is written first"""
+        cls.write()
+        data = {kind: {} for kind in KINDS}
+        expired = time.time() - 3 * settings.METRICS_INTERVAL
+        for entry in os.scandir(cls.get_dir()):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                if entry.stat().st_mtime < expired:
+                    os.remove(entry.path)
+                    continue
+                with open(entry.path) as file:
+                    cls.merge(data, json.load(file))
+            except (OSError, ValueError):
+                continue  # removed or replaced meanwhile
+        return data
+
+    @staticmethod
+    def render(data: dict) -> str:
+        """text exposition format of Prometheus"""
+        lines = []
+        for kind in ("counter", "gauge"):
+            for (name, samples) in sorted(data[kind].items()):
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_braces(key)} {value}" for (key, value) in sorted(samples.items()))
+        for (name, samples) in sorted(data["histogram"].items()):
+            lines.append(f"# TYPE {name} histogram")
+            for (key, entry) in sorted(samples.items()):
+                count = 0
+                for (bound, value) in zip((*BUCKETS, "+Inf"), entry[:-1]):
+                    count += value
+                    le = f'le="{bound}"'
+                    lines.append(f"{name}_bucket{_braces(key, le)} {count}")
+                lines.append(f"{name}_sum{_braces(key)} {entry[-1]}")
+                lines.append(f"{name}_count{_braces(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def start(cls):
+        """start the thread which writes the snapshots of this process (once, threads don't survive a fork)"""
+        if cls.pid == os.getpid() or not settings.METRICS:
+            return
+        with cls.lock:
+            if cls.pid == os.getpid():
+                return
+            cls.pid = os.getpid()
+        thread = threading.Thread(target=cls._write_loop, name="sct_metrics")
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def _write_loop(cls):
+        pid = os.getpid()
+        while cls.pid == pid:
+            try:
+                cls.write()
+            except Exception as e:
+                logging.warning("metrics: %s", str(e))
+            time.sleep(settings.METRICS_INTERVAL)
@@ -1,12 +1,45 @@
 """SCTSocket Referenz
 """
 
+import asyncio
+import os
 import socket
 import json
 import time
+import queue
+import threading
+import zlib
 from enum import IntEnum
 from struct import Struct
-from typing import Any
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:  # optional, JSON is used without it
+    msgpack = None
+
+# max. size of received (and decompressed) payloads
+MAX_PAYLOAD = 128 * 1024 * 1024
+# payloads above this size are compressed if the encoding allows it
+COMPRESS_THRESHOLD = 64 * 1024
+# flag of the payload type: payload is zlib compressed
+COMPRESSED = 0x100
+
+
+def get_encodings() -> List[str]:
+    """Encodings of JSON serializable payloads supported by this side, preferred first"""
+    ret = ["json+zlib", "json"]
+    if msgpack is not None:
+        ret = ["msgpack+zlib", "msgpack"] + ret
+    return ret
+
+
+def select_encoding(offered: Iterable[str]) -> str:
+    """Preferred encoding which is supported by both sides, "json" if there is none"""
+    for encoding in get_encodings():
+        if encoding in offered:
+            return encoding
+    return "json"
 
 
 def create_socket(url: str, port: int, client: bool = True):
@@ -27,6 +60,7 @@ def create_socket(url: str, port: int, client: bool = True):
             except:
                 time.sleep(0.2)
         raise ConnectionError("Couldn't connect to socket...")
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     sock.bind((url, port))
     sock.listen()
     return sock
@@ -37,12 +71,14 @@ class PacketType(IntEnum):
     init = 1
     debug = 2
     data = 3
+    mux = 4
 
 
 class PayloadType(IntEnum):
     plain = 0
     binary = 1
     JSON = 2
+    msgpack = 3
 
 
 class Packet:
@@ -60,29 +96,44 @@ class Packet:
 class _Packet:
     HEADER = Struct("<iii")
 
-    def __init__(self, packet_type: PacketType = PacketType.none, payload: Any = ""):
+    def __init__(self, packet_type: PacketType = PacketType.none, payload: Any = "", encoding: str = "json"):
         self.packet_type = packet_type
         self.payload_type = PayloadType.binary
         if isinstance(payload, str):
             self.payload_type = PayloadType.plain
         elif not isinstance(payload, bytes):
-            self.payload_type = PayloadType.JSON
-            payload = json.dumps(payload)
+            if encoding.startswith("msgpack"):
+                self.payload_type = PayloadType.msgpack
+                payload = msgpack.packb(payload, use_bin_type=True)
+            else:
+                self.payload_type = PayloadType.JSON
+                payload = json.dumps(payload)
         if isinstance(payload, str):
             payload = payload.encode("utf8")
+        if encoding.endswith("+zlib") and len(payload) > COMPRESS_THRESHOLD:
+            payload = zlib.compress(payload, 1)
+            self.payload_type |= COMPRESSED
         self.payload: bytes = payload
         self.size = len(self.payload)
 
     def get(self) -> Packet:
-        return Packet(self.packet_type, self.get_payload(), self.payload_type)
+        return Packet(self.packet_type, self.get_payload(), self.payload_type & ~COMPRESSED)
 
     def get_payload(self) -> Any:
-        if self.payload_type == PayloadType.binary:
-            return self.payload
-        payload = self.payload.decode("utf8")
-        if self.payload_type == PayloadType.JSON:
-            payload = json.loads(payload)
-        return payload
+        payload = self.payload
+        payload_type = self.payload_type
+        if payload_type & COMPRESSED:
+            payload = _decompress(payload)
+            payload_type &= ~COMPRESSED
+        if payload_type == PayloadType.binary:
+            return bytes(payload)
+        if payload_type == PayloadType.JSON:
+            return json.loads(payload)  # decodes the received buffer directly
+        if payload_type == PayloadType.msgpack:
+            if msgpack is None:
+                raise ValueError("msgpack payload received, but msgpack isn't installed")
+            return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+        return str(payload, "utf8")
 
     def get_header(self) -> bytes:
         return self.HEADER.pack(self.packet_type, self.size, self.payload_type)
@@ -98,12 +149,64 @@ class _Packet:
         return f"{self.__class__}: {self.packet_type!r} {self.payload_type!r}, {self.get_payload()}"
 
 
+class _MuxPacket(_Packet):
+    """Packet of a multiplexed connection, the header starts with the request id."""
+    HEADER = Struct("<iiii")
+
+    def __init__(self, request_id: int = 0, packet_type: PacketType = PacketType.none, payload: Any = ""):
+        super().__init__(packet_type, payload)
+        self.request_id = request_id
+
+    @classmethod
+    def from_packet(cls, request_id: int, packet: _Packet) -> "_MuxPacket":
+        ret = cls(request_id, packet.packet_type)
+        ret.payload_type = packet.payload_type
+        ret.payload = packet.payload
+        ret.size = packet.size
+        return ret
+
+    def get_header(self) -> bytes:
+        return self.HEADER.pack(self.request_id, self.packet_type, self.size, self.payload_type)
+
+    def set_header(self, data: bytes):
+        (rid, t, s, pt) = self.HEADER.unpack(data)
+        self.request_id = rid
+        self.packet_type = PacketType(t)
+        self.size = s
+        self.payload_type = pt
+        return s
+
+
+class PayloadTooLargeError(IOError):
+    pass
+
+
+def _decompress(payload: bytes) -> bytes:
+    decompressor = zlib.decompressobj()
+    try:
+        ret = decompressor.decompress(payload, MAX_PAYLOAD)
+    except zlib.error as e:
+        raise ValueError(f"invalid compressed payload: {e}")
+    if decompressor.unconsumed_tail:
+        raise PayloadTooLargeError(f"decompressed payload exceeds the limit of {MAX_PAYLOAD} bytes")
+    return ret
+
+
 class SCTSock:
-    def __init__(self, sock: socket.socket, close=True, *, timeout=30):
+    # max. size of received payloads, larger packets close the connection
+    max_payload = MAX_PAYLOAD
+    # encoding of sent JSON serializable payloads, see get_encodings
+    encoding = "json"
+    # protocol features of the peer, announced by the mux handshake
+    features = frozenset()
+
+    def __init__(self, sock: socket.socket, close=True, *, timeout=30, max_payload=None):
         sock.settimeout(timeout)
         self._sock = sock
         self._open = True
         self._close = close
+        if max_payload is not None:
+            self.max_payload = max_payload
 
     def __del__(self):
         if not self._close:
@@ -127,6 +230,19 @@ class SCTSock:
             pass
         self._open = False
 
+    def detach(self) -> socket.socket:
+        """Release the underlying socket without closing it.
+
+            Returns:
+                - socket.socket
+        """
+        self._close = False
+        self._open = False
+        return self._sock
+
+    def is_open(self) -> bool:
+        return self._open
+
     def send_init(self, payload: Any = ""):
         """Send init Packet
 
@@ -135,7 +251,7 @@ class SCTSock:
             Returns:
                 - Success (boolean)
         """
-        return self._send(_Packet(PacketType.init, payload))
+        return self._send(_Packet(PacketType.init, payload, self.encoding))
 
     def send_debug(self, payload: Any = ""):
         """Send debug Packet
@@ -145,7 +261,7 @@ class SCTSock:
             Returns:
                 - Success (boolean)
         """
-        return self._send(_Packet(PacketType.debug, payload))
+        return self._send(_Packet(PacketType.debug, payload, self.encoding))
 
     def send_data(self, payload: Any = ""):
         """Send data Packet
@@ -155,7 +271,18 @@ class SCTSock:
             Returns:
                 - Success (boolean)
         """
-        return self._send(_Packet(PacketType.data, payload))
+        return self._send(_Packet(PacketType.data, payload, self.encoding))
+
+    def send_mux(self, payload: Any = ""):
+        """Send mux Packet
+            Requests (or acknowledges) the switch to a multiplexed connection.
+
+            Arguments:
+                - payload (Any): handshake data, e.g. the offered or selected encodings
+            Returns:
+                - Success (boolean)
+        """
+        return self._send(_Packet(PacketType.mux, payload))
 
     def _send(self, data: _Packet) -> bool:
         """Sends the given packet.
@@ -176,18 +303,28 @@ class SCTSock:
             return False
         return True
 
-    def _recv(self, length: int):
-        data = b""
-        if length <= 0:
-            return data
-        while length > len(data):
-            _data = self._sock.recv(length - len(data))
-            if len(_data) == 0:
-                self.open = False
+    def _recv(self, length: int) -> bytearray:
+        """receives exactly length bytes into a preallocated buffer"""
+        data = bytearray(length)
+        view = memoryview(data)
+        pos = 0
+        while pos < length:
+            received = self._sock.recv_into(view[pos:], length - pos)
+            if received == 0:
+                self._open = False
                 raise IOError("Socket is closed!")
-            data = data + _data
+            pos += received
         return data
 
+    def _recv_packet(self, p: _Packet) -> _Packet:
+        p.set_header(self._recv(p.HEADER.size))
+        if p.size < 0 or p.size > self.max_payload:
+            # the rest of the stream can't be parsed anymore
+            self.close()
+            raise PayloadTooLargeError(f"payload of {p.size} bytes exceeds the limit of {self.max_payload} bytes")
+        p.payload = self._recv(p.size)
+        return p
+
     def recv(self) -> Packet:
         """Receives Packet:
 
@@ -199,12 +336,372 @@ class SCTSock:
         """
         if not self._open:
             return Packet()
-        p = _Packet()
         try:
-            data = self._recv(p.HEADER.size)
-            p.set_header(data)
-            data = self._recv(p.size)
-            p.payload = data
+            p = self._recv_packet(_Packet())
         except IOError:
             return Packet()
-        return p.get()
+        try:
+            return p.get()
+        except (IOError, ValueError):  # payload can't be decoded
+            return Packet()
+
+
+class SCTChannel(SCTSock):
+    """One request of a multiplexed connection.
+    Provides the same interface as SCTSock.
+    """
+    def __init__(self, mux: "SCTMuxSock", request_id: int, *, timeout=30):
+        self._mux = mux
+        self._queue = queue.Queue()
+        self._timeout = timeout
+        self._open = True
+        self._close = True
+        self.request_id = request_id
+        self.encoding = mux.encoding
+        self.features = mux.features
+
+    def close(self):
+        """Close channel, the shared connection stays open"""
+        if not self._open:
+            return
+        self._open = False
+        self._mux._remove(self.request_id)
+
+    def detach(self) -> "SCTMuxSock":
+        """Release the channel, its packets aren't received anymore.
+
+            Returns:
+                - SCTMuxSock: the shared connection, it stays open
+        """
+        self._close = False
+        self.close()
+        return self._mux
+
+    def _put(self, packet: Union[_Packet, None]):
+        self._queue.put(packet)
+
+    def _send(self, data: _Packet) -> bool:
+        if not self._open:
+            return False
+        return self._mux._send(_MuxPacket.from_packet(self.request_id, data))
+
+    def recv(self) -> Packet:
+        if not self._open:
+            return Packet()
+        try:
+            p = self._queue.get(timeout=self._timeout)
+        except queue.Empty:
+            return Packet()
+        if p is None:
+            self._open = False
+            return Packet()
+        try:
+            return p.get()
+        except (IOError, ValueError):  # payload can't be decoded
+            return Packet()
+
+
+class SCTMuxSock(SCTSock):
+    """Multiplexed SCT connection.
+    Every packet carries a request id. Packets are dispatched by a reader thread
+    to the SCTChannel with the same id, so many requests can share one socket.
+
+        Arguments:
+            - sock (socket.socket): connected socket, the mux handshake must be done already
+            - on_channel (callable): called with each new channel opened by the peer.
+                                     If None, only channels opened by `channel` are accepted.
+            - timeout (float): default receive timeout of channels
+            - encoding (str): encoding of sent payloads, negotiated by the handshake
+            - features (Iterable[str]): protocol features of the peer
+    """
+    def __init__(self, sock: socket.socket, on_channel=None, *, timeout=30, encoding="json", features=()):
+        super().__init__(sock, timeout=None)
+        self.encoding = encoding
+        self.features = frozenset(features)
+        if sock.family in (socket.AF_INET, socket.AF_INET6):
+            # small packets of different requests must not wait for each other
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._timeout = timeout
+        self._on_channel = on_channel
+        self._channels: Dict[int, SCTChannel] = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._next_id = 0
+        thread = threading.Thread(target=self._read_loop)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def connect(cls, sock: SCTSock, *, timeout=30) -> Union["SCTMuxSock", None]:
+        """Client side handshake.
+
+            Returns:
+                - SCTMuxSock or None if the peer doesn't support multiplexing (sock is closed in this case)
+        """
+        if sock.send_mux({"encodings": get_encodings()}):
+            packet = sock.recv()
+            if packet.packet_type == PacketType.mux:
+                # peers without encoding support acknowledge with an empty payload
+                offer = packet.payload if isinstance(packet.payload, dict) else {}
+                encoding = select_encoding((offer.get("encoding", "json"),))
+                features = offer.get("features", ())
+                return cls(sock.detach(), timeout=timeout, encoding=encoding, features=features)
+        sock.close()
+        return None
+
+    @classmethod
+    def accept(cls, sock: SCTSock, on_channel, *, timeout=30, offer: Any = None, features=()) -> Union["SCTMuxSock", None]:
+        """Server side handshake, call this after a mux packet was received.
+
+            Arguments:
+                - offer (Any): payload of the received mux packet
+                - features (Iterable[str]): protocol features of this side, announced to the peer
+        """
+        encoding = "json"
+        if isinstance(offer, dict) and isinstance(offer.get("encodings", None), list):
+            encoding = select_encoding(offer["encodings"])
+            ok = sock.send_mux({"encoding": encoding, "features": list(features)})
+        else:
+            ok = sock.send_mux()
+        if not ok:
+            sock.close()
+            return None
+        return cls(sock.detach(), on_channel, timeout=timeout, encoding=encoding)
+
+    def load(self) -> int:
+        """Number of open channels"""
+        return len(self._channels)
+
+    def channel(self, *, timeout=None) -> Union[SCTChannel, None]:
+        """Open a new channel
+
+            Returns:
+                - SCTChannel or None if the connection is closed
+        """
+        with self._lock:
+            if not self._open:
+                return None
+            self._next_id = (self._next_id + 1) & 0x7FFFFFFF
+            channel = SCTChannel(self, self._next_id, timeout=timeout or self._timeout)
+            self._channels[channel.request_id] = channel
+            return channel
+
+    def close(self):
+        super().close()
+        with self._lock:
+            channels = tuple(self._channels.values())
+            self._channels.clear()
+        for channel in channels:
+            channel._put(None)
+
+    def _remove(self, request_id: int):
+        with self._lock:
+            self._channels.pop(request_id, None)
+
+    def _send(self, data: _Packet) -> bool:
+        with self._send_lock:
+            return super()._send(data)
+
+    def _get_channel(self, request_id: int) -> Tuple[Union[SCTChannel, None], bool]:
+        with self._lock:
+            if (channel := self._channels.get(request_id, None)) :
+                return (channel, False)
+            if self._on_channel is None:
+                return (None, False)
+            channel = SCTChannel(self, request_id, timeout=self._timeout)
+            self._channels[request_id] = channel
+            return (channel, True)
+
+    def _read_loop(self):
+        while self._open:
+            try:
+                p = self._recv_packet(_MuxPacket())
+            except (IOError, ValueError):
+                break
+            (channel, new) = self._get_channel(p.request_id)
+            if channel is None:
+                continue  # request was closed already
+            channel._put(p)
+            if new:
+                self._on_channel(channel)
+        self.close()
+
+
+class SCTPool:
+    """Long-lived multiplexed connections to SCT servers.
+    Connections are shared by all threads of a process.
+    A new connection is opened by one thread at a time without holding the
+    lock of the pool, the other threads use the open connections meanwhile.
+    Servers without multiplexing are asked again after `legacy_ttl` seconds,
+    e.g. they were replaced by a newer version.
+    """
+    pools: Dict[Tuple[str, int], "SCTPool"] = {}
+    lock = threading.Lock()
+    pid = None
+    legacy_ttl = 60
+
+    @classmethod
+    def get(cls, url: str, port: int, size: int = 2) -> "SCTPool":
+        """get the pool of the given server"""
+        with cls.lock:
+            if cls.pid != os.getpid():
+                # connections can't be shared with forked processes
+                cls.pools = {}
+                cls.pid = os.getpid()
+            key = (url, port)
+            if (pool := cls.pools.get(key, None)) is None:
+                pool = cls(url, port, size)
+                cls.pools[key] = pool
+            return pool
+
+    def __init__(self, url: str, port: int, size: int = 2):
+        self.url = url
+        self.port = port
+        self.size = max(size, 1)
+        self.legacy = False
+        self._legacy_checked = 0.0
+        self._connections: List[SCTMuxSock] = []
+        self._connecting = False
+        self._lock = threading.Condition()
+
+    def _connect(self) -> Union[SCTMuxSock, None]:
+        sock = SCTSock(create_socket(self.url, self.port))
+        return SCTMuxSock.connect(sock)
+
+    def channel(self, *, timeout=30) -> Union[SCTChannel, None]:
+        """Open a channel on the least used connection.
+
+            Returns:
+                - SCTChannel or None if the server doesn't support multiplexed connections
+        """
+        with self._lock:
+            while True:
+                if self.legacy and (self._connecting or time.monotonic() - self._legacy_checked < self.legacy_ttl):
+                    return None
+                self._connections = [c for c in self._connections if c.is_open()]
+                if self._connections and (self._connecting or len(self._connections) >= self.size):
+                    con = min(self._connections, key=lambda c: c.load())
+                    return con.channel(timeout=timeout)
+                if not self._connecting:
+                    self._connecting = True
+                    break
+                self._lock.wait()  # the first connection is opened by another thread
+        try:
+            con = self._connect()
+        except BaseException:
+            with self._lock:
+                self._connecting = False
+                self._lock.notify_all()
+            raise
+        with self._lock:
+            self._connecting = False
+            self.legacy = con is None
+            self._legacy_checked = time.monotonic()
+            if con is not None:
+                self._connections.append(con)
+            self._lock.notify_all()
+        if con is None:
+            return None
+        return con.channel(timeout=timeout)
+
+    def close(self):
+        with self._lock:
+            for con in self._connections:
+                con.close()
+            self._connections.clear()
+
+
+class AsyncSCTSock:
+    """asyncio version of SCTSock.
+    Waiting for a container doesn't block a thread, so many requests
+    can be handled by one event loop.
+    """
+    max_payload = SCTSock.max_payload
+    encoding = SCTSock.encoding
+    # plain connection without the mux handshake, features of the peer are unknown
+    features = frozenset()
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, *, timeout=30, max_payload=None):
+        self._reader = reader
+        self._writer = writer
+        self._timeout = timeout
+        self._open = True
+        if max_payload is not None:
+            self.max_payload = max_payload
+
+    @classmethod
+    async def connect(cls, url: str, port: int, *, timeout=30) -> "AsyncSCTSock":
+        """Helper function to create a new connection, same retries as create_socket"""
+        for _ in range(50): #10 sek retry
+            try:
+                (reader, writer) = await asyncio.open_connection(url, port)
+                return cls(reader, writer, timeout=timeout)
+            except OSError:
+                await asyncio.sleep(0.2)
+        raise ConnectionError("Couldn't connect to socket...")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, e, msg, tb):
+        await self.close()
+
+    async def close(self):
+        """Close connection"""
+        if not self._open:
+            return
+        self._open = False
+        try:
+            self._writer.close()
+            await self._writer.wait_closed()
+        except Exception:
+            pass
+
+    def is_open(self) -> bool:
+        return self._open
+
+    async def send_init(self, payload: Any = ""):
+        """Send init Packet, see SCTSock.send_init"""
+        return await self._send(_Packet(PacketType.init, payload, self.encoding))
+
+    async def send_debug(self, payload: Any = ""):
+        """Send debug Packet, see SCTSock.send_debug"""
+        return await self._send(_Packet(PacketType.debug, payload, self.encoding))
+
+    async def send_data(self, payload: Any = ""):
+        """Send data Packet, see SCTSock.send_data"""
+        return await self._send(_Packet(PacketType.data, payload, self.encoding))
+
+    async def _send(self, data: _Packet) -> bool:
+        if not self._open:
+            return False
+        try:
+            self._writer.write(data.get_header())
+            if len(data.payload) > 0:
+                self._writer.write(data.payload)
+            await self._writer.drain()
+        except OSError:
+            self._open = False
+            return False
+        return True
+
+    async def _recv_packet(self, p: _Packet) -> _Packet:
+        p.set_header(await self._reader.readexactly(p.HEADER.size))
+        if p.size < 0 or p.size > self.max_payload:
+            raise PayloadTooLargeError(f"payload of {p.size} bytes exceeds the limit of {self.max_payload} bytes")
+        p.payload = await self._reader.readexactly(p.size) if p.size > 0 else b""
+        return p
+
+    async def recv(self) -> Packet:
+        """Receives Packet, see SCTSock.recv"""
+        if not self._open:
+            return Packet()
+        try:
+            p = await asyncio.wait_for(self._recv_packet(_Packet()), self._timeout)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, OSError):
+            self._open = False
+            return Packet()
+        try:
+            return p.get()
+        except (IOError, ValueError):  # payload can't be decoded
+            return Packet()
@@ -0,0 +1,57 @@
+import queue
+import threading
+import time
+import typing
+
+
+class OutputStream:
+    """Bounded buffer between the thread executing a request and the response
+    which streams the output of the user code.
+
+    Notes:
+        - put never blocks: chunks are dropped if the buffer is full, the next
+          chunk which is buffered has the number of dropped chunks ("dropped")
+    """
+
+    def __init__(self, size: int):
+        self._queue = queue.Queue(max(size, 1))
+        self._closed = threading.Event()
+        self._unreported = 0
+        self.dropped = 0
+
+    def put(self, chunk: dict) -> bool:
+        """called by the executing thread, returns False if chunk was dropped"""
+        if self._closed.is_set():
+            return False
+        if self._unreported:
+            chunk = dict(chunk, dropped=self._unreported)
+        try:
+            self._queue.put_nowait(chunk)
+        except queue.Full:
+            self._unreported += 1
+            self.dropped += 1
+            return False
+        self._unreported = 0
+        return True
+
+    def close(self):
+        """no chunks are buffered afterwards, the reader finishes when the buffer is empty"""
+        self._closed.set()
+        try:
+            self._queue.put_nowait(None)  # wakes up the reader
+        except queue.Full:
+            pass
+
+    def read(self, timeout: float = None, interval: float = 0.1) -> typing.Iterator[dict]:
+        """yields the buffered chunks until the stream is closed (or timeout seconds passed)"""
+        end = None if timeout is None else time.monotonic() + timeout
+        while end is None or time.monotonic() < end:
+            try:
+                chunk = self._queue.get(timeout=interval)
+            except queue.Empty:
+                if self._closed.is_set():
+                    return
+                continue
+            if chunk is None:
+                return
+            yield chunk
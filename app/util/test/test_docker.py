@@ -0,0 +1,129 @@
+from .. import docker
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import types
+import pytest
+
+PREFIX = docker.PREFIX
+
+
+def event(action: str, name: str, **attributes) -> dict:
+    return {"Type": "container", "Action": action, "Actor": {"Attributes": {"name": name, **attributes}}}
+
+
+class Client:
+    """docker client which lists containers and images"""
+
+    def __init__(self, containers=(), images=(), on_list=None):
+        self.containers = types.SimpleNamespace(list=lambda **kwargs: self._list(containers, on_list))
+        self.images = types.SimpleNamespace(list=lambda **kwargs: [types.SimpleNamespace(tags=list(images))])
+
+    def _list(self, containers, on_list):
+        if on_list:
+            on_list()
+        return [types.SimpleNamespace(name=name, status=status) for (name, status) in containers]
+
+
+@pytest.fixture
+def state(monkeypatch):
+    for (key, value) in (("containers", {}), ("images", set()), ("changed", {}), ("seq", 0), ("synced", True)):
+        monkeypatch.setattr(docker.State, key, value)
+    return docker.State
+
+
+def test_events(state):
+    name = f"{PREFIX}_token"
+    state.apply(event("create", name))
+    assert state.container(name) == (True, "created")
+    state.apply(event("start", name))
+    state.apply(event("exec_start: sh", name))
+    assert state.container(name) == (True, "running")
+    state.apply(event("rename", f"{PREFIX}_other", oldName=f"/{name}"))
+    assert state.container(name) == (True, None) and state.container(f"{PREFIX}_other") == (True, "running")
+    state.apply(event("die", f"{PREFIX}_other"))
+    assert state.container(f"{PREFIX}_other") == (True, "exited")
+    state.apply(event("destroy", f"{PREFIX}_other"))
+    state.apply(event("start", "unrelated"))
+    assert state.containers == {}
+
+
+def test_reconcile(state, monkeypatch):
+    (old, new, gone) = (f"{PREFIX}_old", f"{PREFIX}_new", f"{PREFIX}_gone")
+    state.set(gone, "running")
+    # the event arrives while the containers are listed, the listing doesn't contain it yet
+    client = Client([(old, "exited"), ("other", "running")], [f"{PREFIX}_python:1"], lambda: state.apply(event("start", new)))
+    monkeypatch.setattr(docker._Docker, "client", client)
+    state.reconcile()
+    assert state.containers == {old: "exited", new: "running"}
+    assert state.image(f"{PREFIX}_python:1") == (True, True)
+    # next listing contains it
+    monkeypatch.setattr(docker._Docker, "client", Client([(new, "exited")]))
+    state.reconcile()
+    assert state.containers == {new: "exited"}
+
+
+def test_container_status_from_cache(state, monkeypatch):
+    monkeypatch.setattr(docker._Docker, "client", None)  # any API call fails
+    container = docker.Container("token")
+    state.set(container.get_ident(), "running")
+    assert container.is_running() and container.status() == "running"
+    state.set(container.get_ident(), None)
+    assert container.status() is None
+
+
+class Daemon(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"[]")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_api_calls():
+    with ThreadingHTTPServer(("localhost", 0), Daemon) as server:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = docker.ApiCalls.install(docker.docker.DockerClient(f"tcp://localhost:{server.server_port}", version="1.41"))
+        total = docker.ApiCalls.get_stats()["calls"]
+        with docker.ApiCalls() as outer:
+            client.containers.list()
+            with docker.ApiCalls() as inner:
+                client.containers.list()
+                client.images.list()
+        client.containers.list()
+        server.shutdown()
+    assert (inner.count, outer.count) == (2, 3)
+    assert docker.ApiCalls.get_stats()["calls"] == total + 4
+
+
+def test_pool_fill(monkeypatch):
+    pool = docker.Pool(docker.Image("python", "2"))
+    ident = pool.image.get_ident()
+    removed = []
+    started = []
+
+    def cnt(name: str, image: str, status: str):
+        name = docker.add_prefix(f"{pool.prefix}{name}")
+        return types.SimpleNamespace(name=name, status=status, attrs={"Config": {"Image": image}}, remove=lambda force: removed.append(name))
+
+    containers = [cnt("old", "sct_python:1", "running"), cnt("exited", ident, "exited"), cnt("idle", ident, "running")]
+
+    def start(name: str):
+        # cold starts don't wait for the pool
+        lock = docker.LockHandler.get("docker")
+        assert lock.acquire(block=False)
+        lock.release()
+        started.append(name)
+
+    monkeypatch.setattr(docker._Container, "ls", classmethod(lambda cls, filter=None: containers))
+    monkeypatch.setattr(docker._Container, "create", classmethod(lambda cls, *args: None))
+    monkeypatch.setattr(docker._Container, "start", classmethod(lambda cls, name: start(name)))
+    assert pool.fill(3) == 2
+    assert removed == [containers[0].name, containers[1].name] and len(started) == 2
+    monkeypatch.setattr(docker._Container, "get", classmethod(lambda cls, name: containers[2]))
+    removed.clear()
+    assert pool.fill(0) == 0
+    assert removed == [containers[0].name, containers[1].name, containers[2].name]
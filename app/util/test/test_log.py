@@ -0,0 +1,61 @@
+from .. import log
+import asyncio
+import pytest
+
+
+@pytest.fixture
+def logger():
+    logger = log.Logger("sct_test_trace")
+    logger.get().setLevel(log.TRACE)
+    log.Spans.clear()
+    yield logger
+    log.Spans.clear()
+
+
+def test_disabled():
+    logger = log.Logger("sct_test_warning")
+    logger.get().setLevel("WARNING")
+    call = log.LogCall(__file__, "call", log.Logger, logger)
+    assert call is log.LogCall(__file__, "other", logger=logger)  # shared, nothing is computed
+    with call:
+        pass
+    with pytest.raises(ValueError):
+        with log.LogCall(__file__, "call", logger=logger):
+            raise ValueError
+
+
+def test_spans(logger):
+    with log.LogCall(__file__, "outer", log.Logger, logger):
+        with log.LogCall(__file__, "inner", logger=logger) as inner:
+            assert log.Spans.current() is inner.span
+    with pytest.raises(ValueError):
+        with log.LogCall(__file__, "inner", logger=logger):
+            raise ValueError
+    assert log.Spans.current() is None
+    spans = [span.serialize() for span in log.Spans.recent]
+    assert [(span["name"], span["parent"], span["depth"], span["error"]) for span in spans] == [
+        ("inner", "Logger.outer", 1, None),
+        ("Logger.outer", None, 0, None),
+        ("inner", None, 0, "ValueError"),
+    ]
+    assert spans[0]["file"] == "app/util/test/test_log.py"
+    assert spans[1]["duration_ms"] >= spans[0]["duration_ms"] >= 0
+    stats = log.Spans.get_stats()
+    assert stats["inner"]["count"] == 2 and stats["Logger.outer"]["count"] == 1
+
+
+def test_spans_async(logger):
+    async def call(name: str, event: asyncio.Event, other: asyncio.Event):
+        with log.LogCall(__file__, name, logger=logger):
+            event.set()
+            await other.wait()
+            with log.LogCall(__file__, "inner", logger=logger) as inner:
+                return inner.span.parent.name
+
+    async def main():
+        (a, b) = (asyncio.Event(), asyncio.Event())
+        return await asyncio.gather(call("a", a, b), call("b", b, a))
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert log.Spans.current() is None
+    assert sorted((span.name, span.depth) for span in log.Spans.recent) == [("a", 0), ("b", 0), ("inner", 1), ("inner", 1)]
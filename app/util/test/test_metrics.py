@@ -0,0 +1,47 @@
+from ..metrics import Metrics, BUCKETS
+import json
+import os
+import time
+import pytest
+
+
+@pytest.fixture
+def metrics(monkeypatch, settings, tmp_path):
+    settings.METRICS = False  # no thread
+    settings.METRICS_DIR = str(tmp_path)
+    for (key, value) in (("counters", {}), ("histograms", {}), ("collectors", [])):
+        monkeypatch.setattr(Metrics, key, value)
+    return Metrics
+
+
+def test_render(metrics):
+    metrics.inc("sct_requests_total", {"view": "api", "error": "none"})
+    metrics.inc("sct_requests_total", {"view": "api", "error": "none"})
+    metrics.observe("sct_request_stage_seconds", 0.02, {"stage": "total"})
+    metrics.observe("sct_request_stage_seconds", 100, {"stage": "total"})
+    metrics.collector(lambda: metrics.stats("sct_cache", {"hits": 3, "entries": 1, "hit_rate": 0.5}, ("hits",), ("entries",)))
+    lines = metrics.render(metrics.snapshot()).splitlines()
+    assert 'sct_requests_total{error="none",view="api"} 2' in lines
+    assert "sct_cache_hits_total 3" in lines and "sct_cache_entries 1" in lines
+    assert "# TYPE sct_request_stage_seconds histogram" in lines
+    assert 'sct_request_stage_seconds_bucket{stage="total",le="0.01"} 0' in lines
+    assert 'sct_request_stage_seconds_bucket{stage="total",le="0.025"} 1' in lines
+    assert f'sct_request_stage_seconds_bucket{{stage="total",le="{BUCKETS[-1]}"}} 1' in lines
+    assert 'sct_request_stage_seconds_bucket{stage="total",le="+Inf"} 2' in lines
+    assert 'sct_request_stage_seconds_count{stage="total"} 2' in lines
+    assert not any("hit_rate" in line for line in lines)
+
+
+def test_workers(metrics, tmp_path, settings):
+    metrics.inc("sct_requests_total")
+    metrics.observe("sct_request_stage_seconds", 0.1)
+    # snapshot of another worker and of a stopped worker
+    other = {"counter": {"sct_requests_total": {"": 2}}, "gauge": {}, "histogram": {"sct_request_stage_seconds": {"": metrics.snapshot()["histogram"]["sct_request_stage_seconds"][""]}}}
+    (tmp_path / "1.json").write_text(json.dumps(other))
+    (tmp_path / "2.json").write_text(json.dumps(other))
+    expired = time.time() - 3 * settings.METRICS_INTERVAL - 1
+    os.utime(tmp_path / "2.json", (expired, expired))
+    data = metrics.read()
+    assert data["counter"]["sct_requests_total"][""] == 3
+    assert data["histogram"]["sct_request_stage_seconds"][""][-1] == pytest.approx(0.2)
+    assert sorted(os.listdir(tmp_path)) == ["1.json", f"{os.getpid()}.json"]
@@ -1,5 +1,8 @@
-from ..sctsock import SCTSock, Packet, _Packet, PacketType, create_socket
+from ..sctsock import SCTSock, SCTMuxSock, SCTPool, AsyncSCTSock, Packet, _Packet, _MuxPacket, PacketType, PayloadType, PayloadTooLargeError, create_socket
+from .. import sctsock
+import asyncio
 import socket
+import threading
 import pytest
 
 DATA = (b"1", "2", "", b"", {"a": 1}, [1, 2], True, None)
@@ -12,6 +15,34 @@ def test_Packet():
             assert p.get_payload() == data
             assert p.packet_type == t
 
+            p = _MuxPacket.from_packet(7, p)
+            q = _MuxPacket()
+            q.set_header(p.get_header())
+            q.payload = p.payload
+            assert q.request_id == 7
+            assert q.get_payload() == data
+            assert q.packet_type == t
+
+
+def test_Packet_encoding():
+    large = {"out": "x" * (sctsock.COMPRESS_THRESHOLD + 1)}
+    for encoding in sctsock.get_encodings():
+        for data in DATA + (large,):
+            p = _Packet(PacketType.data, data, encoding)
+            assert p.get_payload() == data
+        p = _Packet(PacketType.data, large, encoding)
+        assert (p.size < sctsock.COMPRESS_THRESHOLD) == encoding.endswith("+zlib")
+        assert p.get().payload_type == (PayloadType.msgpack if encoding.startswith("msgpack") else PayloadType.JSON)
+    assert sctsock.select_encoding(("unknown", "json+zlib")) == "json+zlib"
+    assert sctsock.select_encoding(()) == "json"
+
+
+def test_Packet_decompress_limit(monkeypatch):
+    p = _Packet(PacketType.data, "x" * (1 << 20), "json+zlib")
+    monkeypatch.setattr(sctsock, "MAX_PAYLOAD", 1 << 16)
+    with pytest.raises(PayloadTooLargeError):
+        p.get_payload()
+
 
 class CallbackServer:
     def __init__(self):
@@ -42,7 +73,7 @@ class CallbackServer:
                 pass
 
 
-@pytest.fixture(autouse=True)
+@pytest.fixture(scope="module")
 def callback_server():
     from threading import Thread
 
@@ -53,7 +84,7 @@ def callback_server():
         yield server
 
 
-def test_SCTSock():
+def test_SCTSock(callback_server):
     client = create_socket("localhost", 1234)
     with SCTSock(client) as sock:
         for data in DATA:
@@ -71,3 +102,178 @@ def test_SCTSock():
             packet = sock.recv()
             assert data == packet.payload
             assert packet.packet_type == PacketType.data
+
+
+def test_SCTSock_max_payload():
+    (a, b) = socket.socketpair()
+    data = "x" * (1 << 20)
+    with SCTSock(a) as sender, SCTSock(b, max_payload=1 << 16) as receiver:
+        sender.send_data("x" * 100)
+        assert receiver.recv().payload == "x" * 100
+        threading.Thread(target=sender.send_data, args=(data,), daemon=True).start()
+        with pytest.raises(PayloadTooLargeError):
+            receiver._recv_packet(_Packet())
+        assert not receiver.is_open()
+        assert receiver.recv().packet_type == PacketType.none
+
+
+def test_AsyncSCTSock(callback_server):
+    async def run():
+        async with await AsyncSCTSock.connect("localhost", 1234, timeout=5) as sock:
+            for data in DATA:
+                for (send, t) in ((sock.send_init, PacketType.init), (sock.send_debug, PacketType.debug), (sock.send_data, PacketType.data)):
+                    assert await send(data)
+                    packet = await sock.recv()
+                    assert data == packet.payload
+                    assert packet.packet_type == t
+        assert not sock.is_open()
+        assert (await sock.recv()).packet_type == PacketType.none
+
+    asyncio.run(run())
+
+
+def _echo_channel(channel):
+    def echo():
+        with channel:
+            while (packet := channel.recv()).packet_type != PacketType.none:
+                if packet.packet_type == PacketType.init:
+                    channel.send_init(packet.payload)
+                elif packet.packet_type == PacketType.debug:
+                    channel.send_debug(packet.payload)
+                else:
+                    channel.send_data(packet.payload)
+                    break
+
+    threading.Thread(target=echo, daemon=True).start()
+
+
+def _mux_pair():
+    (a, b) = socket.socketpair()
+    server = {}
+
+    def accept():
+        sock = SCTSock(b)
+        packet = sock.recv()
+        assert packet.packet_type == PacketType.mux
+        server["mux"] = SCTMuxSock.accept(sock, _echo_channel, timeout=5, offer=packet.payload)
+
+    thread = threading.Thread(target=accept)
+    thread.start()
+    client = SCTMuxSock.connect(SCTSock(a), timeout=5)
+    thread.join()
+    return (client, server["mux"])
+
+
+def test_SCTMuxSock():
+    (client, server) = _mux_pair()
+    assert client is not None and server is not None
+    channels = [client.channel() for _ in range(5)]
+    assert len({channel.request_id for channel in channels}) == 5
+    for data in DATA:
+        for channel in channels:
+            channel.send_debug(data)
+        for channel in channels:
+            packet = channel.recv()
+            assert data == packet.payload
+            assert packet.packet_type == PacketType.debug
+    for (i, channel) in enumerate(channels):
+        channel.send_data(i)
+    for (i, channel) in enumerate(channels):
+        assert channel.recv().payload == i
+        channel.close()
+    assert client.load() == 0
+    client.close()
+    assert client.channel() is None
+
+
+def test_SCTMuxSock_encoding():
+    (client, server) = _mux_pair()
+    assert client.encoding == server.encoding == sctsock.get_encodings()[0]
+    channel = client.channel()
+    data = {"out": "x" * (sctsock.COMPRESS_THRESHOLD + 1)}
+    channel.send_data(data)
+    assert channel.recv().payload == data
+    client.close()
+
+
+def test_SCTMuxSock_encoding_legacy():
+    (a, b) = socket.socketpair()
+
+    def legacy_server():
+        sock = SCTSock(b)
+        sock.recv()
+        sock.send_mux()  # acknowledged without encoding
+        sock.detach()
+
+    thread = threading.Thread(target=legacy_server)
+    thread.start()
+    client = SCTMuxSock.connect(SCTSock(a))
+    thread.join()
+    assert client.encoding == "json"
+    client.close()
+    b.close()
+
+
+def test_SCTMuxSock_close():
+    (client, server) = _mux_pair()
+    channel = client.channel()
+    server.close()
+    assert channel.recv().packet_type == PacketType.none
+
+
+def test_SCTMuxSock_legacy():
+    (a, b) = socket.socketpair()
+
+    def legacy_server():
+        with SCTSock(b) as sock:
+            sock.recv()
+            sock.send_data({"res": 4, "data": None})
+
+    thread = threading.Thread(target=legacy_server)
+    thread.start()
+    assert SCTMuxSock.connect(SCTSock(a)) is None
+    thread.join()
+
+
+def test_SCTChannel_detach():
+    (client, server) = _mux_pair()
+    channel = client.channel()
+    assert channel.detach() is client
+    assert client.load() == 0 and client.is_open()
+    assert channel.recv().packet_type == PacketType.none
+    client.close()
+
+
+def test_SCTPool_legacy(monkeypatch):
+    pool = SCTPool("localhost", 1)
+    connections = [None, _mux_pair()[0]]
+    monkeypatch.setattr(pool, "_connect", lambda: connections.pop(0))
+    assert pool.channel() is None and pool.legacy
+    assert pool.channel() is None and len(connections) == 1  # not asked again
+    pool.legacy_ttl = 0  # e.g. the container was replaced
+    assert pool.channel() is not None and not pool.legacy
+    pool.close()
+
+
+def test_SCTPool_connect_unlocked(monkeypatch):
+    pool = SCTPool("localhost", 1, size=2)
+    (connecting, done) = (threading.Event(), threading.Event())
+
+    def connect():
+        if pool._connections:
+            connecting.set()
+            done.wait(5)
+        return _mux_pair()[0]
+
+    monkeypatch.setattr(pool, "_connect", connect)
+    first = pool.channel()
+    thread = threading.Thread(target=pool.channel)
+    thread.start()
+    assert connecting.wait(5)
+    # the open connection is used while the second one is opened
+    assert pool.channel()._mux is first._mux
+    assert thread.is_alive()
+    done.set()
+    thread.join()
+    assert len(pool._connections) == 2
+    pool.close()
@@ -0,0 +1,52 @@
+from .. import timeout
+import threading
+import time
+import pytest
+
+
+@timeout.timeout(0.5, lambda x: "timeout")
+def _sleep(x):
+    time.sleep(x)
+    return x
+
+
+@timeout.timeout(0.5)
+def _raise():
+    time.sleep(1)
+
+
+def test_timeout():
+    assert _sleep(0) == 0
+    assert _sleep(1) == "timeout"
+    with pytest.raises(TimeoutError):
+        _raise()
+
+
+def test_deadline():
+    @timeout.timeout(5)
+    def fn():
+        return timeout.current().remaining()
+
+    assert 4 < fn() <= 5
+    assert timeout.current() is None
+
+
+def test_threads():
+    _sleep(0)
+    threads = threading.active_count()
+    for _ in range(50):
+        _sleep(0)
+    assert threading.active_count() <= threads + timeout.Scheduler.max_workers
+
+
+def test_stats():
+    while timeout.get_stats()["running"] > 0:
+        time.sleep(0.1)
+    stats = timeout.get_stats()
+    _sleep(1)
+    _stats = timeout.get_stats()
+    assert _stats["calls"] == stats["calls"] + 1
+    assert _stats["timeouts"] == stats["timeouts"] + 1
+    assert _stats["abandoned"] == stats["abandoned"] + 1
+    time.sleep(0.7)
+    assert timeout.get_stats()["abandoned"] == stats["abandoned"]
@@ -0,0 +1,32 @@
+from ..timing import Timings
+import contextvars
+import threading
+import time
+
+
+def test_stages():
+    with Timings.stage("outside"):
+        pass  # no current request
+    with Timings() as timings:
+        assert Timings.current() is timings
+        for _ in range(2):
+            with Timings.stage("connect"):
+                time.sleep(0.01)
+        timings.merge("container", {"run": 1.5, "invalid": "x"})
+    assert Timings.current() is None
+    stages = timings.serialize()
+    assert list(stages) == ["connect", "container.run", "total"]
+    assert 20 <= stages["connect"] <= stages["total"] and stages["container.run"] == 1.5
+
+
+def test_context():
+    with Timings() as timings:
+        # like sync_to_async, threads which got a copy of the context measure the same request
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(lambda: Timings.current().add("thread", 0.001),))
+        thread.start()
+        thread.join()
+        other = threading.Thread(target=lambda: Timings.current() is None or timings.add("leaked", 0))
+        other.start()
+        other.join()
+    assert list(timings.stages) == ["thread"]
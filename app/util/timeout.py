@@ -1,7 +1,238 @@
-import multiprocessing.pool
+import atexit
+import concurrent.futures
+import contextlib
 import functools
+import math
+import os
+import threading
+import time
 import typing
 
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import log as logging
+
+
+class TimerWheel:
+    """Hashed timer wheel.
+    A single thread fires all timers of the process with a resolution of `tick` seconds.
+    """
+
+    class Timer:
+        def __init__(self, tick: int, callback: typing.Callable):
+            self.tick = tick
+            self.callback = callback
+            self.cancelled = False
+
+        def cancel(self):
+            self.cancelled = True
+
+    def __init__(self, tick: float = 0.1, slots: int = 512):
+        self._tick = tick
+        self._slots = tuple([] for _ in range(slots))
+        self._current = 0
+        self._lock = threading.Lock()
+        self._exit = threading.Event()
+        self._start = time.monotonic()
+        thread = threading.Thread(target=self._run, name="sct_timer_wheel")
+        thread.daemon = True
+        thread.start()
+
+    def schedule(self, delay: float, callback: typing.Callable) -> "TimerWheel.Timer":
+        """calls callback after delay seconds (rounded up to the next tick)"""
+        ticks = max(1, math.ceil(delay / self._tick))
+        with self._lock:
+            timer = self.Timer(self._current + ticks, callback)
+            self._slots[timer.tick % len(self._slots)].append(timer)
+        return timer
+
+    def stop(self):
+        self._exit.set()
+
+    def _expire(self, tick: int) -> list:
+        with self._lock:
+            self._current = tick
+            slot = self._slots[tick % len(self._slots)]
+            due = [timer for timer in slot if timer.tick <= tick]
+            slot[:] = [timer for timer in slot if timer.tick > tick and not timer.cancelled]
+        return due
+
+    def _run(self):
+        while not self._exit.is_set():
+            tick = self._current + 1
+            wait = self._start + tick * self._tick - time.monotonic()
+            if wait > 0 and self._exit.wait(wait):
+                break
+            for timer in self._expire(tick):
+                if timer.cancelled:
+                    continue
+                try:
+                    timer.callback()
+                except Exception as e:
+                    logging.error("timer callback failed: %s", str(e))
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    """A call executed by the Scheduler"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.start = time.monotonic()
+        self.expired = False
+        self.finished = False
+        self._done = threading.Event()
+        self._future: concurrent.futures.Future = None
+        self._timer: TimerWheel.Timer = None
+
+    def remaining(self) -> float:
+        """seconds until the deadline is reached"""
+        return max(0, self.start + self.timeout - time.monotonic())
+
+    def _expire(self):
+        if Scheduler._expire(self):
+            self._done.set()
+
+    def result(self):
+        """wait for the result.
+        raises DeadlineExceeded if the deadline is reached first
+        """
+        self._done.wait()
+        if self.expired:
+            raise DeadlineExceeded(f"deadline of {self.timeout}s exceeded")
+        self._timer.cancel()
+        return self._future.result()
+
+
+class SchedulerStats:
+    def __init__(self):
+        self.calls = 0
+        self.running = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.abandoned = 0
+
+    def serialize(self) -> dict:
+        ret = dict(self.__dict__)
+        ret["threads"] = threading.active_count()
+        return ret
+
+
+class Scheduler:
+    """Process-wide deadline service.
+    Calls are executed by a shared, bounded thread pool, deadlines are
+    fired by a timer wheel.
+
+    Notes:
+        - Calls which exceed their deadline run until they finish, but
+          calls which didn't start yet are cancelled.
+    """
+
+    max_workers = settings.TIMEOUT_WORKERS
+    lock = threading.Lock()
+    pid = None
+    executor: concurrent.futures.ThreadPoolExecutor = None
+    wheel: TimerWheel = None
+    stats = SchedulerStats()
+    local = threading.local()
+
+    @classmethod
+    def _init(cls):
+        # threads don't survive a fork (gunicorn --preload)
+        with cls.lock:
+            if cls.pid == os.getpid():
+                return
+            cls.executor = concurrent.futures.ThreadPoolExecutor(
+                cls.max_workers, thread_name_prefix="sct_timeout"
+            )
+            cls.wheel = TimerWheel()
+            cls.stats = SchedulerStats()
+            cls.pid = os.getpid()
+        atexit.register(cls.shutdown)
+
+    @classmethod
+    def submit(cls, fn: typing.Callable, args=(), kwargs={}, timeout: float = 5) -> Deadline:
+        cls._init()
+        deadline = Deadline(timeout)
+        with cls.lock:
+            cls.stats.calls += 1
+        deadline._future = cls.executor.submit(cls._call, deadline, fn, args, kwargs)
+        deadline._timer = cls.wheel.schedule(timeout, deadline._expire)
+        deadline._future.add_done_callback(lambda _: deadline._done.set())
+        return deadline
+
+    @classmethod
+    def _call(cls, deadline: Deadline, fn: typing.Callable, args, kwargs):
+        with cls.lock:
+            cls.stats.running += 1
+        cls.local.deadline = deadline
+        try:
+            close_old_connections()
+            return fn(*args, **kwargs)
+        finally:
+            close_old_connections()
+            cls.local.deadline = None
+            with cls.lock:
+                deadline.finished = True
+                cls.stats.running -= 1
+                if deadline.expired:
+                    cls.stats.abandoned -= 1
+
+    @classmethod
+    def _expire(cls, deadline: Deadline) -> bool:
+        with cls.lock:
+            if deadline.finished or deadline._future.done():
+                return False
+            deadline.expired = True
+            cls.stats.timeouts += 1
+            if deadline._future.cancel():
+                cls.stats.cancelled += 1
+            else:
+                cls.stats.abandoned += 1
+        logging.warning("timeout: %s", cls.get_stats())
+        return True
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        """calls, timeouts and threads of this process"""
+        with cls.lock:
+            return cls.stats.serialize()
+
+    @classmethod
+    def current(cls) -> typing.Union[Deadline, None]:
+        """Deadline of the call executed by the current thread"""
+        return getattr(cls.local, "deadline", None)
+
+    @classmethod
+    @contextlib.contextmanager
+    def deadline(cls, timeout: float):
+        """Deadline of the current thread for calls which aren't executed by the Scheduler,
+        e.g. the generator of a streamed response. It isn't enforced, see current"""
+        previous = cls.current()
+        cls.local.deadline = Deadline(timeout)
+        try:
+            yield cls.local.deadline
+        finally:
+            cls.local.deadline = previous
+
+    @classmethod
+    def shutdown(cls):
+        with cls.lock:
+            if cls.pid != os.getpid():
+                return
+            cls.wheel.stop()
+            cls.executor.shutdown(wait=False, cancel_futures=True)
+            cls.pid = None
+
+
+current = Scheduler.current
+deadline = Scheduler.deadline
+get_stats = Scheduler.get_stats
+
 
 def timeout(max_timeout: float = 5, callback: typing.Callable = None):
     """timeout(max_timeout: float, callback: callable):
@@ -9,9 +240,7 @@ def timeout(max_timeout: float = 5, callback: typing.Callable = None):
 
         Notes:
             - Function will be executed until it finishes
-
-        Based on:
-            https://stackoverflow.com/a/35139284/11901512
+            - Function is executed by the shared Scheduler
     """
 
     def timeout_decorator(item):
@@ -21,15 +250,11 @@ def timeout(max_timeout: float = 5, callback: typing.Callable = None):
         def func_wrapper(*args, **kwargs):
             """Closure for function."""
             try:
-                pool = multiprocessing.pool.ThreadPool(processes=1)
-                async_result = pool.apply_async(item, args, kwargs)
-                # raises a TimeoutError if execution exceeds max_timeout
-                return async_result.get(max_timeout)
-            except multiprocessing.TimeoutError as e:
+                return Scheduler.submit(item, args, kwargs, max_timeout).result()
+            except DeadlineExceeded:
                 if callback:
                     return callback(*args, **kwargs)
-                else:
-                    raise TimeoutError(e)
+                raise
 
         return func_wrapper
 
@@ -0,0 +1,68 @@
+"""Latency breakdown of API requests.
+
+The Timings of the current request are kept in a context variable, so the
+executors can measure their stages without passing them around. Stages of
+the container (sent with the result) are merged with the prefix "container.".
+Without a current Timings (e.g. batch requests) nothing is measured.
+"""
+import contextlib
+import contextvars
+import time
+import typing
+
+_current: contextvars.ContextVar = contextvars.ContextVar("sct_timings", default=None)
+
+
+class Timings:
+    """durations of the stages of a request in ms, a stage measured more than once is summed up.
+
+    with Timings() as timings:
+        with Timings.stage("connect"):
+            ...
+        timings.serialize()  # {"connect": ..., "total": ...}
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._start = time.perf_counter()
+        self._token = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *args):
+        _current.reset(self._token)
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds * 1000
+
+    def merge(self, prefix: str, stages: dict):
+        """adds stages measured elsewhere (name -> ms)"""
+        for (name, ms) in stages.items():
+            if isinstance(ms, (int, float)):
+                self.stages[f"{prefix}.{name}"] = self.stages.get(f"{prefix}.{name}", 0.0) + ms
+
+    def serialize(self) -> dict:
+        """stages and the total duration until now in ms"""
+        total = (time.perf_counter() - self._start) * 1000
+        return {**{name: round(ms, 3) for (name, ms) in self.stages.items()}, "total": round(total, 3)}
+
+    @classmethod
+    def current(cls) -> typing.Union["Timings", None]:
+        return _current.get()
+
+    @classmethod
+    @contextlib.contextmanager
+    def stage(cls, name: str):
+        """measures a stage of the current request"""
+        timings = _current.get()
+        if timings is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings.add(name, time.perf_counter() - start)
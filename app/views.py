@@ -1,16 +1,21 @@
+import asyncio
 import json
 import uuid
 
+from asgiref.sync import sync_to_async
+
 from django.conf import settings
 from django.core.handlers.wsgi import WSGIRequest
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
 
-from . import get_plugin_list
-from .models import Setting
+from . import metrics
+from .cache import SettingCache
 from .util import timeout, log as logging
+from .util.timing import Timings
 
 
 class ErrorView:
@@ -28,9 +33,46 @@ class ErrorView:
 
 
 def _timeout(*args, **kwargs):
+    metrics.observe("api", "timeout")
     return ErrorView("timeout", "a timeout occured", 500).to_response()
 
 
+def _cors(res):
+    if isinstance(res, HttpResponseBase):
+        res["Access-Control-Allow-Origin"] = "*"
+        res["Access-Control-Allow-Methods"] = "POST"
+        res["Access-Control-Allow-Headers"] = "Content-Type"
+    return res
+
+
+def _response(response, timings: Timings) -> HttpResponse:
+    """HttpResponse of a plugin response, with the latency breakdown if settings.TIMINGS"""
+    res = HttpResponse()
+    res.status_code = 500 if response.has_error() else 200
+    data = response.serialize()
+    stages = timings.serialize()
+    logging.debug("timings: %s", json.dumps(stages))
+    metrics.observe("api", response.error, stages)
+    if settings.TIMINGS:
+        data["timings"] = stages
+    res.content = json.dumps(data)
+    return res
+
+
+def _load(token: uuid.UUID):
+    """returns (SettingEntry, plugin, None) or (None, None, error response)"""
+    try:
+        setting = SettingCache.get(token)
+    except:
+        setting = None
+    if setting is None:
+        return (None, None, ErrorView("disabled", "Plugin Disabled", 404).to_response())
+    try:
+        return (setting, setting.get_plugin(), None)
+    except:
+        return (None, None, ErrorView("disabled", "Plugin Disabled", 500).to_response())
+
+
 @method_decorator(csrf_exempt, name="dispatch")
 class API(View):
     allowed_methods = ["post", "options"]
@@ -41,46 +83,161 @@ class API(View):
         return response
 
     def dispatch(self, *args, **kwargs):
-        res = super().dispatch(*args, **kwargs)
-        if isinstance(res, HttpResponse):
-            res["Access-Control-Allow-Origin"] = "*"
-            res["Access-Control-Allow-Methods"] = "POST"
-            res["Access-Control-Allow-Headers"] = "Content-Type"
-        return res
+        return _cors(super().dispatch(*args, **kwargs))
 
     def http_method_not_allowed(self, request, *args, **kwargs):
         with logging.LogCall(__file__, "http_method_not_allowed", self.__class__):
             return ErrorView("method", "POST only", 405).to_response()
 
     @timeout.timeout(settings.TIMEOUT, _timeout)
+    def post(self, request: WSGIRequest, token: uuid.UUID):
+        with logging.LogCall(__file__, "post", self.__class__), Timings() as timings:
+            with Timings.stage("setting"):
+                (setting, _plugin, error) = _load(token)
+            if error:
+                return error
+            body = json.loads(request.body.decode("utf-8"))
+
+            req = _plugin.Request(
+                token=setting.token,
+                version=setting.version,
+                settings=setting.settings,
+                timeout=settings.TIMEOUT,
+                body=body
+            )
+            with Timings.stage("execute"):
+                response = _plugin.execute(req)
+            return _response(response, timings)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class Batch(API):
+    """executes a list of requests ({code, test}, ...) of one token.
+    Results are streamed as NDJSON, one line {"index": ..., <response>} per request
+    in the order the requests are finished. Requests which aren't finished within
+    TIMEOUT seconds get timeout errors."""
+
     def post(self, request: WSGIRequest, token: uuid.UUID):
         with logging.LogCall(__file__, "post", self.__class__):
+            (setting, _plugin, error) = _load(token)
+            if error:
+                return error
             try:
-                db_setting = Setting.objects.get(  # pylint: disable=no-member
-                    token=token, plugin__active=True
+                items = json.loads(request.body.decode("utf-8"))
+            except ValueError:
+                items = None
+            if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+                return ErrorView("malformed", "list of requests expected", 400).to_response()
+            if len(items) > settings.BATCH_MAX_SIZE:
+                return ErrorView("batch_size", f"at most {settings.BATCH_MAX_SIZE} requests", 413).to_response()
+
+            requests = [
+                _plugin.Request(
+                    token=setting.token,
+                    version=setting.version,
+                    settings=setting.settings,
+                    timeout=settings.TIMEOUT,
+                    body=item
                 )
-            except:
-                return ErrorView("disabled", "Plugin Disabled", 404).to_response()
+                for item in items
+            ]
+            res = StreamingHttpResponse(self._stream(_plugin, requests), content_type="application/x-ndjson")
+            res["X-Accel-Buffering"] = "no"  # nginx
+            return res
+
+    @staticmethod
+    def _stream(plugin, requests):
+        # streamed after post returned: the whole batch has the deadline of one request
+        with timeout.deadline(settings.TIMEOUT):
+            for (index, response) in plugin.execute_batch(requests):
+                metrics.observe("batch", response.error)
+                yield json.dumps({"index": index, **response.serialize()}) + "\n"
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class Stream(API):
+    """executes a request like API, the output of the user code is streamed
+    while it's running. The response consists of server-sent events:
+        - event "output": {"stream": <stage>, "name": "stdout" | "stderr", "text": ...}
+        - event "result": the response of API, the last event
+    """
+
+    def post(self, request: WSGIRequest, token: uuid.UUID):
+        with logging.LogCall(__file__, "post", self.__class__):
+            (setting, _plugin, error) = _load(token)
+            if error:
+                return error
             try:
-                _plugin = get_plugin_list()[str(db_setting.plugin)]
-                _plugin = _plugin.get()
-            except:
-                return ErrorView("disabled", "Plugin Disabled", 500).to_response()
-            body = json.loads(request.body.decode("utf-8"))
+                body = json.loads(request.body.decode("utf-8"))
+            except ValueError:
+                body = None
+            if not isinstance(body, dict):
+                return ErrorView("malformed", "request expected", 400).to_response()
 
             req = _plugin.Request(
-                token=db_setting.token,
-                version=str(db_setting.date),
-                settings=json.loads(db_setting.settings),
+                token=setting.token,
+                version=setting.version,
+                settings=setting.settings,
                 timeout=settings.TIMEOUT,
                 body=body
             )
-            response = _plugin.execute(req)
-            res = HttpResponse()
-            res.status_code = 500 if response.has_error() else 200
-            res.content = json.dumps(response.serialize())
+            res = StreamingHttpResponse(self._stream(_plugin, req), content_type="text/event-stream")
+            res["Cache-Control"] = "no-cache"
+            res["X-Accel-Buffering"] = "no"  # nginx
             return res
 
+    @staticmethod
+    def _stream(plugin, request):
+        for (event, data) in plugin.execute_stream(request):
+            if event == "result":
+                metrics.observe("stream", data.error)
+                data = data.serialize()
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Metrics(View):
+    """metrics of all workers and the running containers in the text format of Prometheus (settings.METRICS)"""
+
+    def get(self, request: WSGIRequest):
+        with logging.LogCall(__file__, "get", self.__class__):
+            if not settings.METRICS:
+                return ErrorView("disabled", "Metrics Disabled", 404).to_response()
+            return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4")
+
+
+@csrf_exempt
+async def api_async(request, token: uuid.UUID):
+    """asyncio version of API (settings.ASYNC)"""
+    with logging.LogCall(__file__, "api_async"):
+        if request.method == "OPTIONS":
+            return _cors(API().options())
+        if request.method != "POST":
+            return _cors(ErrorView("method", "POST only", 405).to_response())
+        try:
+            return _cors(await asyncio.wait_for(_api_async_post(request, token), settings.TIMEOUT))
+        except asyncio.TimeoutError:
+            return _cors(_timeout())
+
+
+async def _api_async_post(request, token: uuid.UUID):
+    with Timings() as timings:
+        with Timings.stage("setting"):
+            (setting, _plugin, error) = await sync_to_async(_load)(token)
+        if error:
+            return error
+        body = json.loads(request.body.decode("utf-8"))
+
+        req = _plugin.Request(
+            token=setting.token,
+            version=setting.version,
+            settings=setting.settings,
+            timeout=settings.TIMEOUT,
+            body=body
+        )
+        with Timings.stage("execute"):
+            response = await _plugin.execute_async(req)
+        return _response(response, timings)
+
 
 @csrf_exempt
 def error_404(request: WSGIRequest):
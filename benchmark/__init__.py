@@ -0,0 +1,31 @@
+"""Benchmarks for ServerCodeTest.
+
+Run from the repository root, e.g.:
+    python -m benchmark.sctsock
+"""
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONTAINER_DIR = os.path.join(ROOT_DIR, "plugins", "python", "container")
+
+
+def setup_django():
+    """make app modules importable without a configured database"""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "servercodetest.settings")
+    os.environ.setdefault("SCT_DJANGO_SETTING", "test")
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    import django
+
+    django.setup()
+
+
+def setup_container():
+    """make the python plugin container modules importable"""
+    if CONTAINER_DIR not in sys.path:
+        sys.path.insert(0, CONTAINER_DIR)
+
+
+def report(name: str, count: int, duration: float):
+    print(f"{name:<30} {count:>8} requests {duration:>8.3f}s {count / duration:>10.1f} req/s")
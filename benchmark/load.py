@@ -0,0 +1,285 @@
+"""Submissions per second of the whole stack: API.post, the docker executor,
+the SCT protocol and the python plugin container.
+
+The Django app is set up with a temporary sqlite database, one Setting of the
+python plugin and a local stand-in for the docker daemon (app.util.docker._Docker):
+images are copies of the plugin's container directory and containers run
+main.py as a subprocess on a free port. Submissions from the test data of the
+container are posted by a fixed number of clients; the first one starts the
+container and is reported separately.
+
+usage: python -m benchmark.load [--clients 8] [--requests 200] [--mix mark=3,run=1] [--cache]
+"""
+import argparse
+import collections
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import setup_django, setup_container, report
+
+PLUGIN = "sct_python_3"
+SETTINGS = {
+    "exec": {"run": True, "mark": True, "pytest": True},
+    "sandbox": {
+        "user": [],
+        "test": [{"module": "hypothesis", "allowed": []}, {"module": "hypothesis.strategies", "allowed": []}],
+    },
+    "main": {},
+}
+
+
+def submissions() -> dict:
+    setup_container()
+    from test.testdata import user, compare  # pylint: disable=import-error
+
+    return {
+        "mark": {"code": user, "test": compare},
+        "run": {"code": user, "test": ""},
+        "syntax": {"code": user[: len(user) // 2], "test": compare},
+    }
+
+
+def parse_mix(text: str, names) -> list:
+    """"mark=3,run=1" -> ["mark", "mark", "mark", "run"]"""
+    mix = []
+    for entry in text.split(","):
+        (name, _, weight) = entry.partition("=")
+        if name not in names:
+            raise SystemExit(f"unknown submission {name!r}, choose from {', '.join(names)}")
+        mix.extend([name] * int(weight or 1))
+    return mix
+
+
+def percentile(values: list, p: float) -> float:
+    """nearest rank of the sorted values"""
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+class NotFound(Exception):
+    pass
+
+
+class LocalContainer:
+    """container of LocalDocker: main.py in a copy of the image directory"""
+
+    def __init__(self, docker: "LocalDocker", name: str, image: str, environment: dict = None):
+        self.name = name
+        self.status = "created"
+        self.attrs = {"Config": {"Image": image}, "NetworkSettings": {"Networks": {}}}
+        self.port = None
+        self._docker = docker
+        self._environment = environment or {}
+        self._dir = tempfile.mkdtemp(prefix="container_", dir=docker.root)
+        shutil.copytree(docker.image_dirs[image], self._dir, dirs_exist_ok=True)
+        self._proc = None
+
+    def start(self):
+        self.port = free_port()
+        env = dict(os.environ, **self._environment, SCT_PORT=str(self.port))
+        with open(os.path.join(self._dir, "main.log"), "ab") as log:
+            self._proc = subprocess.Popen([sys.executable, "-u", "main.py"], cwd=self._dir, env=env, stdout=log, stderr=log)
+        self.status = "running"
+
+    def stop(self):
+        if self._proc is not None:
+            self._proc.terminate()
+            self._proc.wait()
+            self._proc = None
+        self.status = "exited"
+
+    def remove(self):
+        self.stop()
+        with self._docker.lock:
+            self._docker.by_name.pop(self.name, None)
+
+    def rename(self, name: str):
+        with self._docker.lock:
+            self._docker.by_name[name] = self._docker.by_name.pop(self.name)
+            self.name = name
+
+
+class LocalDocker:
+    """stand-in for docker.DockerClient, only the calls of app.util.docker"""
+
+    class Containers:
+        def __init__(self, docker: "LocalDocker"):
+            self._docker = docker
+
+        def get(self, name: str) -> LocalContainer:
+            with self._docker.lock:
+                if name not in self._docker.by_name:
+                    raise NotFound(name)
+                return self._docker.by_name[name]
+
+        def create(self, image: str, name: str, network=None, environment: dict = None) -> LocalContainer:
+            container = LocalContainer(self._docker, name, image, environment)
+            with self._docker.lock:
+                self._docker.by_name[name] = container
+            return container
+
+        def list(self, all: bool = False, filters: dict = None) -> list:
+            filters = filters or {}
+            prefix = filters.get("name", "").rstrip("*")
+            with self._docker.lock:
+                containers = list(self._docker.by_name.values())
+            return [
+                cnt
+                for cnt in containers
+                if cnt.name.startswith(prefix)
+                and filters.get("ancestor", cnt.attrs["Config"]["Image"]) == cnt.attrs["Config"]["Image"]
+                and (all or cnt.status == "running")
+            ]
+
+    class Images:
+        def __init__(self, docker: "LocalDocker"):
+            self._docker = docker
+
+        def get(self, tag: str) -> str:
+            if tag not in self._docker.image_dirs:
+                raise NotFound(tag)
+            return tag
+
+        def build(self, path: str, tag: str, **kwargs):
+            directory = tempfile.mkdtemp(prefix="image_", dir=self._docker.root)
+            ignore = shutil.ignore_patterns("__pycache__", "tmp_*", "sct_settings.json")
+            shutil.copytree(path, directory, ignore=ignore, dirs_exist_ok=True)
+            self._docker.image_dirs[tag] = directory
+            return (tag, [])
+
+        def list(self, name: str = None) -> list:
+            return []
+
+    def __init__(self):
+        self.root = tempfile.mkdtemp(prefix="sct_benchmark_")
+        self.lock = threading.Lock()
+        self.by_name = {}
+        self.image_dirs = {}
+        self.containers = self.Containers(self)
+        self.images = self.Images(self)
+
+    def port(self, name: str) -> int:
+        return self.containers.get(name).port
+
+    def close(self):
+        for container in list(self.by_name.values()):
+            container.stop()
+
+        def writable(fn, path, _):
+            # directories of the settings snapshots are read-only
+            os.chmod(os.path.dirname(path), 0o700)
+            fn(path)
+
+        shutil.rmtree(self.root, onerror=writable)
+
+
+def setup(cache: bool) -> LocalDocker:
+    """Django with a temporary database and LocalDocker, returns the docker stand-in"""
+    # docker is enabled after the import, app.util.docker would connect to the daemon
+    os.environ.pop("SCT_DOCKER", None)
+    if not cache:
+        os.environ["SCT_RESULT_CACHE_SIZE"] = "0"
+    setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+    from app.plugins.plugin.sct_docker import Executor
+    from app.util import docker as docker_util
+
+    local = LocalDocker()
+    settings.DATABASES["default"]["NAME"] = os.path.join(local.root, "db.sqlite3")
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    settings.DOCKER_ENABLED = True
+    settings.TIMINGS = True
+    docker_util._Docker.client = local
+    # the containers listen on localhost instead of the docker network
+    Executor.get_url = lambda self: "localhost"
+    Executor.get_port = lambda self: local.port(self.get_container_name())
+    return local
+
+
+def post(view, token: str, body: dict) -> tuple:
+    """(seconds, error key or None, timings) of one request"""
+    from django.test import RequestFactory
+
+    request = RequestFactory().post(f"/api/{token}", data=json.dumps(body), content_type="application/json")
+    start = time.perf_counter()
+    res = view(request, token=token)
+    duration = time.perf_counter() - start
+    data = json.loads(res.content)
+    return (duration, data.get("error", {}).get("key", None), data.get("timings", {}))
+
+
+def run(view, token: str, bodies: list, clients: int) -> list:
+    with ThreadPoolExecutor(clients) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda body: post(view, token, body), bodies))
+        duration = time.perf_counter() - start
+    report(f"{clients} clients", len(bodies), duration)
+    return results
+
+
+def summary(results: list):
+    latencies = sorted(duration for (duration, _, _) in results)
+    print(
+        "  latency "
+        + " ".join(f"p{p} {percentile(latencies, p) * 1000:.0f}ms" for p in (50, 95, 99))
+        + f", mean {statistics.mean(latencies) * 1000:.0f}ms"
+    )
+    errors = collections.Counter(error for (_, error, _) in results if error)
+    if errors:
+        print("  errors " + ", ".join(f"{key}: {count}" for (key, count) in errors.most_common()))
+    stages = collections.defaultdict(list)
+    for (_, _, timings) in results:
+        for (stage, ms) in timings.items():
+            stages[stage].append(ms)
+    for (stage, values) in stages.items():
+        print(f"  {stage:<28} mean {statistics.mean(values):>9.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--mix", default="mark=3,run=1", help="weights of the submissions: mark, run, syntax")
+    parser.add_argument("--cache", action="store_true", help="reuse results of identical submissions")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    data = submissions()
+    mix = parse_mix(args.mix, data)
+    local = setup(args.cache)
+    try:
+        from app import views
+        from app.models import Plugin, Setting
+
+        Plugin.enable(PLUGIN)
+        token = str(Setting.objects.create(plugin_id=PLUGIN, settings=json.dumps(SETTINGS)).token)  # pylint: disable=no-member
+        view = views.API.as_view()
+
+        rng = random.Random(args.seed)
+        bodies = [dict(data[rng.choice(mix)]) for _ in range(args.requests)]
+        print(f"mix {args.mix}: " + ", ".join(f"{name} {count}" for (name, count) in collections.Counter(mix).items()))
+        cold = post(view, token, bodies[0])
+        print(f"first request (container start) {cold[0] * 1000:.0f}ms" + (f", error {cold[1]}" if cold[1] else ""))
+        summary(run(view, token, bodies, args.clients))
+    finally:
+        local.close()
+
+
+if __name__ == "__main__":
+    main()
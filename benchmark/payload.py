@@ -0,0 +1,83 @@
+"""Receive time of large packets over the SCT protocol.
+
+Compares the preallocated recv_into buffer of SCTSock with the previous
+implementation, which concatenated the received chunks (quadratic copying)
+and decoded the payload to str before parsing the JSON, and the encodings
+which can be negotiated by multiplexed connections.
+
+usage: python -m benchmark.payload [--repeat 5]
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+
+from . import setup_django, report
+
+SIZES = (("1KB", 1 << 10), ("1MB", 1 << 20), ("50MB", 50 << 20))
+
+
+def legacy_class():
+    from app.util.sctsock import SCTSock, Packet, _Packet, PayloadType
+
+    class LegacySCTSock(SCTSock):
+        def _recv(self, length: int):
+            data = b""
+            while length > len(data):
+                _data = self._sock.recv(length - len(data))
+                if len(_data) == 0:
+                    self._open = False
+                    raise IOError("Socket is closed!")
+                data = data + _data
+            return data
+
+        def recv(self) -> Packet:
+            p = self._recv_packet(_Packet())
+            # previous get_payload: decode to str, then parse a second copy
+            payload = p.payload.decode("utf8")
+            if p.payload_type == PayloadType.JSON:
+                payload = json.loads(payload)
+            return Packet(p.packet_type, payload, p.payload_type)
+
+    return LegacySCTSock
+
+
+def run(name: str, cls, payload: dict, repeat: int, encoding: str = "json"):
+    from app.util.sctsock import SCTSock
+
+    (a, b) = socket.socketpair()
+    with SCTSock(a) as sender, cls(b) as receiver:
+        sender.encoding = encoding
+        duration = 0
+        for _ in range(repeat):
+            thread = threading.Thread(target=sender.send_data, args=(payload,))
+            start = time.perf_counter()
+            thread.start()
+            packet = receiver.recv()
+            duration += time.perf_counter() - start
+            thread.join()
+            assert packet.payload == payload
+    report(name, repeat, duration)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from app.util.sctsock import SCTSock, get_encodings
+
+    legacy = legacy_class()
+    for (label, size) in SIZES:
+        payload = {"data": "x" * size}
+        run(f"{label} concat", legacy, payload, args.repeat)
+        run(f"{label} recv_into", SCTSock, payload, args.repeat)
+        for encoding in get_encodings():
+            if encoding != "json":
+                run(f"{label} recv_into {encoding}", SCTSock, payload, args.repeat, encoding)
+
+
+if __name__ == "__main__":
+    main()
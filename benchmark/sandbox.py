@@ -0,0 +1,64 @@
+"""Time of the sandbox source filter (util.sct_sandbox.filter_source).
+
+Compares the single pass scanner with the previous implementation, which
+rewrote the whole source with five regular expressions per forbidden name,
+on generated sources of different sizes (the test data of the container,
+repeated).
+
+usage: python -m benchmark.sandbox [--repeat 20]
+"""
+import argparse
+import re
+import time
+
+from . import setup_container, report
+
+SIZES = (("5KB", 5 << 10), ("100KB", 100 << 10), ("1MB", 1 << 20))
+
+
+def legacy_filter(src: str) -> str:
+    from util.sct_sandbox import FORBIDDEN_FUNCTIONS, FORBIDDEN_ATTRIBUTES  # pylint: disable=import-error
+
+    for key in FORBIDDEN_FUNCTIONS:
+        src = re.sub(f"([^.a-zA-Z0-9_])({key})([^a-zA-Z0-9_])", r"\1_sandboxed_.\2\3", src)
+        src = re.sub(f"(def|class)\\s+_sandboxed_.({key})", r"\1 \2", src)
+        src = re.sub(f"import\\s+_sandboxed_.({key})\\s+as", r"import \1 as", src)
+        src = re.sub(f"import\\s+_sandboxed_.({key})", r"import \1 as _\1_", src)
+        src = re.sub(f"([\\s,])_sandboxed_.({key})\\s+as", r"\1\2 as", src)
+    for key in FORBIDDEN_ATTRIBUTES:
+        src = re.sub(f"([^a-zA-Z0-9_])({key})([^a-zA-Z0-9_])", r"\1_sandboxed_.\2\3", src)
+    return src
+
+
+def source(size: int) -> str:
+    from test.testdata import user, compare  # pylint: disable=import-error
+
+    # some forbidden names in code, strings and comments
+    extra = 'x = eval("1")  # eval\ny = {}.__dict__\nprint("open the file", getattr(y, "a", None))\n'
+    block = user + compare + extra
+    return block * (size // len(block) + 1)
+
+
+def run(name: str, fn, src: str, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(src)
+    report(name, repeat, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_container()
+    from util.sct_sandbox import filter_source  # pylint: disable=import-error
+
+    for (label, size) in SIZES:
+        src = source(size)
+        run(f"{label} regex per name", legacy_filter, src, args.repeat)
+        run(f"{label} single pass", filter_source, src, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Submissions per second over the SCT protocol.
+
+Compares one TCP connection per submission with multiplexed connections (SCTPool),
+with and without the pipelined first packet (version, settings digest and request).
+The container main.py is started as a subprocess with a plugin that returns immediately,
+so only connection handling and protocol overhead is measured.
+
+usage: python -m benchmark.sctsock [--clients 20] [--requests 2000] [--pool 2]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import setup_django, setup_container, report
+
+PORT = 17001
+VERSION = "benchmark"
+SETTINGS = {"exec": {}, "main": {}}
+REQUEST = {"code": "print(1)", "test": ""}
+
+
+def server(port: int, threads: int):
+    setup_container()
+    os.chdir(tempfile.mkdtemp(prefix="sct_benchmark_"))  # sct_settings.json is written to the working directory
+    import main  # pylint: disable=import-error
+
+    class Plugin(main.Plugin):
+        def exec(self, data: dict, settings=None, on_output=None) -> dict:
+            return {"radon": {}, "exec": {}, "version": (settings or self.settings).version}
+
+    main.Plugin = Plugin
+    main.Main(threads=threads, port=port)
+
+
+def submit(sock, pipeline=False) -> dict:
+    from app.util.sctsock import PacketType
+
+    with sock:
+        if pipeline and "pipeline" in sock.features:
+            sock.send_init({"version": VERSION, "digest": VERSION, "request": REQUEST})
+        else:
+            sock.send_init(VERSION)
+        while True:
+            packet = sock.recv()
+            if packet.packet_type == PacketType.init:
+                sock.send_init(SETTINGS if packet.payload == "init" else REQUEST)
+            elif packet.packet_type != PacketType.debug:
+                return packet.payload
+
+
+def run(name: str, connect, clients: int, requests: int, pipeline=False):
+    with ThreadPoolExecutor(clients) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda _: submit(connect(), pipeline), range(requests)))
+        duration = time.perf_counter() - start
+    errors = sum(1 for res in results if not res or res.get("res") != 0)
+    report(name, requests, duration)
+    if errors:
+        print(f"  {errors} failed requests")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--pool", type=int, default=2)
+    parser.add_argument("--server", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.server:
+        return server(PORT, args.clients)
+
+    setup_django()
+    from app.util.sctsock import SCTSock, SCTPool, create_socket
+
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "benchmark.sctsock", "--server", "--clients", str(args.clients)],
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        submit(SCTSock(create_socket("localhost", PORT)))  # wait for startup
+        run("connection per request", lambda: SCTSock(create_socket("localhost", PORT)), args.clients, args.requests)
+        pool = SCTPool("localhost", PORT, args.pool)
+        run(f"multiplexed (pool={args.pool})", lambda: pool.channel(), args.clients, args.requests)
+        run(f"pipelined (pool={args.pool})", lambda: pool.channel(), args.clients, args.requests, True)
+        pool.close()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
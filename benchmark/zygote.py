@@ -0,0 +1,66 @@
+"""Wall time per submission of the python plugin (run, pytest and mark).
+
+Compares a new interpreter per step (subprocess) with forks of the
+pre-imported zygote. The container directory is copied to a temporary
+directory, which is used as working directory like /usr/src/plugin in the image.
+
+usage: python -m benchmark.zygote [--requests 20]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from . import CONTAINER_DIR, report
+
+SETTINGS = {
+    "exec": {"run": True, "mark": True, "pytest": True},
+    "sandbox": {
+        "user": (),
+        "test": ({"module": "hypothesis", "allowed": []}, {"module": "hypothesis.strategies", "allowed": []}),
+    },
+}
+
+
+def run(name: str, plugin, data: dict, requests: int):
+    times = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        plugin.exec(data)
+        times.append(time.perf_counter() - start)
+    report(name, requests, sum(times))
+    print(f"  {statistics.mean(times) * 1000:.0f}ms mean, {statistics.median(times) * 1000:.0f}ms median per submission")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work = os.path.join(tmp, "plugin")
+        shutil.copytree(CONTAINER_DIR, work, ignore=shutil.ignore_patterns("__pycache__", "tmp_*"))
+        os.chdir(work)
+        sys.path.insert(0, work)
+        import plugin  # pylint: disable=import-error
+        from test.testdata import user, compare  # pylint: disable=import-error
+        from util import Zygote  # pylint: disable=import-error
+
+        pl = plugin.Plugin()
+        pl.setSettings(0, SETTINGS)
+        data = {"code": user, "test": compare}
+
+        os.environ["SCT_ZYGOTE"] = "0"
+        run("subprocess per step", pl, data, args.requests)
+        os.environ["SCT_ZYGOTE"] = "1"
+        Zygote.start()
+        Zygote.ready.wait(30)
+        run("zygote fork per step", pl, data, args.requests)
+        Zygote.stop()
+
+
+if __name__ == "__main__":
+    main()
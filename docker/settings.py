@@ -1,7 +1,7 @@
 
 # pylint: disable=import-error
 # pylint: disable=no-name-in-module
-from app.servercodetest.settings import TIMEOUT,DJANGO_BASE_URL_PATH, DATABASES
+from app.servercodetest.settings import TIMEOUT,DJANGO_BASE_URL_PATH, DATABASES, ASYNC
 from app.servercodetest.util import env, etoi
 # pylint: enable=import-error
 # pylint: enable=no-name-in-module
@@ -117,6 +117,10 @@ def run_gunicorn():
     __bind = "--bind 0.0.0.0"
     __preload = "--preload"  # required for shared locks between process purposes
     app = "servercodetest.wsgi:application"
+    if settings.ASYNC:
+        # one event loop per process, threads are only used for blocking calls (db, docker)
+        __threads = "-k uvicorn.workers.UvicornWorker"
+        app = "servercodetest.asgi:application"
 
     os.system(f"gunicorn {_w} {_u} {__threads} {__timeout} {__bind} {__preload} {app}")
 
@@ -1,5 +1,5 @@
 from .main import Main
 
-def run(_dir:str, globalSettings:dict) -> dict:
-    e = Main(_dir, globalSettings)
+def run(_dir:str, globalSettings:dict, on_output=None, timings=None) -> dict:
+    e = Main(_dir, globalSettings, on_output, timings)
     return e.run()
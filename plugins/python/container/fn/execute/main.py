@@ -1,18 +1,23 @@
 import util
 import util.random
+import functools
 import os
 import json
 from .struct import Output, Text, Mark
 import logging
 class Main:
     def __init__(
-        self, _dir: str, globalSettings: "GlobalSettings",
+        self, _dir: str, globalSettings: "GlobalSettings", on_output=None, timings: util.Timings = None,
     ):
         from plugin import GlobalSettings
 
         self.dir = _dir
         self.delimiter = "DATA_" + util.random.string(20)
         self._global: GlobalSettings = globalSettings
+        # on_output(stage, name, text): output of run and pytest while it's running
+        self._on_output = on_output
+        # durations of run, pytest and mark
+        self.timings = timings or util.Timings()
 
     def _get_env(self):
         env = {
@@ -23,6 +28,8 @@ class Main:
         # TODO: remove non needed env vars
         for k, v in os.environ.items():
             env[k] = v
+        # helper files (sct_sandbox, sct_test) and sct_settings.json of the settings
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, (self._global.get_dir(), os.environ.get("PYTHONPATH"))))
         return env
 
     def _parse(self, data:str) -> dict:
@@ -35,14 +42,20 @@ class Main:
             logging.error("Couldn't parse result: %s -> data: %s", str(e), str(data))
             return (data, {})
 
-    def _popen(self, *args):
-        return util.Popen(*args, env=self._get_env(), cwd=self.dir)
+    def _popen(self, *args, stage=None):
+        on_output = None
+        if stage is not None and self._on_output is not None:
+            on_output = functools.partial(self._on_output, stage)
+        # processes are killed when the deadline of the request is reached
+        return util.Zygote.popen(
+            *args, env=self._get_env(), cwd=self.dir, timeout=util.Deadline.clamp(60), on_output=on_output
+        )
 
     def run_code(self):
         try:
             logging.debug("run_code->start")
-            popen = self._popen("python3", "./sct_user.py")
-            return Text(popen.error, popen.data)
+            popen = self._popen("python3", "./sct_user.py", stage="run")
+            return Text(popen.error, popen.data, popen.usage)
         except Exception as e:
             logging.error("Exception in run_code: %s", str(e))
             raise #forward excpetion
@@ -52,8 +65,8 @@ class Main:
     def run_pytest(self):
         try:
             logging.debug("run_pytest->start")
-            popen = self._popen("pytest", "./sct_user.py", "--color=yes")
-            return Text(popen.error, popen.data)
+            popen = self._popen("pytest", "./sct_user.py", "--color=yes", stage="pytest")
+            return Text(popen.error, popen.data, popen.usage)
         except Exception as e:
             logging.error("Exception in run_pytest: %s", str(e))
             raise #forward excpetion
@@ -63,9 +76,9 @@ class Main:
     def run_mark(self):
         try:
             logging.debug("run_mark->start")
-            popen = self._popen("python3", "./sct_exec_mark.py")
+            popen = self._popen("python3", os.path.join(self._global.get_dir(), "sct_exec_mark.py"))
             (text, data) = self._parse(popen.data)
-            ret = Mark(popen.error, text)
+            ret = Mark(popen.error, text, popen.usage)
             for (_, value) in data.items():
                 for entry in value["reg"]:
                     ret.add(*entry, False)
@@ -81,9 +94,12 @@ class Main:
     def run(self):
         output = Output()
         if self._global.exec.run:
-            output.run = self.run_code()
+            with self.timings.stage("run"):
+                output.run = self.run_code()
         if self._global.exec.pytest:
-            output.pytest = self.run_pytest()
+            with self.timings.stage("pytest"):
+                output.pytest = self.run_pytest()
         if self._global.exec.mark:
-            output.mark = self.run_mark()
+            with self.timings.stage("mark"):
+                output.mark = self.run_mark()
         return output.serialize()
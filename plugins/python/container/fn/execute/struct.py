@@ -3,9 +3,11 @@ from util.struct import Base
 
 
 class Text(Base):
-    def __init__(self, error: str, text: str):
+    def __init__(self, error: str, text: str, usage: dict = None):
         self.error = error
         self.text = text
+        # cpu_ms, max_rss_kb and output_bytes of the process
+        self.usage = usage or {}
 
 
 class Mark(Text):
@@ -15,8 +17,8 @@ class Mark(Text):
             self.points = points
             self.function = fn
 
-    def __init__(self, error: str, text: str):
-        super().__init__(error, text)
+    def __init__(self, error: str, text: str, usage: dict = None):
+        super().__init__(error, text, usage)
         self.success = []
         self.missed = []
 
@@ -1,49 +1,70 @@
-import re
-import util
-import util.iterator
-import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from radon.complexity import cc_visit, cc_rank, sorted_results
+from radon.raw import analyze
+from radon.visitors import Class
+
 from .struct import Output, CyclomaticComplexity, Raw
 
 
-def _get(method: str, _dir: str) -> str:
-    try:
-        data = json.loads(util.Popen("radon", method, "-j", _dir).data)
-        for key, file_data in data.items():
-            if file_data.get("error", False):
-                del data[key]
-        return data
-    except:
-        return {}
+class Cache:
+    """LRU cache: hash of the source -> serialized metrics"""
+
+    size = 256
+    lock = threading.Lock()
+    entries: "OrderedDict[str, dict]" = OrderedDict()
 
+    @classmethod
+    def get(cls, key: str):
+        with cls.lock:
+            if key in cls.entries:
+                cls.entries.move_to_end(key)
+                return cls.entries[key]
+        return None
 
-def get_cc(_dir):
-    data = _get("cc", _dir)
+    @classmethod
+    def set(cls, key: str, value: dict):
+        with cls.lock:
+            cls.entries[key] = value
+            while len(cls.entries) > cls.size:
+                cls.entries.popitem(last=False)
+
+
+def get_cc(src: str):
     res = CyclomaticComplexity()
-    for (_, entries) in data.items():
-        for entry in entries:
-            fn = entry.get("name", 0)
-            type = entry.get("type", 0)
-            complexity = entry.get("complexity", 0)
-            rank = entry.get("rank", 0)
-            res.add(fn, type, rank, complexity)
-        break
+    try:
+        blocks = sorted_results(cc_visit(src))
+    except Exception:
+        return res
+    for block in blocks:
+        if isinstance(block, Class):
+            type = "class"
+        else:
+            type = "method" if block.is_method else "function"
+        res.add(block.name, type, block.complexity, cc_rank(block.complexity))
     return res
 
 
-def get_raw(_dir):
-    data = _get("raw", _dir)
+def get_raw(src: str):
     res = Raw()
-    for (_, entry) in data.items():
-        loc = entry.get("loc", 0)
-        sloc = entry.get("sloc", 0)
-        lloc = entry.get("lloc", 0)
-        res.set(loc, sloc, lloc)
-        break
+    try:
+        data = analyze(src)
+    except Exception:
+        return res
+    res.set(data.loc, data.sloc, data.lloc)
     return res
 
 
-def get(_dir, global_settings):
+def get(src: str, global_settings):
+    """radon metrics of the user source, same source -> same result"""
+    key = hashlib.sha256(src.encode("utf8")).hexdigest()
+    if (ret := Cache.get(key)) is not None:
+        return ret
     output = Output()
-    output.raw = get_raw(_dir)
-    output.cyclomatic_complexity = get_cc(_dir)
-    return output.serialize()
+    output.raw = get_raw(src)
+    output.cyclomatic_complexity = get_cc(src)
+    ret = output.serialize()
+    Cache.set(key, ret)
+    return ret
@@ -6,18 +6,27 @@ import os, sys, signal
 import logging
 
 # pylint: disable=import-error
-from sctsock import SCTSock, create_socket
+from sctsock import SCTSock, SCTMuxSock, PacketType, create_socket
 from plugin import Plugin
-from util import get_traceback
+from util import get_traceback, Zygote, Executor, QueueFullError, Kill, Timings
 
 # pylint: enable=import-error
 
-from threading import Thread, Event
+from threading import Thread, Event, Lock
+import weakref
 import multiprocessing
 import multiprocessing.pool
+import concurrent.futures
+import selectors
 from enum import IntEnum
 import signal
 
+# protocol features announced by the mux handshake:
+# - pipeline: the first packet may contain version, settings digest and request
+# - stream: requests with "stream": true get the output of run and pytest as debug packets
+# - metrics: the frame {"metrics": true} is answered with get_stats (not counted as request)
+FEATURES = ("pipeline", "stream", "metrics")
+
 class ErrorCodes(IntEnum):
     none = 0
     too_many_connections = 1
@@ -26,6 +35,22 @@ class ErrorCodes(IntEnum):
     exception = 4
 
 
+class Results:
+    """number of sent results per ErrorCodes"""
+    lock = Lock()
+    counts = {code.name: 0 for code in ErrorCodes}
+
+    @classmethod
+    def add(cls, code: ErrorCodes):
+        with cls.lock:
+            cls.counts[ErrorCodes(code).name] += 1
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        with cls.lock:
+            return dict(cls.counts)
+
+
 class Timeout:
     def __init__(self, callback, wait=60):
         self.exit = Event()
@@ -102,6 +127,10 @@ class Connections:
         with self._lock:
             self._entries.remove(con)
 
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
     def apply(self, fn):
         with self._lock:
             for entry in self._entries:
@@ -125,97 +154,177 @@ class ConnectionsWrapper:
             raise
 
 
+class OutputStream:
+    """forwards the output of user code as debug packets
+    {"stream": stage, "name": "stdout" | "stderr", "text": text} until it's closed"""
+    def __init__(self, sock: SCTSock):
+        self._sock = sock
+        self._lock = Lock()
+        self._closed = False
+
+    def __call__(self, stage: str, name: str, text: str):
+        with self._lock:
+            if not self._closed and not self._sock.send_debug({"stream": stage, "name": name, "text": text}):
+                self._closed = True
+
+    def close(self):
+        """no packets are sent afterwards, e.g. the result"""
+        with self._lock:
+            self._closed = True
+
+
 class Listener:
-    def __init__(self, on_connect):
+    """accepts connections as soon as they arrive, until close is called"""
+    def __init__(self, on_connect, port:int=1700):
         self._on_connect = on_connect
+        self._port = port
+        # close wakes up the selector
+        (self._wakeup, self._wakeup_send) = socket.socketpair()
+        self._exit = Event()
 
     def run(self):
-        listener = create_socket("", 1700, False)
-        listener.settimeout(0.5)
-        self._exit = Event()
-        while not self._exit.is_set():
+        listener = create_socket("", self._port, False)
+        listener.setblocking(False)
+        with selectors.DefaultSelector() as selector:
+            selector.register(listener, selectors.EVENT_READ)
+            selector.register(self._wakeup, selectors.EVENT_READ)
+            while not self._exit.is_set():
+                for (key, _) in selector.select():
+                    if key.fileobj is listener and not self._accept(listener):
+                        self._exit.set()
+        listener.close()
+
+    def _accept(self, listener) -> bool:
+        while True:
             try:
                 (client, _) = listener.accept()
-            except socket.timeout:
-                continue
-            except:
-                break
-            sock = SCTSock(client)
-            self._on_connect(sock)
+            except BlockingIOError:
+                return True
+            except OSError:
+                return False
+            client.setblocking(True)
+            self._on_connect(SCTSock(client))
 
     def close(self):
         self._exit.set()
+        try:
+            self._wakeup_send.send(b"\0")
+        except OSError:
+            pass
 
 
 class Main:
     @staticmethod
     def send_data(sock: SCTSock, code: ErrorCodes, data=None):
+        Results.add(code)
         sock.send_data({"res": code, "data": data})
         sock.close()
 
-    def __init__(self, threads:int=20, listener_timeout:int=600, request_timeout:int=50):
-        self._request_timout = request_timeout
+    def __init__(self, threads:int=20, listener_timeout:int=600, port:int=1700, warm:bool=False):
+        # warm containers wait for their first request without timeout
+        self._warm_timeout = listener_timeout if warm else None
+        if warm:
+            listener_timeout = 7*24*60*60
 
         signal.signal(signal.SIGTERM, self.stop)
 
-        self._pool = multiprocessing.pool.ThreadPool(threads + 1)
+        self._pool = concurrent.futures.ThreadPoolExecutor(threads + 1, thread_name_prefix="sct_connection")
+        # Plugin.exec of requests and batch items, bounded by the connections and the batch pool
+        self._executor = Executor(threads, 2 * threads)
+        # items of batch requests, separate pool: the connection threads wait for them
+        self._batch_pool = multiprocessing.pool.ThreadPool(threads)
         self._lock = multiprocessing.Lock()
+        self._mux = weakref.WeakSet()
 
+        if Zygote.enabled():
+            Zygote.start()
         self._plugin = Plugin()
         self._timeout = Timeout(self.stop, listener_timeout)
         self._connections = Connections(threads)
-        self._listener = Listener(self.handle_connection)
+        self._listener = Listener(self.handle_connection, port)
         self._listener.run()
 
     def stop(self, signum:int=0, frame=None):
         self._timeout.stop()
         self._listener.close()
         self._connections.apply(lambda con: self.send_data(con, ErrorCodes.listener_timeout))
-        self._pool.close()
+        for mux in tuple(self._mux):
+            mux.close()
+        self._pool.shutdown(wait=False)
+        self._batch_pool.close()
+        self._executor.shutdown()
+        Zygote.stop()
 
     def handle_connection(self, sock: SCTSock):
-        self._pool.apply_async(self._handle_connection_thread, [sock])
-    
-    def _set_request_timeout(self, val):
-        # don't call this function without locking self._lock first!
-        _type = type(val)
-        if _type!=int and _type != float:
-            return False
-        if val <= 0:
-            return True
-        # upper / lower bound for timeout
-        val = min(max(val, 5), 60) # 60 seconds max
-        self._request_timout = val
-        return True
+        self._pool.submit(self._handle_connection_thread, sock)
 
     def _handle_connection_thread(self, sock: SCTSock):
+        packet = sock.recv()
+        if packet.packet_type == PacketType.mux:
+            # long-lived connection, every channel is handled like a single connection
+            if (mux := SCTMuxSock.accept(sock, self.handle_connection_channel, offer=packet.payload, features=FEATURES)) :
+                self._mux.add(mux)
+            return
+        self._handle_request(sock, packet.payload)
+
+    def handle_connection_channel(self, sock: SCTSock):
+        self._pool.submit(self._handle_channel_thread, sock)
+
+    def _handle_channel_thread(self, sock: SCTSock):
+        self._handle_request(sock, sock.recv().payload)
+    
+    def _handle_request(self, sock: SCTSock, frame):
+        """frame: settings version or pipelined request {"version", "digest", "request"}"""
+        (version, digest, pipelined) = (frame, None, False)
+        if isinstance(frame, dict) and frame.get("metrics", False) == True:
+            # no request: doesn't keep the container alive
+            sock.send_data({"res": ErrorCodes.none, "data": self.get_stats()})
+            sock.close()
+            return
+        if isinstance(frame, dict) and "version" in frame:
+            (version, digest, pipelined) = (frame["version"], frame.get("digest", None), True)
         try:
             with ConnectionsWrapper(sock, self._connections):
+                if self._warm_timeout:
+                    self._timeout.set_timeout_duration(self._warm_timeout)
+                    self._warm_timeout = None
                 self._timeout.reset()
-                timeout = None
-                with self._lock:
-                    version = sock.recv().payload
-                    if not self._plugin.checkVersion(version):
+                timings = Timings()
+                # snapshot, other connections may replace the settings meanwhile.
+                # No lock is held while waiting for the client.
+                with timings.stage("settings"):
+                    settings = self._plugin.getSettings(version, digest)
+                    if settings is None:
                         sock.send_init("init")
                         data = sock.recv().payload
-                        self._plugin.setSettings(version, data)
-                        self._timeout.set_timeout_duration(data.get("main", {}).get("container_timeout", None))
-                        self._set_request_timeout(data.get("main", {}).get("code_timeout", None))
+                        settings = self._plugin.setSettings(version, data, digest)
+                        with self._lock:
+                            self._timeout.set_timeout_duration(data.get("main", {}).get("container_timeout", None))
                         logging.debug("Settings: %s", str(data))
-                    timeout = self._request_timout
-                if timeout==None:
-                    raise ValueError("timeout must be set!")
+                # of the version of this request, other versions may be loaded meanwhile
+                timeout = settings.code_timeout
     
-                sock.send_init("data")
-                con_pool = multiprocessing.pool.ThreadPool(1)
-                data = sock.recv().payload
-                result = con_pool.apply_async(self._plugin.exec, [data]).get( timeout )
-                con_pool.close()
+                if pipelined:
+                    data = frame.get("request", None)
+                else:
+                    sock.send_init("data")
+                    data = sock.recv().payload
+                if isinstance(data, dict) and isinstance(data.get("batch", None), list):
+                    self._handle_batch(sock, data["batch"], timeout, settings)
+                    return
+                on_output = None
+                if isinstance(data, dict) and data.get("stream", False) == True:
+                    on_output = OutputStream(sock)
+                try:
+                    result = self._exec(data, timeout, settings, timeout, on_output, timings)
+                finally:
+                    if on_output is not None:
+                        on_output.close()
                 self.send_data(sock, ErrorCodes.none, result)
-        except multiprocessing.TimeoutError:
+        except TimeoutError:
             logging.debug("A timeout occurred while executing user code")
             self.send_data(sock, ErrorCodes.execution_timeout)
-        except TooManyConnectionsError:
+        except (TooManyConnectionsError, QueueFullError):
             logging.info("Too many connections: Maybe increase threadcount.")
             self.send_data(sock, ErrorCodes.too_many_connections)
         except Exception as e:
@@ -225,9 +334,54 @@ class Main:
         finally:
             sock.close()
 
+    def _exec(self, data, timeout, settings, queue_timeout=None, on_output=None, timings:Timings=None):
+        """Plugin.exec with a deadline of timeout seconds after its start,
+        raises TimeoutError if it didn't start within queue_timeout seconds (None: no limit).
+        The stages before Plugin.exec (timings and the time in the queue) are added to the timings of the result"""
+        job = self._executor.submit(self._plugin.exec, data, settings, on_output, timeout=timeout, wait=queue_timeout)
+        if (queued := self._executor.get_stats()["queued"]) :
+            logging.info("exec queue depth: %d", queued)
+        result = job.result(queue_timeout)
+        if isinstance(result, dict) and isinstance(result.get("timings", None), dict):
+            timings = timings or Timings()
+            timings.add("queue", job.queued)
+            result["timings"] = {**timings.serialize(), **result["timings"]}
+        return result
+
+    def get_stats(self) -> dict:
+        """connections, queue depth of the executor, killed process groups of user code and sent results"""
+        return {
+            "connections": len(self._connections),
+            "exec": self._executor.get_stats(),
+            "kill": Kill.get_stats(),
+            "results": Results.get_stats(),
+        }
+
+    def _handle_batch(self, sock: SCTSock, items: list, timeout, settings):
+        """executes all items with the given settings,
+        results are sent as soon as they are finished (with the index of the item)"""
+        lock = Lock()
+
+        def run(index, data):
+            self._timeout.reset()
+            try:
+                (code, result) = (ErrorCodes.none, self._exec(data, timeout, settings))
+            except TimeoutError:
+                (code, result) = (ErrorCodes.execution_timeout, None)
+            except Exception as e:
+                (code, result) = (ErrorCodes.exception, get_traceback(e))
+                logging.error(str(result))
+            Results.add(code)
+            with lock:
+                sock.send_data({"res": code, "data": result, "index": index})
+
+        jobs = [self._batch_pool.apply_async(run, [index, data]) for (index, data) in enumerate(items)]
+        for job in jobs:
+            job.wait()
+
 
 if __name__ == "__main__":
     logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', level=logging.DEBUG)
     logging.info("Startup")
-    Main()
+    Main(port=int(os.environ.get("SCT_PORT", "1700")), warm=os.environ.get("SCT_WARM", "0") == "1")
     logging.info("Shutdown")
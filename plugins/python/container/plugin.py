@@ -5,11 +5,49 @@ import logging
 
 import os
 import json
+import shutil
 import tempfile
+import threading
+import weakref
+from collections import OrderedDict
 from fn import run_execute, run_radon
 from util.sct_sandbox import filter_source
+from util.timing import Timings
+
+CONTAINER_DIR = os.path.dirname(os.path.abspath(__file__))
+# seconds a request may run if the settings don't set main.code_timeout
+CODE_TIMEOUT = 50
+
+
+def find_helpers(root:str=CONTAINER_DIR) -> dict:
+    """sct_* files of the container (name -> absolute path), used by the jobs"""
+    helpers = {}
+    for (path, dirs, files) in os.walk(root):
+        dirs[:] = [entry for entry in dirs if not entry.startswith("tmp_") and entry != "__pycache__"]
+        for file in files:
+            if file.startswith("sct_") and file != "sct_settings.json":
+                helpers.setdefault(file, os.path.abspath(os.path.join(path, file)))
+    return helpers
+
+
+def _remove(path:str):
+    os.chmod(path, 0o700)
+    shutil.rmtree(path, True)
+
+
+def _code_timeout(val) -> float:
+    if type(val) not in (int, float) or val <= 0:
+        return CODE_TIMEOUT
+    # upper / lower bound for timeout
+    return min(max(val, 5), 60) # 60 seconds max
+
 
 class GlobalSettings:
+    """Settings of one version. Instances are snapshots: they are replaced,
+    not modified, so running requests keep the settings they started with.
+    Every snapshot has its own read-only directory with the sandbox configuration
+    and links to the helper files, which is on the PYTHONPATH of the jobs."""
+
     class Exec:
         def __init__(self, data:dict={}):
             self.reset(data)
@@ -42,54 +80,84 @@ class GlobalSettings:
             for entry in data.get("test", ()):
                 self.add("compare", entry.get("module"), entry.get("allowed"))
 
-
-    path = os.path.abspath("sct_settings.json")
-
-    def __init__(self, data=None):
+    def __init__(self, data=None, version=None, digest=None, helpers:dict={}):
+        self.version = version
+        self.digest = digest
+        self._dir = tempfile.mkdtemp(prefix="sct_settings_")
+        # removed when the last request using this snapshot is finished
+        weakref.finalize(self, _remove, self._dir)
         self.reset(data)
+        for (name, path) in helpers.items():
+            os.symlink(path, os.path.join(self._dir, name))
+        os.chmod(self._dir, 0o555)
+
+    def get_dir(self):
+        return self._dir
 
     def get_path(self):
-        return self.path
+        return os.path.join(self._dir, "sct_settings.json")
+
+    def matches(self, version, digest=None) -> bool:
+        return self.version == version and (digest is None or digest == self.digest)
 
     def reset(self, data=None):
         if not isinstance(data, (dict,)):
             data = {}
         self.debug: bool = data.get("debug", False) == True
+        main = data.get("main", {})
+        if not isinstance(main, (dict,)):
+            main = {}
+        # seconds a request of this version may run
+        self.code_timeout: float = _code_timeout(main.get("code_timeout", None))
         self.exec = self.Exec(data.get("exec", {}))
         self.sandbox = self.Sandbox(data.get("sandbox", {}))
 
         os.makedirs(os.path.dirname(self.get_path()), exist_ok=True)
-        with open(self.get_path(), "w") as file:
+        # replaced atomically, jobs never read a partially written file
+        (fd, tmp) = tempfile.mkstemp(prefix=".sct_settings_", dir=os.path.dirname(self.get_path()))
+        with os.fdopen(fd, "w") as file:
             file.write(json.dumps(self.sandbox.imports))
+        os.replace(tmp, self.get_path())
 
 
 class Plugin:
-    def __init__(self):
-        self.settings = GlobalSettings()
-        self.version = None
-
-    def checkVersion(self, version):
-        return self.version == version
+    # max. number of settings versions kept, least recently used versions are removed
+    versions = int(os.environ.get("SCT_SETTINGS_VERSIONS", "8"))
 
-    def setSettings(self, version, settings):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: "OrderedDict[str, GlobalSettings]" = OrderedDict()
+        # found once, linked once per snapshot
+        self.helpers = find_helpers()
+        # latest snapshot, default of exec
+        self.settings = GlobalSettings(helpers=self.helpers)
+
+    @property
+    def version(self):
+        return self.settings.version
+
+    def getSettings(self, version, digest=None):
+        """snapshot of the given version or None if it isn't known (anymore)"""
+        with self._lock:
+            settings = self._versions.get(version, None)
+            if settings is None or not settings.matches(version, digest):
+                return None
+            self._versions.move_to_end(version)
+            return settings
+
+    def checkVersion(self, version, digest=None):
+        return self.getSettings(version, digest) is not None
+
+    def setSettings(self, version, settings, digest=None) -> GlobalSettings:
         logging.info("SetSettings: %s", str(version))
-        self.version = version
-        self.settings.reset(settings)
-
-    def _add_links(self, _dir):
-        for (path, _, files) in os.walk("."):
-            if os.path.split(path)[1].startswith("tmp_"):
-                continue
-            for file in files:
-                if not file.startswith("sct_"):
-                    continue
-                try:
-                    os.symlink(
-                        os.path.abspath(os.path.join(path, file)),
-                        os.path.join(_dir, file),
-                    )
-                except:
-                    pass
+        snapshot = GlobalSettings(settings, version, digest, self.helpers)
+        with self._lock:
+            self._versions[version] = snapshot
+            self._versions.move_to_end(version)
+            while len(self._versions) > max(self.versions, 1):
+                self._versions.popitem(last=False)
+            self.settings = snapshot
+        return snapshot
 
     def _write_files(self, _dir:str, data:dict):
         code = filter_source(data["code"], "def test_dummy():\n assert True")
@@ -99,14 +167,20 @@ class Plugin:
         with open(os.path.join(_dir, "sct_compare.py"), "w") as file:
             file.write(test)
 
-    def exec(self, data:dict) -> dict:
+    def exec(self, data:dict, settings:GlobalSettings=None, on_output=None) -> dict:
+        """execute data with the given snapshot (default: current settings).
+        on_output(stage, name, text) gets the output of run and pytest while they are running"""
+        settings = settings or self.settings
+        timings = Timings()
+        # the helper files are imported from the directory of the snapshot
         with tempfile.TemporaryDirectory(prefix="tmp_", dir=os.getcwd()) as _dir:
-            self._add_links(_dir)
-            self._write_files(_dir, data)
+            with timings.stage("setup"):
+                self._write_files(_dir, data)
             try:
-                _radon = run_radon(_dir, self.settings)
-                _exec = run_execute(_dir, self.settings)
-                return {"radon": _radon, "exec": _exec, "version": self.version}
+                with timings.stage("radon"):
+                    _radon = run_radon(data["code"], settings)
+                _exec = run_execute(_dir, settings, on_output, timings)
+                return {"radon": _radon, "exec": _exec, "version": settings.version, "timings": timings.serialize()}
             except Exception as e:
                 logging.error("Error1 (%s) executing code: '%s'", str(e), data.get("code", ""))
                 logging.error("Error2 (%s) executing code: '%s'", str(e), data.get("test", ""))
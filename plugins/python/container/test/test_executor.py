@@ -0,0 +1,76 @@
+from util.executor import Executor, Deadline, DeadlineExceeded, QueueFullError
+import threading
+import time
+import pytest
+
+
+def test_result():
+    executor = Executor(2, 2)
+    job = executor.submit(lambda a, b: a + b, 1, 2, timeout=5)
+    assert job.result() == 3
+    assert executor.get_stats()["submitted"] == 1
+    executor.shutdown()
+
+
+def test_deadline():
+    executor = Executor(1, 0)
+    job = executor.submit(lambda: Deadline.clamp(60), timeout=5)
+    assert 4 < job.result() <= 5
+    assert Deadline.clamp(60) == 60  # no job in this thread
+
+    release = threading.Event()
+    job = executor.submit(release.wait, timeout=0.1)
+    with pytest.raises(DeadlineExceeded):
+        job.result()
+    release.set()
+    assert executor.get_stats()["timeouts"] == 1
+    executor.shutdown()
+
+
+def test_queue():
+    executor = Executor(1, 1)
+    release = threading.Event()
+    running = executor.submit(release.wait, timeout=5)
+    queued = executor.submit(lambda: 1, timeout=5)
+    with pytest.raises(QueueFullError):
+        executor.submit(lambda: 1, timeout=5)
+    assert executor.get_stats()["queued"] == 1
+
+    # queued jobs are cancelled when they don't start in time, their slot is free again
+    with pytest.raises(DeadlineExceeded):
+        queued.result(queue_timeout=0.1)
+    stats = executor.get_stats()
+    assert (stats["queued"], stats["running"], stats["cancelled"]) == (0, 1, 1)
+    waiting = executor.submit(lambda: 2, timeout=5)
+    release.set()
+    assert running.result() is True
+    assert waiting.result() == 2
+    executor.shutdown()
+
+
+def test_kill_abandoned_job(monkeypatch, tmp_path):
+    from util import Popen, Kill
+    import util.executor
+
+    monkeypatch.setattr(util.executor, "GRACE", 0.1)
+    killed = Kill.get_stats()["killed"]
+    executor = Executor(1, 0)
+    # the process timeout is longer than the deadline: the process group is killed by the executor
+    job = executor.submit(lambda: Popen("sh", "-c", "sleep 30 & sleep 30", cwd=tmp_path, timeout=30), timeout=0.5)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        job.result()
+    assert job.future.result(5).code == -9
+    assert time.monotonic() - start < 5
+    assert executor.get_stats()["killed"] == 1
+    assert Kill.get_stats()["killed"] == killed + 1
+    executor.shutdown()
+
+
+def test_kill_on_timeout(tmp_path):
+    from util import Popen
+
+    start = time.monotonic()
+    popen = Popen("sh", "-c", "sleep 30 & sleep 30", cwd=tmp_path, timeout=0.3)
+    assert popen.isTimeout
+    assert time.monotonic() - start < 5  # the background process is killed, too
@@ -0,0 +1,78 @@
+from util import Popen, Zygote
+from util.limits import Limits
+import os
+import sys
+import time
+import pytest
+
+SPAM = "while True: print('x' * 1000)"
+
+
+def python(tmp_path, code: str, timeout=10) -> Popen:
+    return Popen(sys.executable, "-c", code, cwd=tmp_path, env=dict(os.environ), timeout=timeout)
+
+
+def test_usage(tmp_path):
+    popen = python(tmp_path, "print(sum(range(10 ** 6)))")
+    assert popen.code == 0 and popen.data == "499999500000\n"
+    assert popen.usage["cpu_ms"] >= 0 and popen.usage["max_rss_kb"] > 0
+    assert popen.usage["output_bytes"] == len(popen.data)
+
+
+def test_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(Limits, "output", 10000)
+    popen = python(tmp_path, SPAM)
+    assert popen.code < 0 and not popen.isTimeout  # killed
+    assert popen.data.startswith("x" * 1000) and popen.data.endswith("[output truncated after 10000 bytes]\n")
+    assert popen.usage["output_bytes"] > 10000
+
+
+def test_output_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(Limits, "output", 10000)
+    # other files aren't limited, output of exactly the limit isn't truncated
+    popen = python(tmp_path, "open('data', 'w').write('x' * 100000)\nprint('x' * 9999)")
+    assert popen.code == 0 and popen.data == "x" * 9999 + "\n"
+    assert (tmp_path / "data").stat().st_size == 100000
+
+
+def test_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(Limits, "memory", 256)
+    popen = python(tmp_path, "x = bytearray(1 << 30)")
+    assert popen.code == 1 and "MemoryError" in popen.error
+
+
+def test_cpu(tmp_path, monkeypatch):
+    monkeypatch.setattr(Limits, "cpu", 1)
+    start = time.monotonic()
+    popen = python(tmp_path, "while True: pass")
+    assert popen.code < 0 and not popen.isTimeout  # SIGXCPU
+    assert time.monotonic() - start < 5
+    assert popen.usage["cpu_ms"] >= 900
+
+
+def test_stream(tmp_path):
+    chunks = []
+    code = "import sys, time\nprint('a', flush=True)\ntime.sleep(0.5)\nprint('b', file=sys.stderr)"
+    start = time.monotonic()
+    on_output = lambda name, text: chunks.append((time.monotonic() - start, name, text))
+    popen = Popen(sys.executable, "-c", code, cwd=tmp_path, env=dict(os.environ), on_output=on_output)
+    assert popen.code == 0 and popen.data == "a\n" and popen.error == "b\n"
+    assert [(name, text) for (_, name, text) in chunks] == [("stdout", "a\n"), ("stderr", "b\n")]
+    assert chunks[0][0] < 0.5  # while the process is running
+
+
+def test_zygote(tmp_path, monkeypatch):
+    monkeypatch.setattr(Limits, "output", 10000)
+    monkeypatch.setenv("SCT_ZYGOTE", "1")
+    Zygote.start()
+    try:
+        (tmp_path / "spam.py").write_text(SPAM)
+        fork = Zygote.popen("python3", "spam.py", cwd=tmp_path, env={})
+        assert type(fork).__name__ == "Fork"
+        assert fork.data.endswith("[output truncated after 10000 bytes]\n")
+        assert fork.code == -1 and fork.usage["output_bytes"] > 10000
+        chunks = []
+        fork = Zygote.popen("python3", "spam.py", cwd=tmp_path, env={}, on_output=lambda *chunk: chunks.append(chunk))
+        assert "".join(text for (name, text) in chunks if name == "stdout") == fork.data[:10000]
+    finally:
+        Zygote.stop()
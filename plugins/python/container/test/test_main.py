@@ -0,0 +1,127 @@
+from sctsock import SCTSock, PacketType, create_socket
+from concurrent.futures import ThreadPoolExecutor
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import pytest
+
+CONTAINER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = """
+import sys, time
+sys.path.insert(0, {container!r})
+import main
+
+class Plugin(main.Plugin):
+    def exec(self, data, settings=None, on_output=None):
+        time.sleep(0.01)
+        if on_output is not None:
+            for line in ("1\\n", "2\\n"):
+                on_output("run", "stdout", line)
+        settings = settings or self.settings
+        return {{"version": settings.version, "code_timeout": settings.code_timeout, "timings": {{"run": 10.0}}}}
+
+main.Plugin = Plugin
+main.Main(threads=40, port={port})
+"""
+SETTINGS = {"exec": {}, "main": {}}
+REQUEST = {"code": "print(1)", "test": ""}
+CLIENTS = 20
+REQUESTS = 200
+STALL = 3
+
+
+@pytest.fixture
+def container(tmp_path):
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        port = sock.getsockname()[1]
+    env = dict(os.environ, SCT_ZYGOTE="0")
+    code = SERVER.format(container=CONTAINER_DIR, port=port)
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=tmp_path, env=env, stderr=subprocess.DEVNULL)
+    yield port
+    proc.terminate()
+    proc.wait()
+
+
+def connect(port: int) -> SCTSock:
+    for _ in range(100):
+        try:
+            return SCTSock(create_socket("localhost", port), timeout=10)
+        except OSError:
+            time.sleep(0.1)
+    raise ConnectionError("container didn't start")
+
+
+def submit(port: int, version: str, stall: float = 0, request: dict = REQUEST, debug: list = None, settings: dict = SETTINGS) -> dict:
+    with connect(port) as sock:
+        sock.send_init(version)
+        while True:
+            packet = sock.recv()
+            if packet.packet_type == PacketType.init and packet.payload == "init":
+                time.sleep(stall)
+                sock.send_init(settings)
+            elif packet.packet_type == PacketType.init:
+                sock.send_init(request)
+            elif packet.packet_type == PacketType.debug:
+                if debug is not None:
+                    debug.append(packet.payload)
+            else:
+                return packet.payload
+
+
+def test_settings_handshake_doesnt_block(container):
+    assert submit(container, "1")["data"]["version"] == "1"
+    slow = []
+    thread = threading.Thread(target=lambda: slow.append(submit(container, "2", STALL)))
+    thread.start()
+    time.sleep(0.2)  # the slow client is waiting in the settings handshake now
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as pool:
+        results = list(pool.map(lambda _: submit(container, "1"), range(REQUESTS)))
+    duration = time.perf_counter() - start
+
+    assert all(res["res"] == 0 and res["data"]["version"] == "1" for res in results)
+    assert duration < STALL
+    thread.join()
+    assert slow[0]["data"]["version"] == "2"
+    assert submit(container, "1")["data"]["version"] == "1"
+
+
+def test_code_timeout(container):
+    short = dict(SETTINGS, main={"code_timeout": 5})
+    assert submit(container, "1", settings=short)["data"]["code_timeout"] == 5
+    assert submit(container, "2", settings=dict(SETTINGS, main={"code_timeout": 100}))["data"]["code_timeout"] == 60
+    # version 1 is still known and keeps its own timeout
+    assert submit(container, "1")["data"]["code_timeout"] == 5
+    assert submit(container, "3")["data"]["code_timeout"] == 50
+
+
+def test_stream(container):
+    debug = []
+    assert submit(container, "1", debug=debug)["res"] == 0
+    assert debug == []
+    assert submit(container, "1", request=dict(REQUEST, stream=True), debug=debug)["res"] == 0
+    assert debug == [{"stream": "run", "name": "stdout", "text": text} for text in ("1\n", "2\n")]
+
+
+def test_timings(container):
+    timings = submit(container, "1", stall=0.2)["data"]["timings"]
+    assert list(timings) == ["settings", "queue", "run"]
+    assert timings["settings"] >= 200 and timings["queue"] >= 0 and timings["run"] == 10.0
+    # the settings of the version are known now
+    assert submit(container, "1", stall=0.2)["data"]["timings"]["settings"] < 200
+
+
+def test_metrics(container):
+    assert submit(container, "1")["res"] == 0
+    with connect(container) as sock:
+        sock.send_init({"metrics": True})
+        packet = sock.recv()
+    assert packet.packet_type == PacketType.data and packet.payload["res"] == 0
+    stats = packet.payload["data"]
+    assert stats["connections"] == 0 and stats["exec"]["submitted"] == 1
+    assert stats["results"] == {"none": 1, "too_many_connections": 0, "listener_timeout": 0, "execution_timeout": 0, "exception": 0}
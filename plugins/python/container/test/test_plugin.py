@@ -1,6 +1,7 @@
 import plugin
 from .testdata import user, compare
 import json
+import os
 
 SETTINGS = {
     "exec": {"run": True, "mark": True, "pytest": True},
@@ -19,3 +20,39 @@ def test_plugin():
     data = pl.exec(SENT)
     print(data)
     assert False
+
+
+def test_settings_versions(monkeypatch):
+    monkeypatch.setattr(plugin.Plugin, "versions", 2)
+    pl = plugin.Plugin()
+    first = pl.setSettings("1", SETTINGS)
+    second = pl.setSettings("2", {})
+    assert pl.getSettings("2") is second and pl.getSettings("1") is first
+    assert first.get_path() != second.get_path()
+    with open(first.get_path()) as file:
+        assert len(json.load(file)) == 2
+    with open(second.get_path()) as file:
+        assert json.load(file) == []
+    # helper files are linked once per snapshot, jobs import them from its directory
+    for name in ("sct_test.py", "sct_sandbox.py", "sct_exec_mark.py"):
+        assert os.path.realpath(os.path.join(first.get_dir(), name)) == pl.helpers[name]
+    assert not os.access(first.get_dir(), os.W_OK) or os.geteuid() == 0
+
+    pl.setSettings("3", {})  # "2" is the least recently used version
+    assert not pl.checkVersion("2")
+    assert pl.checkVersion("1") and pl.checkVersion("3")
+    assert not pl.checkVersion("1", "digest")
+
+    # the directory of an evicted version is removed after the last request finished
+    path = second.get_path()
+    assert os.path.isfile(path)
+    del second
+    assert not os.path.exists(path)
+
+
+def test_timings():
+    pl = plugin.Plugin()
+    pl.setSettings(0, {**SETTINGS, "exec": {"run": True, "mark": False, "pytest": False}})
+    timings = pl.exec(SENT)["timings"]
+    assert list(timings) == ["setup", "radon", "run"]
+    assert all(ms >= 0 for ms in timings.values())
@@ -0,0 +1,28 @@
+from util.sct_sandbox import filter_source
+
+
+def body(src: str) -> str:
+    """filtered source without the header"""
+    return filter_source(src).split("import __untrusted__\n", 1)[1][:-1]
+
+
+def test_names():
+    assert body("eval('1')") == "_sandboxed_.eval('1')"
+    assert body("x = y.eval + open") == "x = y.eval + _sandboxed_.open"
+    assert body("a.__dict__; import builtins") == "a._sandboxed_.__dict__; import _sandboxed_.builtins"
+    assert body("def eval(): pass\nclass exec: pass") == "def eval(): pass\nclass exec: pass"
+    assert body("evaluate(my_open)") == "evaluate(my_open)"
+
+
+def test_imports():
+    assert body("import open") == "import open as _open_"
+    assert body("import exec as e") == "import exec as e"
+    assert body("from os import open, path") == "from os import open as _open_, path"
+
+
+def test_strings_and_comments():
+    src = "print('eval', \"open\", b'exec', r'\\'getattr')  # eval\nx = '''\nopen\n'''"
+    assert body(src) == src
+    assert body('elif"open": open') == 'elif"open": _sandboxed_.open'
+    # f-strings contain code
+    assert body("f'{eval(x)} {y.__dict__}'") == "f'{_sandboxed_.eval(x)} {y._sandboxed_.__dict__}'"
@@ -1,2 +1,6 @@
 from .popen import Popen
+from .zygote import Zygote
+from .executor import Executor, Deadline, DeadlineExceeded, QueueFullError
+from .kill import Kill
 from .traceback import get as get_traceback
+from .timing import Timings
@@ -0,0 +1,187 @@
+"""Bounded executor for Plugin.exec with deadlines.
+
+Jobs which didn't start before their deadline are cancelled. Processes started
+by a running job (util.Zygote.popen) get the remaining time of its deadline as
+timeout, so they are killed when the deadline is reached.
+"""
+import concurrent.futures
+import threading
+import time
+
+from .kill import Kill
+
+# time a job may need to return after its deadline, e.g. to collect killed processes
+GRACE = 1.0
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Deadline:
+    local = threading.local()
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.end = time.monotonic() + timeout
+        self._lock = threading.Lock()
+        self._groups = set()
+
+    def remaining(self) -> float:
+        """seconds until the deadline is reached"""
+        return max(0, self.end - time.monotonic())
+
+    def add_group(self, pgid: int):
+        """process group started by the job, killed if the job exceeds its deadline"""
+        with self._lock:
+            self._groups.add(pgid)
+
+    def remove_group(self, pgid: int):
+        with self._lock:
+            self._groups.discard(pgid)
+
+    def kill(self) -> int:
+        """kill all process groups of the job, returns the number of killed groups"""
+        with self._lock:
+            groups = tuple(self._groups)
+            self._groups.clear()
+        return sum(1 for pgid in groups if Kill.group(pgid))
+
+    @classmethod
+    def register(cls, pgid: int):
+        """add pgid to the deadline of the current job (if any)"""
+        if (deadline := cls.current()) is not None:
+            deadline.add_group(pgid)
+
+    @classmethod
+    def unregister(cls, pgid: int):
+        if (deadline := cls.current()) is not None:
+            deadline.remove_group(pgid)
+
+    @classmethod
+    def current(cls):
+        """Deadline of the job executed by the current thread or None"""
+        return getattr(cls.local, "deadline", None)
+
+    @classmethod
+    def clamp(cls, timeout: float) -> float:
+        """timeout limited to the deadline of the current job"""
+        if (deadline := cls.current()) is None:
+            return timeout
+        return max(round(min(timeout, deadline.remaining()), 2), 0.01)
+
+
+class ExecutorStats:
+    def __init__(self):
+        self.submitted = 0
+        self.queued = 0
+        self.running = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.killed = 0
+
+    def serialize(self) -> dict:
+        return dict(self.__dict__)
+
+
+class Job:
+    def __init__(self, executor: "Executor", timeout: float):
+        self.timeout = timeout
+        self.deadline: Deadline = None
+        self.started = threading.Event()
+        self.future: concurrent.futures.Future = None
+        # seconds the job waited in the queue
+        self.created = time.monotonic()
+        self.queued = 0.0
+        self._executor = executor
+
+    def result(self, queue_timeout: float = None):
+        """wait for the result.
+        raises DeadlineExceeded if the job didn't start within queue_timeout
+        seconds (None: no limit) or didn't finish before its deadline
+        """
+        if not self.started.wait(queue_timeout) and self._executor._cancel(self):
+            raise DeadlineExceeded(f"job didn't start within {queue_timeout}s")
+        self.started.wait()
+        try:
+            return self.future.result(self.deadline.remaining() + GRACE)
+        except concurrent.futures.TimeoutError:
+            # the job returns as soon as its processes are gone
+            killed = self.deadline.kill()
+            with self._executor._lock:
+                self._executor.stats.timeouts += 1
+                self._executor.stats.killed += killed
+            raise DeadlineExceeded(f"deadline of {self.timeout}s exceeded")
+
+
+class Executor:
+    """Thread pool with a bounded queue.
+
+        Arguments:
+            - workers (int): max. number of jobs executed at the same time
+            - queue_size (int): max. number of waiting jobs
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self._pool = concurrent.futures.ThreadPoolExecutor(max(workers, 1), thread_name_prefix="sct_exec")
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + max(queue_size, 0))
+        self._lock = threading.Lock()
+        self.stats = ExecutorStats()
+
+    def submit(self, fn, *args, timeout: float, wait: float = 0) -> Job:
+        """execute fn(*args) with a deadline of timeout seconds after its start.
+        Waits up to wait seconds (None: no limit) for a free queue slot, raises QueueFullError otherwise.
+        """
+        if not (self._slots.acquire(timeout=wait) if wait != 0 else self._slots.acquire(False)):
+            with self._lock:
+                self.stats.rejected += 1
+            raise QueueFullError(f"{self.stats.queued} jobs queued")
+        job = Job(self, timeout)
+        with self._lock:
+            self.stats.submitted += 1
+            self.stats.queued += 1
+        try:
+            job.future = self._pool.submit(self._call, job, fn, args)
+        except Exception:
+            with self._lock:
+                self.stats.queued -= 1
+            self._slots.release()
+            raise
+        return job
+
+    def _call(self, job: Job, fn, args):
+        job.deadline = Deadline(job.timeout)
+        job.queued = time.monotonic() - job.created
+        with self._lock:
+            self.stats.queued -= 1
+            self.stats.running += 1
+        job.started.set()
+        Deadline.local.deadline = job.deadline
+        try:
+            return fn(*args)
+        finally:
+            Deadline.local.deadline = None
+            with self._lock:
+                self.stats.running -= 1
+            self._slots.release()
+
+    def _cancel(self, job: Job) -> bool:
+        if not job.future.cancel():
+            return False  # started already
+        with self._lock:
+            self.stats.queued -= 1
+            self.stats.cancelled += 1
+        self._slots.release()
+        return True
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return self.stats.serialize()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,66 @@
+"""Termination of runaway user code.
+
+Every process of user code is the leader of its own process group, on
+timeout the whole group is killed. The CPU time the killed processes had
+used until the kill is counted (cpu_time_used).
+"""
+import os
+import signal
+import threading
+
+
+class KillStats:
+    def __init__(self):
+        self.killed = 0
+        # CPU time in seconds the killed processes had used
+        self.cpu_time_used = 0.0
+
+    def serialize(self) -> dict:
+        return dict(self.__dict__)
+
+
+class Kill:
+    lock = threading.Lock()
+    stats = KillStats()
+
+    @classmethod
+    def group(cls, pgid: int) -> bool:
+        """kill the process group pgid
+
+            Returns:
+                - False if the group doesn't exist (anymore)
+        """
+        cpu_time_used = cls.cpu_time(pgid)
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except OSError:
+            return False
+        with cls.lock:
+            cls.stats.killed += 1
+            cls.stats.cpu_time_used += cpu_time_used
+        return True
+
+    @classmethod
+    def cpu_time(cls, pgid: int) -> float:
+        """CPU time (user + system) of the processes of the group, 0 without /proc"""
+        ticks = 0
+        try:
+            pids = [entry for entry in os.listdir("/proc") if entry.isdigit()]
+        except OSError:
+            return 0.0
+        for pid in pids:
+            try:
+                with open(f"/proc/{pid}/stat") as file:
+                    data = file.read()
+            except OSError:
+                continue
+            # fields after "pid (comm)": state ppid pgrp ... utime(14) stime(15)
+            fields = data[data.rfind(")") + 2 :].split()
+            if int(fields[2]) == pgid:
+                ticks += int(fields[11]) + int(fields[12])
+        return ticks / os.sysconf("SC_CLK_TCK")
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        with cls.lock:
+            return cls.stats.serialize()
@@ -0,0 +1,98 @@
+"""Resource limits and usage of user code.
+
+Limits per process of user code, configured by environment variables
+(0 disables a limit):
+    - SCT_LIMIT_CPU: CPU time in seconds (default 60)
+    - SCT_LIMIT_MEMORY: address space in MB (default 1024)
+    - SCT_LIMIT_OUTPUT: bytes of stdout and stderr each (default 1MB), the process
+      group is killed if it writes more. Only the captured output is limited, not
+      other files of the user code (e.g. the cache of pytest).
+"""
+import contextlib
+import os
+import resource
+import threading
+import typing
+
+from .kill import Kill
+
+
+class Limits:
+    cpu = int(os.environ.get("SCT_LIMIT_CPU", "60"))
+    memory = int(os.environ.get("SCT_LIMIT_MEMORY", "1024"))
+    output = int(os.environ.get("SCT_LIMIT_OUTPUT", str(1 << 20)))
+
+    @classmethod
+    def apply(cls, pid: int = 0):
+        """limit the process pid (0: the current process).
+        A spawned process is limited by its parent right after the spawn, not in a
+        preexec_fn: code between fork and exec can deadlock in a threaded parent.
+        The CPU limit counts the time it used before, too."""
+        if cls.cpu > 0:
+            _set(pid, resource.RLIMIT_CPU, cls.cpu)
+        if cls.memory > 0:
+            _set(pid, resource.RLIMIT_AS, cls.memory << 20)
+
+    @classmethod
+    def watch(cls, pgid: int, out, err):
+        """context manager which kills the process group pgid if out or err exceeds the output limit"""
+        if cls.output <= 0:
+            return contextlib.nullcontext()
+        return OutputWatch(pgid, (out, err), cls.output)
+
+    @classmethod
+    def read_output(cls, file) -> typing.Tuple[str, int]:
+        """content (with a note if it was truncated) and size of a captured output file"""
+        size = os.fstat(file.fileno()).st_size
+        file.seek(0)
+        ret = file.read(cls.output if cls.output > 0 else -1).decode("utf8", errors="replace")
+        if 0 < cls.output < size:
+            ret += f"\n[output truncated after {cls.output} bytes]\n"
+        return (ret, size)
+
+
+class OutputWatch:
+    """checks the sizes of the output files every interval seconds, the process group
+    is killed as soon as one of them is larger than limit"""
+
+    def __init__(self, pgid: int, files: tuple, limit: int, interval: float = 0.05):
+        self.pgid = pgid
+        self.exceeded = False
+        self._files = files
+        self._limit = limit
+        self._interval = interval
+        self._exit = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sct_output_watch")
+        self._thread.daemon = True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._exit.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._exit.wait(self._interval):
+            if any(os.fstat(file.fileno()).st_size > self._limit for file in self._files):
+                self.exceeded = True
+                Kill.group(self.pgid)
+                return
+
+
+def usage(rusage_self, rusage_children=None, output: int = 0) -> dict:
+    """usage of a run: CPU time in ms, peak RSS in KB and bytes of output"""
+    cpu = rusage_self.ru_utime + rusage_self.ru_stime
+    rss = rusage_self.ru_maxrss
+    if rusage_children is not None:
+        cpu += rusage_children.ru_utime + rusage_children.ru_stime
+        rss = max(rss, rusage_children.ru_maxrss)
+    return {"cpu_ms": int(cpu * 1000), "max_rss_kb": rss, "output_bytes": output}
+
+
+def _set(pid: int, kind: int, value: int):
+    (_, hard) = resource.prlimit(pid, kind)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    resource.prlimit(pid, kind, (value, hard))
@@ -1,17 +1,29 @@
+import os
+import select
+import tempfile
+import time
 import typing
-from subprocess import Popen as _Popen, PIPE as _Pipe, TimeoutExpired as _TimeoutExpired
+from subprocess import Popen as _Popen
+
+from .executor import Deadline
+from .kill import Kill
+from .limits import Limits, usage
+from .stream import Tail
 
 class Popen:
-    def __init__(self, *args, env=None, cwd=".", timeout=60):
+    def __init__(self, *args, env=None, cwd=".", timeout=60, on_output=None):
         self._args = args
         self._env = env
         self._cwd = cwd
         self._timeout = timeout
+        # on_output(name, text): output ("stdout", "stderr") while the process is running
+        self._on_output = on_output
 
         self.code = None
         self.data = None
         self.error = None
         self.isTimeout = None
+        self.usage = None
 
         self.run()
 
@@ -19,25 +31,66 @@ class Popen:
         return f"Popen result: {self.code}"
 
     def run(self):
-        try:
-            p = _Popen(
-                self._args,
-                stdout=_Pipe,
-                stderr=_Pipe,
-                text=True,
-                env=self._env,
-                cwd=self._cwd,
-            )
-            (out, err) = p.communicate(timeout=self._timeout)
-            self.isTimeout = False
-
-            self.data = out
+        # output is written to files: its size is limited by Limits, not by the memory of this process
+        with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+            try:
+                p = _Popen(
+                    self._args,
+                    stdout=out,
+                    stderr=err,
+                    env=self._env,
+                    cwd=self._cwd,
+                    start_new_session=True,
+                )
+            except:
+                raise Exception(str([self._args, self._env, self._cwd]))
+            try:
+                Limits.apply(p.pid)
+            except ProcessLookupError:
+                pass  # already exited
+            Deadline.register(p.pid)
+            try:
+                with Tail.output(out, err, self._on_output), Limits.watch(p.pid, out, err):
+                    (status, rusage) = _wait(p.pid, self._timeout)
+                self.isTimeout = status is None
+                if self.isTimeout:
+                    # the process and all processes it started
+                    Kill.group(p.pid)
+                    (_, status, rusage) = os.wait4(p.pid, 0)
+            finally:
+                Deadline.unregister(p.pid)
+            p.returncode = os.waitstatus_to_exitcode(status)
+
+            (self.data, out_size) = Limits.read_output(out)
+            (self.error, err_size) = Limits.read_output(err)
+            self.usage = usage(rusage, output=out_size + err_size)
             self.code = p.returncode
-            self.error = err
-        except _TimeoutExpired as e:
-            self.isTimeout = True
-            self.code = -1
-            self.data = ""
-            self.error = f"{self._args[0]}: Timeout({e.timeout})"
-        except:
-            raise Exception(str([self._args, self._env, self._cwd]))
+            if self.isTimeout:
+                self.code = -1
+                self.data = ""
+                self.error = f"{self._args[0]}: Timeout({self._timeout})"
+
+
+def _wait(pid: int, timeout: float) -> typing.Tuple[typing.Any, typing.Any]:
+    """(exit status, resource usage) of the child pid, (None, None) if it didn't exit within timeout seconds"""
+    end = time.monotonic() + timeout
+    try:
+        fd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        fd = None  # polling
+    try:
+        delay = 0.001
+        while True:
+            (res, status, rusage) = os.wait4(pid, os.WNOHANG)
+            if res:
+                return (status, rusage)
+            if (remaining := end - time.monotonic()) <= 0:
+                return (None, None)
+            if fd is not None:
+                select.select([fd], [], [], remaining)
+            else:
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 0.05)
+    finally:
+        if fd is not None:
+            os.close(fd)
@@ -34,22 +34,57 @@ FORBIDDEN_ATTRIBUTES = {
 }
 
 
+def _names(names) -> str:
+    return "|".join(sorted(map(re.escape, names), key=len, reverse=True))
+
+
+_FUNCTIONS = _names(FORBIDDEN_FUNCTIONS)
+_ATTRIBUTES = _names(FORBIDDEN_ATTRIBUTES)
+_STRING = "|".join((
+    r"'''(?:[^'\\]|\\.|'(?!''))*'''",
+    r'"""(?:[^"\\]|\\.|"(?!""))*"""',
+    r"'(?:[^'\\\n]|\\.)*'",
+    r'"(?:[^"\\\n]|\\.)*"',
+))
+_NAME_PATTERNS = (
+    # functions: not as attribute (x.eval), definitions and aliases of imports are kept
+    rf"(?P<keep>(?<![\w.])(?:def|class)\s+(?:{_FUNCTIONS})(?!\w)|(?<![\w.])(?:{_FUNCTIONS})(?=\s+as(?!\w)))",
+    rf"(?<![\w.])import\s+(?P<imported>{_FUNCTIONS})(?!\w)(?!\s+as(?!\w))",
+    rf"(?<![\w.])(?P<function>{_FUNCTIONS})(?!\w)",
+    rf"(?<!\w)(?P<attribute>{_ATTRIBUTES})(?!\w)",
+)
+# first characters of all matches, other positions are skipped quickly
+_FIRST = re.escape("".join(sorted(set("#'\"rRbBuUfFdci") | {name[0] for name in FORBIDDEN_FUNCTIONS | FORBIDDEN_ATTRIBUTES})))
+# one pass over the source: comments and strings are skipped, forbidden names are rewritten.
+# f-strings contain code, names are rewritten in the whole string.
+_SOURCE = re.compile(
+    rf"(?=[{_FIRST}])(?:"
+    + "|".join((
+        r"(?P<comment>#[^\n]*)",
+        rf"(?P<fstring>(?<!\w)(?:[rR]?[fF]|[fF][rR])(?:{_STRING}))",
+        rf"(?P<string>(?:(?<!\w)[rRbBuU]{{1,2}})?(?:{_STRING}))",
+        *_NAME_PATTERNS,
+    ))
+    + ")",
+    re.DOTALL,
+)
+_NAMES = re.compile("|".join(_NAME_PATTERNS), re.DOTALL)
+
+
+def _rewrite(match: re.Match) -> str:
+    kind = match.lastgroup
+    if kind == "function" or kind == "attribute":
+        return f"_sandboxed_.{match.group(kind)}"
+    if kind == "imported":
+        name = match.group(kind)
+        return f"{match.group(0)} as _{name}_"
+    if kind == "fstring":
+        return _NAMES.sub(_rewrite, match.group(0))
+    return match.group(0)
+
+
 def filter_source(src: str, header: str = ""):
-    for key in FORBIDDEN_FUNCTIONS:
-        src = re.sub(
-            f"([^.a-zA-Z0-9_])({key})([^a-zA-Z0-9_])", r"\1_sandboxed_.\2\3", src
-        )
-        src = re.sub(f"(def|class)\\s+_sandboxed_.({key})", r"\1 \2", src)
-
-        # imports
-        src = re.sub(f"import\\s+_sandboxed_.({key})\\s+as", r"import \1 as", src)
-        src = re.sub(f"import\\s+_sandboxed_.({key})", r"import \1 as _\1_", src)
-        src = re.sub(f"([\\s,])_sandboxed_.({key})\\s+as", r"\1\2 as", src)
-
-    for key in FORBIDDEN_ATTRIBUTES:
-        src = re.sub(
-            f"([^a-zA-Z0-9_])({key})([^a-zA-Z0-9_])", r"\1_sandboxed_.\2\3", src
-        )
+    src = _SOURCE.sub(_rewrite, src)
     res = f"{header}\n"
     res = f"{res}from sct_sandbox import init, SandboxError\n"
     res = f"{res}_sandboxed_ = init()\n"
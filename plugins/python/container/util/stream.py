@@ -0,0 +1,78 @@
+"""Streaming of the output of user code while it's running.
+
+The output of a process is written to files (see util.limits), a thread reads
+the new parts of the files periodically and forwards them to a callback.
+Nothing is buffered in memory: if the callback is slow (e.g. a slow client),
+the output waits in the files, which are bounded by Limits.output.
+"""
+import codecs
+import contextlib
+import os
+import threading
+import typing
+
+from .limits import Limits
+
+# max. bytes of a chunk
+CHUNK_SIZE = 1 << 16
+
+
+class Tail:
+    """calls callback(name, text) with output appended to the files {name: file}
+    every interval seconds and once more when it's stopped"""
+
+    def __init__(self, files: dict, callback: typing.Callable[[str, str], typing.Any], interval: float = 0.1):
+        self._files = files
+        self._callback = callback
+        self._interval = interval
+        self._offsets = {name: 0 for name in files}
+        self._decoders = {name: codecs.getincrementaldecoder("utf8")(errors="replace") for name in files}
+        self._exit = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sct_tail")
+        self._thread.daemon = True
+
+    @classmethod
+    def output(cls, out, err, on_output=None):
+        """context manager which forwards stdout and stderr to on_output(name, text), if given"""
+        if on_output is None:
+            return contextlib.nullcontext()
+        return cls({"stdout": out, "stderr": err}, on_output)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._exit.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._exit.wait(self._interval):
+            self._read()
+        self._read(final=True)
+
+    def _read(self, final: bool = False):
+        for (name, file) in self._files.items():
+            while (chunk := self._next(name, file)) :
+                self._forward(name, self._decoders[name].decode(chunk))
+            if final:
+                self._forward(name, self._decoders[name].decode(b"", True))
+
+    def _next(self, name: str, file) -> bytes:
+        offset = self._offsets[name]
+        size = CHUNK_SIZE
+        if Limits.output > 0:
+            size = min(size, Limits.output - offset)
+        if size <= 0:
+            return b""
+        chunk = os.pread(file.fileno(), size, offset)
+        self._offsets[name] += len(chunk)
+        return chunk
+
+    def _forward(self, name: str, text: str):
+        if not text:
+            return
+        try:
+            self._callback(name, text)
+        except Exception:
+            pass  # the result doesn't depend on the stream
@@ -0,0 +1,29 @@
+"""Latency breakdown of a request.
+
+The durations of the stages (settings, queue, setup, radon, run, pytest,
+mark) are sent back with the result, the server merges them into the
+breakdown of the API request.
+"""
+import contextlib
+import time
+
+
+class Timings:
+    """durations of stages in ms, a stage measured more than once is summed up"""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds * 1000
+
+    def serialize(self) -> dict:
+        return {name: round(ms, 3) for (name, ms) in self.stages.items()}
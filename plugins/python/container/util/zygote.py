@@ -0,0 +1,272 @@
+"""Pre-forked interpreter for the execution of user code.
+
+The zygote process imports pytest, hypothesis, sct_test and sct_sandbox once.
+Every job (`python3 <script>` or `pytest <args>`) is executed by a fork of it,
+so jobs don't pay the interpreter start and import costs but are isolated from
+each other like separate processes.
+"""
+import importlib
+import json
+import logging
+import os
+import resource
+import runpy
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+import types
+
+from .executor import Deadline
+from .kill import Kill
+from .limits import Limits, usage
+from .stream import Tail
+
+CONTAINER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRELOAD = ("pytest", "hypothesis", "hypothesis.strategies")
+PRELOAD_SCT = {
+    "sct_sandbox": os.path.join("util", "sct_sandbox.py"),
+    "sct_test": os.path.join("fn", "execute", "sct_test.py"),
+}
+
+
+class Fork:
+    """Result of a job, same interface as util.Popen"""
+
+    def __init__(self, *args, env=None, cwd=".", timeout=60, on_output=None):
+        self._args = args
+        self._env = env
+        self._cwd = cwd
+        self._timeout = timeout
+        self._on_output = on_output
+
+        self.code = None
+        self.data = None
+        self.error = None
+        self.isTimeout = None
+        self.usage = None
+
+        self.run()
+
+    def __str__(self):
+        return f"Fork result: {self.code}"
+
+    def run(self):
+        job = {"args": self._args, "env": self._env, "cwd": os.path.abspath(self._cwd)}
+        with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET) as sock:
+                sock.settimeout(self._timeout)
+                sock.connect(Zygote.path)
+                socket.send_fds(sock, [json.dumps(job).encode("utf8")], [out.fileno(), err.fileno()])
+                if not (res := sock.recv(1024)):
+                    raise ConnectionError("zygote closed the connection")
+                pid = json.loads(res)["pid"]
+                Deadline.register(pid)
+                try:
+                    with Tail.output(out, err, self._on_output), Limits.watch(pid, out, err):
+                        res = json.loads(sock.recv(1024) or "{}")
+                    self.code = res.get("code", -1)
+                    # without a result the fork was killed (output limit)
+                    self.usage = res.get("usage", {"cpu_ms": None, "max_rss_kb": None})
+                    self.isTimeout = False
+                except socket.timeout:
+                    self.usage = {"cpu_ms": int(Kill.cpu_time(pid) * 1000), "max_rss_kb": None}
+                    Kill.group(pid)
+                    self.isTimeout = True
+                finally:
+                    Deadline.unregister(pid)
+            (self.data, out_size) = Limits.read_output(out)
+            (self.error, err_size) = Limits.read_output(err)
+            self.usage["output_bytes"] = out_size + err_size
+            if self.isTimeout:
+                self.code = -1
+                self.data = ""
+                self.error = f"{self._args[0]}: Timeout({self._timeout})"
+
+
+class Zygote:
+    """Manages the zygote process of the container"""
+
+    lock = threading.Lock()
+    ready = threading.Event()
+    process: subprocess.Popen = None
+    path = None
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return os.environ.get("SCT_ZYGOTE", "1") == "1"
+
+    @classmethod
+    def start(cls):
+        """start the zygote in the background, if it isn't running"""
+        with cls.lock:
+            if cls.process is not None and cls.process.poll() is None:
+                return
+            cls.ready.clear()
+            cls.path = os.path.join(tempfile.mkdtemp(prefix="sct_zygote_"), "socket")
+            env = dict(os.environ, PYTHONHASHSEED="1", PYTHONDONTWRITEBYTECODE="1")
+            cls.process = subprocess.Popen(
+                [sys.executable, "-c", "from util import zygote; zygote.serve()", cls.path],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                env=env,
+                cwd=CONTAINER_DIR,
+            )
+            thread = threading.Thread(target=cls._wait_ready, args=(cls.process,))
+            thread.daemon = True
+            thread.start()
+
+    @classmethod
+    def _wait_ready(cls, process: subprocess.Popen):
+        if process.stdout.readline().strip() == b"ready":
+            cls.ready.set()
+        else:
+            logging.error("zygote failed to start")
+
+    @classmethod
+    def stop(cls):
+        with cls.lock:
+            if cls.process is None:
+                return
+            cls.process.stdin.close()  # zygote exits on EOF
+            cls.process.wait()
+            cls.process = None
+
+    @classmethod
+    def popen(cls, *args, env=None, cwd=".", timeout=60, on_output=None):
+        """execute `python3 <script>` or `pytest <args>` in a fork of the zygote.
+        Falls back to util.Popen if the zygote is disabled or not running.
+        """
+        from .popen import Popen
+
+        if args[0] in ("python3", "pytest") and cls.enabled():
+            cls.start()
+            if cls.ready.wait(30):
+                try:
+                    return Fork(*args, env=env, cwd=cwd, timeout=timeout, on_output=on_output)
+                except OSError as e:
+                    logging.error("zygote: %s", str(e))
+        return Popen(*args, env=env, cwd=cwd, timeout=timeout, on_output=on_output)
+
+
+def _preload():
+    for name in PRELOAD:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    for (name, path) in PRELOAD_SCT.items():
+        # compiled with a relative filename, which is resolved in the directory of the job
+        with open(os.path.join(CONTAINER_DIR, path)) as file:
+            code = compile(file.read(), f"{name}.py", "exec")
+        module = types.ModuleType(name)
+        sys.modules[name] = module
+        exec(code, module.__dict__)
+
+
+def serve():
+    """main loop of the zygote process, forks one child per connection"""
+    path = sys.argv[1]
+    _preload()
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # reap children automatically
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    listener.bind(path)
+    listener.listen(64)
+    sys.stdout.write("ready\n")
+    sys.stdout.flush()
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    selector.register(sys.stdin, selectors.EVENT_READ)
+    while True:
+        for (key, _) in selector.select():
+            if key.fileobj is sys.stdin:
+                listener.close()
+                os.unlink(path)
+                os.rmdir(os.path.dirname(path))
+                return
+            (conn, _) = listener.accept()
+            if os.fork() == 0:
+                selector.close()
+                listener.close()
+                _child(conn)
+            conn.close()
+
+
+def _child(conn: socket.socket):
+    code = -1
+    try:
+        os.setsid()
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        (data, fds, _, _) = socket.recv_fds(conn, 1 << 20, 2)
+        job = json.loads(data)
+        conn.sendall(json.dumps({"pid": os.getpid()}).encode("utf8"))
+
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(fds[0], 1)
+        os.dup2(fds[1], 2)
+        for fd in (devnull, *fds):
+            os.close(fd)
+        Limits.apply()
+        os.chdir(job["cwd"])
+        os.environ.clear()
+        os.environ.update(job["env"] or {})
+        # like a new interpreter: the directory of the job, then PYTHONPATH (helper files of the settings)
+        sys.path[0:1] = [job["cwd"], *filter(None, os.environ.get("PYTHONPATH", "").split(os.pathsep))]
+        for name in PRELOAD_SCT:
+            # the job would import these modules from the first directory of sys.path which contains them
+            sys.modules[name].__file__ = _find(f"{name}.py")
+        code = _exec(job["args"])
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            res = {"code": code, "usage": usage(resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN))}
+            conn.sendall(json.dumps(res).encode("utf8"))
+        finally:
+            os._exit(0)
+
+
+def _find(file: str) -> str:
+    for path in sys.path:
+        if path and os.path.isfile(os.path.join(path, file)):
+            return os.path.join(path, file)
+    return os.path.join(os.getcwd(), file)
+
+
+def _exec(args) -> int:
+    try:
+        if args[0] == "pytest":
+            import pytest
+
+            # hypothesis is imported by the zygote already, that's fine
+            ignore = "ignore:Module already imported so cannot be rewritten:pytest.PytestAssertRewriteWarning"
+            return int(pytest.main(["-W", ignore, *args[1:]]))
+        path = os.path.abspath(args[1])
+        if not os.path.isfile(path):
+            print(f"python3: can't open file '{path}': [Errno 2] No such file or directory", file=sys.stderr)
+            return 2
+        sys.argv = list(args[1:])
+        runpy.run_path(os.path.join(os.getcwd(), args[1]), run_name="__main__")
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException as e:
+        tb = e.__traceback__
+        while tb is not None and _is_internal(tb.tb_frame.f_code.co_filename):
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb)
+        return 1
+
+
+def _is_internal(filename: str) -> bool:
+    """frames of the zygote aren't part of the traceback of a job"""
+    return filename in (__file__, runpy.__file__, "<frozen runpy>")
@@ -25,6 +25,10 @@ class Executor(BaseExecutor):
         return self._get_print_settings().get("force_mark_user_output", False)
 
 
+    def sct_cacheable(self) -> bool:
+        # errors (e.g. timeouts) may not occur again
+        return self._get_data()[0] == 0
+
     def get_error(self):
         (code, _) = self._get_data()
         if code == 0:
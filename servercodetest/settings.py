@@ -18,6 +18,57 @@ LOG_LEVEL = env("SCT_LOG_LEVEL", "WARNING")
 # | timeout of API requests
 TIMEOUT = etoi("SCT_TIMEOUT", 60, 30, 60 * 10)
 
+# | seconds until cached settings of a token are revalidated
+SETTINGS_CACHE_TTL = etoi("SCT_SETTINGS_CACHE_TTL", 10, 0, 60 * 60)
+# max. number of cached tokens per worker process, seconds until an unknown token is looked up again
+SETTINGS_CACHE_SIZE = etoi("SCT_SETTINGS_CACHE_SIZE", 10000, 1, 1000000)
+SETTINGS_CACHE_MISS_TTL = etoi("SCT_SETTINGS_CACHE_MISS_TTL", 1, 0, 60)
+
+# | cache which is shared by all worker processes (optional)
+# e.g. django.core.cache.backends.filebased.FileBasedCache with location /tmp/sct_cache
+CACHE_BACKEND = env("SCT_CACHE_BACKEND", "")
+CACHE_LOCATION = env("SCT_CACHE_LOCATION", "")
+
+# | threads per worker process which execute API requests
+# requests wait in a queue if all threads are busy
+TIMEOUT_WORKERS = etoi("SCT_TIMEOUT_WORKERS", 32, 1, 1024)
+
+# | persistent connections per plugin container and worker process
+# 0 opens a new connection for every request
+SCT_POOL_SIZE = etoi("SCT_POOL_SIZE", 2, 0, 32)
+
+# | max. number of requests of a batch request (<token>/batch)
+BATCH_MAX_SIZE = etoi("SCT_BATCH_MAX_SIZE", 1000, 1, 100000)
+
+# | output of the user code which is buffered per streamed request (<token>/stream),
+# output is dropped if the client reads it slower than it is produced
+STREAM_BUFFER = etoi("SCT_STREAM_BUFFER", 256, 1, 100000)
+
+# | results of identical requests (token, settings, code) are reused
+# max. number of cached results per worker process (0 disables the cache), seconds until a result expires
+RESULT_CACHE_SIZE = etoi("SCT_RESULT_CACHE_SIZE", 1000, 0, 100000)
+RESULT_CACHE_TTL = etoi("SCT_RESULT_CACHE_TTL", 60 * 10, 1, 60 * 60 * 24)
+
+# | latency breakdown of API requests (setting, execute, start_container, connect, exchange,
+# container.<stage>, total in ms) in the response ("timings"), it's logged at level DEBUG anyway
+TIMINGS = etob("SCT_TIMINGS")
+
+# | Prometheus metrics (/metrics), disabled by default: they reveal the load of the server.
+# every worker writes its metrics to METRICS_DIR (default: <tmp>/sct_metrics) every METRICS_INTERVAL
+# seconds, the view sums them up. Running containers of the current images are asked for their metrics (METRICS_CONTAINERS),
+# each has METRICS_TIMEOUT seconds to answer
+METRICS = etob("SCT_METRICS")
+METRICS_DIR = env("SCT_METRICS_DIR", "")
+METRICS_INTERVAL = etoi("SCT_METRICS_INTERVAL", 15, 1, 60 * 10)
+METRICS_CONTAINERS = etob("SCT_METRICS_CONTAINERS", True)
+METRICS_TIMEOUT = etoi("SCT_METRICS_TIMEOUT", 2, 1, 60)
+
+# | serve the API with asyncio (servercodetest.asgi), requests don't block a thread
+# while they wait for a container. Each request opens its own plain connection:
+# SCT_POOL_SIZE doesn't apply and the request isn't pipelined with the settings version.
+# The request is cancelled after SCT_TIMEOUT like a synchronous one
+ASYNC = etob("SCT_ASYNC")
+
 # | Debug mode
 #! SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = etob("SCT_DEBUG")
@@ -26,6 +77,12 @@ DEBUG = etob("SCT_DEBUG")
 DOCKER_ENABLED = etob("SCT_DOCKER")
 DOCKER_NETWORK = env("SCT_DOCKER_NETWORK")
 DOCKER_PREFIX = env("SCT_DOCKER_PREFIX", "sct")
+# max. number of idle containers which are started in advance per plugin
+DOCKER_WARM_POOL = etoi("SCT_DOCKER_WARM_POOL", 5, 0, 50)
+# state of containers and images is cached per worker process, updated by docker events.
+# seconds between full reconciliations with the docker daemon
+DOCKER_STATE_CACHE = etob("SCT_DOCKER_STATE_CACHE", True)
+DOCKER_STATE_RECONCILE = etoi("SCT_DOCKER_STATE_RECONCILE", 60, 5, 60 * 60)
 
 
 # | DATABASE
@@ -138,6 +195,16 @@ AVAILABLE_DB = {
 DATABASES = {"default": AVAILABLE_DB.get(USED_SETTINGS, "main")}
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+if CACHE_BACKEND != "":
+    CACHES["shared"] = {"BACKEND": CACHE_BACKEND, "LOCATION": CACHE_LOCATION}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 